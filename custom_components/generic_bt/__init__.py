@@ -7,15 +7,28 @@ from homeassistant.components import bluetooth
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.typing import ConfigType
 
-from .const import DOMAIN
+from . import services, websocket_api
+from .const import CONF_PROTOCOL, DOMAIN, PROFILE_OPTIONS
 from .coordinator import ScaleDataUpdateCoordinator
+from .generic_bt_api.const import DEFAULT_PROTOCOL
 # from .generic_bt_api.device import GenericBTDevice
 
 
 _LOGGER = logging.getLogger(__name__)
 
-PLATFORMS = [Platform.SENSOR]
+PLATFORMS = [Platform.BINARY_SENSOR, Platform.SENSOR]
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the Generic BT component."""
+    websocket_api.async_setup(hass)
+    services.async_setup(hass)
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Generic BT from a config entry."""
@@ -25,17 +38,34 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     assert address is not None
     await close_stale_connections_by_address(address)
 
-    coordinator = ScaleDataUpdateCoordinator(hass, address)
+    # Entries created before fingerprinting all use the original protocol
+    coordinator = ScaleDataUpdateCoordinator(
+        hass, address, entry.title, entry.data.get(CONF_PROTOCOL, DEFAULT_PROTOCOL)
+    )
+    await coordinator.async_apply_options(entry.options)
 
     hass.data[DOMAIN][entry.entry_id] = coordinator
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     entry.async_on_unload(coordinator.async_stop)
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
     return True
 
 
 async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Handle options update."""
+    coordinator: ScaleDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    previous = coordinator.applied_options
+    changed = {
+        key
+        for key in previous.keys() | entry.options.keys()
+        if previous.get(key) != entry.options.get(key)
+    }
+    if changed and changed <= PROFILE_OPTIONS:
+        # Profile edits are applied to the running coordinator, scanning
+        # continues and the last measurement is re-evaluated.
+        await coordinator.async_apply_options(entry.options)
+        return
     await hass.config_entries.async_reload(entry.entry_id)
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
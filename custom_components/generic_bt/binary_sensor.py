@@ -0,0 +1,72 @@
+"""Presence of generic bluetooth scales."""
+from __future__ import annotations
+
+import logging
+
+from homeassistant import config_entries
+from homeassistant.components.binary_sensor import (
+    BinarySensorDeviceClass,
+    BinarySensorEntity,
+)
+from homeassistant.const import EntityCategory
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.device_registry import CONNECTION_BLUETOOTH, DeviceInfo
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .const import DOMAIN
+from .coordinator import ScaleDataUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: config_entries.ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up the scale presence sensor."""
+    coordinator: ScaleDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    async_add_entities([ScalePresenceSensor(entry.title, entry.unique_id, coordinator)])
+
+
+class ScalePresenceSensor(BinarySensorEntity):
+    """Whether the scale advertised within the presence timeout.
+
+    A scale that stays away usually has a flat battery.
+    """
+
+    _attr_should_poll = False
+    _attr_has_entity_name = True
+    _attr_name = "Presence"
+    _attr_device_class = BinarySensorDeviceClass.CONNECTIVITY
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(
+        self, name: str, address: str, coordinator: ScaleDataUpdateCoordinator
+    ) -> None:
+        """Initialize the presence sensor.
+
+        Args:
+            name: The name of the scale.
+            address: The Bluetooth address of the scale.
+            coordinator: Tracks the presence of the scale.
+        """
+        self._attr_unique_id = f"{name}_presence"
+        self._attr_device_info = DeviceInfo(
+            connections={(CONNECTION_BLUETOOTH, address)},
+            name=name,
+            manufacturer="Generic",
+        )
+        self._coordinator = coordinator
+
+    async def async_added_to_hass(self) -> None:
+        """When entity is added to hass."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self._coordinator.add_presence_listener(self.async_write_ha_state)
+        )
+
+    @property
+    def is_on(self) -> bool:
+        """True while the scale is in range."""
+        return self._coordinator.presence.present
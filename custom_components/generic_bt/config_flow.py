@@ -1,6 +1,7 @@
 """Config flow for GenericBT integration."""
 from __future__ import annotations
 
+import asyncio
 import logging
 from typing import Any
 
@@ -8,17 +9,48 @@ from bluetooth_data_tools import human_readable_name
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.components.bluetooth import BluetoothServiceInfoBleak, async_discovered_service_info
+from homeassistant.components import bluetooth
+from homeassistant.components.bluetooth import (
+    BluetoothCallbackMatcher,
+    BluetoothChange,
+    BluetoothScanningMode,
+    BluetoothServiceInfoBleak,
+    async_discovered_service_info,
+)
 from homeassistant.const import CONF_ADDRESS
+from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
+from homeassistant.helpers import selector
 
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import (
     AdvertisementData,)
-import asyncio
 
-from .const import DOMAIN
-from .generic_bt_api.device import GenericBTDevice
+from .const import (
+    CONF_BIRTHDATE,
+    CONF_CALC_BODY_METRICS,
+    CONF_FIELDS,
+    CONF_HEIGHT,
+    CONF_MQTT,
+    CONF_PROTOCOL,
+    CONF_SEX,
+    CONF_USERS,
+    DISCOVERY_MAX_CANDIDATES,
+    DOMAIN,
+    PROBE_CONCURRENCY,
+    PROBE_DEADLINE,
+    PROBE_SAMPLE_TIME,
+    PROTOCOL_SAMPLE_SIZE,
+)
+from .generic_bt_api.discovery import DiscoveryIndex, probe_all
+from .generic_bt_api.fields import FieldDecoder, FieldSchemaError
+from .generic_bt_api.protocols import (
+    AdvertisementSample,
+    Protocol,
+    fingerprint,
+    select_protocol,
+)
+from .mqtt_export import MQTT_SCHEMA
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -31,63 +63,183 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Initialize the config flow."""
         self._discovery_info: BluetoothServiceInfoBleak | None = None
         self._discovered_devices: dict[str, BluetoothServiceInfoBleak] = {}
+        # Address -> protocol fingerprinted while probing
+        self._protocols: dict[str, str] = {}
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> OptionsFlowHandler:
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler()
 
     async def async_step_bluetooth(self, discovery_info: BluetoothServiceInfoBleak) -> FlowResult:
         """Handle the bluetooth discovery step."""
-        #if discovery_info.name.startswith(UNSUPPORTED_SUB_MODEL):
-        #    return self.async_abort(reason="not_supported")
-
         await self.async_set_unique_id(discovery_info.address)
         self._abort_if_unique_id_configured()
+        if not DiscoveryIndex().candidates(discovery_info):
+            return self.async_abort(reason="not_supported")
         self._discovery_info = discovery_info
         self.context["title_placeholders"] = {"name": human_readable_name(None, discovery_info.name, discovery_info.address)}
         return await self.async_step_user()
 
     async def async_step_user(self, user_input: dict[str, Any] | None = None) -> FlowResult:
         """Handle the user step to pick discovered device."""
-        errors: dict[str, str] = {}
-
         if user_input is not None:
             address = user_input[CONF_ADDRESS]
             discovery_info = self._discovered_devices[address]
-            local_name = discovery_info.name
             await self.async_set_unique_id(discovery_info.address, raise_on_progress=False)
             self._abort_if_unique_id_configured()
-            device = GenericBTDevice(discovery_info.device)
-            try:
-                await device.update()
-            except BLEAK_EXCEPTIONS:
-                errors["base"] = "cannot_connect"
-            except Exception:  # pylint: disable=broad-except
-                _LOGGER.exception("Unexpected error")
-                errors["base"] = "unknown"
-            else:
-                await device.stop()
-                return self.async_create_entry(title=local_name,data={CONF_ADDRESS: discovery_info.address})
+            return self.async_create_entry(
+                title=discovery_info.name,
+                data={CONF_ADDRESS: discovery_info.address, CONF_PROTOCOL: self._protocols[address]},
+            )
 
         if discovery := self._discovery_info:
-            self._discovered_devices[discovery.address] = discovery
+            candidates = [discovery]
         else:
+            # Only devices advertising for a registered protocol are probed,
+            # the strongest signals first
             current_addresses = self._async_current_ids()
-            for discovery in async_discovered_service_info(self.hass):
-                if (
-                    discovery.address in current_addresses
-                    or discovery.address in self._discovered_devices
-                ):
-                    continue
-                self._discovered_devices[discovery.address] = discovery
+            candidates = DiscoveryIndex().rank(
+                (
+                    service_info
+                    for service_info in async_discovered_service_info(self.hass, connectable=False)
+                    if service_info.address not in current_addresses
+                ),
+                DISCOVERY_MAX_CANDIDATES,
+            )
+        probed = await probe_all(candidates, self._async_probe, PROBE_CONCURRENCY, PROBE_DEADLINE)
+        for service_info, protocol in probed:
+            if protocol is not None:
+                self._discovered_devices[service_info.address] = service_info
+                self._protocols[service_info.address] = protocol.name
 
         if not self._discovered_devices:
-            return self.async_abort(reason="no_devices_found")
+            return self.async_abort(
+                reason="not_supported" if self._discovery_info else "no_devices_found"
+            )
 
         data_schema = vol.Schema(
             {
                 vol.Required(CONF_ADDRESS): vol.In(
                     {
-                        service_info.address: (f"{service_info.name} ({service_info.address})")
+                        service_info.address: (
+                            f"{service_info.name} ({service_info.address}, "
+                            f"{self._protocols[service_info.address]}, {service_info.rssi} dBm)"
+                        )
                         for service_info in self._discovered_devices.values()
                     }
                 ),
             }
         )
-        return self.async_show_form(step_id="user", data_schema=data_schema, errors=errors)
\ No newline at end of file
+        return self.async_show_form(step_id="user", data_schema=data_schema)
+
+    async def _async_probe(self, discovery_info: BluetoothServiceInfoBleak) -> Protocol | None:
+        """Fingerprint the protocol of a device from its advertisements."""
+        samples = await self._async_sample_advertisements(discovery_info)
+        if (protocol := select_protocol(samples)) is None:
+            _LOGGER.debug(
+                "No protocol matches %s, scores: %s", discovery_info.address, fingerprint(samples)
+            )
+        return protocol
+
+    async def _async_sample_advertisements(
+        self, discovery_info: BluetoothServiceInfoBleak
+    ) -> list[AdvertisementSample]:
+        """Collect a short sample of a device's advertisements to fingerprint."""
+        samples = [AdvertisementSample.of(discovery_info)]
+        sampled = asyncio.Event()
+
+        @callback
+        def _async_sample(service_info: BluetoothServiceInfoBleak, _change: BluetoothChange) -> None:
+            samples.append(AdvertisementSample.of(service_info))
+            if len(samples) >= PROTOCOL_SAMPLE_SIZE:
+                sampled.set()
+
+        cancel = bluetooth.async_register_callback(
+            self.hass,
+            _async_sample,
+            BluetoothCallbackMatcher(address=discovery_info.address, connectable=False),
+            BluetoothScanningMode.ACTIVE,
+        )
+        try:
+            async with asyncio.timeout(PROBE_SAMPLE_TIME):
+                await sampled.wait()
+        except TimeoutError:
+            pass
+        finally:
+            cancel()
+        return samples
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle the body metrics profile and household user options."""
+
+    async def async_step_init(self, user_input: dict[str, Any] | None = None) -> FlowResult:
+        """Manage the body metrics profile and household users."""
+        options = self.config_entry.options
+        errors: dict[str, str] = {}
+        data_schema = vol.Schema(
+            {
+                vol.Required(
+                    CONF_CALC_BODY_METRICS,
+                    default=options.get(CONF_CALC_BODY_METRICS, False),
+                ): bool,
+                vol.Optional(
+                    CONF_SEX, description={"suggested_value": options.get(CONF_SEX)}
+                ): selector.SelectSelector(
+                    selector.SelectSelectorConfig(options=["male", "female"])
+                ),
+                vol.Optional(
+                    CONF_BIRTHDATE, description={"suggested_value": options.get(CONF_BIRTHDATE)}
+                ): selector.DateSelector(),
+                vol.Optional(
+                    CONF_HEIGHT, description={"suggested_value": options.get(CONF_HEIGHT)}
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=50,
+                        max=250,
+                        step=1,
+                        unit_of_measurement="cm",
+                        mode=selector.NumberSelectorMode.BOX,
+                    )
+                ),
+                # Household users of a shared scale: a list of name, sex,
+                # birthdate, height (cm) and optional starting weight (kg)
+                vol.Optional(
+                    CONF_USERS, description={"suggested_value": options.get(CONF_USERS)}
+                ): selector.ObjectSelector(),
+                # Export to an MQTT broker: host and optional port, username,
+                # password, topic prefix and qos
+                vol.Optional(
+                    CONF_MQTT, description={"suggested_value": options.get(CONF_MQTT)}
+                ): selector.ObjectSelector(),
+                # Fields decoded from every frame, each becoming a sensor: a
+                # list of name, offset, width, endian, signed, scale and unit,
+                # or name, formula and unit
+                vol.Optional(
+                    CONF_FIELDS, description={"suggested_value": options.get(CONF_FIELDS)}
+                ): selector.ObjectSelector(),
+            }
+        )
+        if user_input is not None:
+            if mqtt := user_input.get(CONF_MQTT):
+                try:
+                    MQTT_SCHEMA(mqtt)
+                except vol.Invalid:
+                    errors[CONF_MQTT] = "invalid_mqtt"
+            if fields := user_input.get(CONF_FIELDS):
+                try:
+                    FieldDecoder.from_config(fields)
+                except FieldSchemaError as ex:
+                    _LOGGER.warning("Invalid fields: %s", ex)
+                    errors[CONF_FIELDS] = "invalid_fields"
+            if not errors:
+                # Optional fields left empty are absent from user_input and
+                # cleared; only options managed elsewhere, such as sensor
+                # throttling, are kept
+                rendered = {str(key) for key in data_schema.schema}
+                kept = {key: value for key, value in options.items() if key not in rendered}
+                return self.async_create_entry(title="", data={**kept, **user_input})
+
+        return self.async_show_form(step_id="init", data_schema=data_schema, errors=errors)
@@ -31,3 +31,99 @@ CONF_INCHES = "inches"
 #             vol.Required("target_uuid"): cv.string
 #         }
 #     )
+
+# A downloaded history record matching a live measurement with the same raw
+# weight and impedance within this window is the same weigh-in.
+HISTORY_DEDUPE_WINDOW_SECONDS = 120
+INGESTED_HISTORY_SIZE = 1024
+# Seconds after the scale comes into range to download its history, unless
+# the weigh-in that woke it finishes first
+HISTORY_SYNC_DELAY = 30
+
+# Seconds after the last frame of a weigh-in to finalize it without impedance
+SESSION_FINALIZE_TIMEOUT = 20
+
+# Connection slot scheduler and timer wheel shared by every configured device.
+DATA_SLOT_SCHEDULER = f"{DOMAIN}_slot_scheduler"
+DATA_TIMER_WHEEL = f"{DOMAIN}_timer_wheel"
+
+# Presence: the scale is reported away after this many seconds without an
+# advertisement; diagnostic entities refresh at most once per interval.
+CONF_PRESENCE_TIMEOUT = "presence_timeout"
+DEFAULT_PRESENCE_TIMEOUT = 900
+DIAGNOSTICS_INTERVAL = 60
+
+# Sensor state write throttling. Options may override the policy per
+# sensor key under CONF_THROTTLE, e.g. {"Weight": {"deadband": 0.1}}.
+CONF_THROTTLE = "throttle"
+CONF_DEADBAND = "deadband"
+CONF_RELATIVE_DEADBAND = "relative_deadband"
+CONF_MIN_INTERVAL = "min_interval"
+CONF_HEARTBEAT = "heartbeat"
+DEFAULT_MIN_WRITE_INTERVAL = 2.0
+DEFAULT_HEARTBEAT = 3600.0
+
+# Last raw measurement per scale, recomputed into every sensor at startup.
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.measurement"
+STORAGE_SAVE_DELAY = 10
+
+# Append-only binary history of finalized measurements, one file per scale
+HISTORY_STORE_KEY = f"{DOMAIN}.history"
+
+# Options that only change the body metrics profile and are applied to the
+# running coordinator without reloading the entry.
+PROFILE_OPTIONS = {CONF_CALC_BODY_METRICS, CONF_SEX, CONF_HEIGHT, CONF_BIRTHDATE}
+
+# Household profiles for a shared scale, a list of dicts with a name, sex,
+# birthdate, height in cm and an optional starting weight in kg.
+CONF_USERS = "users"
+CONF_NAME = "name"
+CONF_WEIGHT = "weight"
+
+# Long-term statistics. Finalized measurements are aggregated per hour and
+# imported in one batch per statistic every flush interval.
+STATISTICS_FLUSH_INTERVAL = 300
+STATISTICS_MAX_HOURS = 512
+
+# Websocket subscriptions, in frames per second
+DEFAULT_SUBSCRIBE_RATE = 5.0
+MAX_SUBSCRIBE_RATE = 50.0
+
+# History export. Statistics are read from the recorder one window of days
+# at a time, by default going back this many days.
+EXPORT_SOURCE_STORE = "store"
+EXPORT_SOURCE_STATISTICS = "statistics"
+EXPORT_STATISTICS_WINDOW = 90
+EXPORT_STATISTICS_LOOKBACK = 3650
+
+# Recomputing history after a profile change
+EVENT_REDERIVE_PROGRESS = f"{DOMAIN}_rederive_progress"
+REDERIVE_CHUNK_SIZE = 2000
+REDERIVE_MAX_WORKERS = 4
+REDERIVE_PROGRESS_INTERVAL = 1.0
+
+# MQTT export of finalized measurements and device health. The option holds
+# the broker settings; scales exporting to the same broker share a connection.
+CONF_MQTT = "mqtt"
+DATA_MQTT_EXPORTERS = f"{DOMAIN}_mqtt_exporters"
+MQTT_FLUSH_INTERVAL = 1.0
+MQTT_RETRY_INTERVAL = 30.0
+
+# User-declared frame fields: a list of dicts with a name and either a byte
+# offset, width, endian, signed and scale, or a formula over other fields,
+# plus an optional unit. Every field becomes a sensor.
+CONF_FIELDS = "fields"
+
+# Protocol of the scale, fingerprinted from a sample of at most this many
+# of its advertisements when the entry is created.
+CONF_PROTOCOL = "protocol"
+PROTOCOL_SAMPLE_SIZE = 8
+
+# Discovery. Nearby devices of a registered protocol are probed strongest
+# signal first, at most this many of them, this many at a time, each
+# sampled for this long, and the list is shown once the deadline passes.
+DISCOVERY_MAX_CANDIDATES = 32
+PROBE_CONCURRENCY = 8
+PROBE_SAMPLE_TIME = 3.0
+PROBE_DEADLINE = 15.0
@@ -4,10 +4,12 @@ from __future__ import annotations
 import asyncio
 import logging
 import platform
+import time
+from collections import deque
 from collections.abc import Callable
-from datetime import date
+from datetime import date, datetime, timedelta, timezone
 from functools import partial
-from typing import Any, Dict, List, Literal, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional, Tuple
 
 from aioesphomeapi import APIClient, BluetoothProxyFeature
 from aioesphomeapi.model import BluetoothLEAdvertisement, DeviceInfo
@@ -24,13 +26,165 @@ from bluetooth_data_tools import (
     int_to_bluetooth_address,
     parse_advertisement_data_tuple,
 )
-from habluetooth import HaScannerRegistration
-from homeassistant.core import HomeAssistant, callback
+from habluetooth import HaScannerRegistration, get_manager
+from homeassistant.components.bluetooth import (
+    async_ble_device_from_address,
+    async_scanner_devices_by_address,
+)
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+from homeassistant.helpers.storage import STORAGE_DIR, Store
+from homeassistant.util import slugify
+from .const import (
+    CONF_BIRTHDATE,
+    CONF_CALC_BODY_METRICS,
+    CONF_FIELDS,
+    CONF_HEIGHT,
+    CONF_MQTT,
+    CONF_NAME,
+    CONF_PRESENCE_TIMEOUT,
+    CONF_SEX,
+    CONF_USERS,
+    CONF_WEIGHT,
+    DATA_SLOT_SCHEDULER,
+    DATA_TIMER_WHEEL,
+    DEFAULT_PRESENCE_TIMEOUT,
+    DIAGNOSTICS_INTERVAL,
+    DOMAIN,
+    HISTORY_DEDUPE_WINDOW_SECONDS,
+    HISTORY_STORE_KEY,
+    HISTORY_SYNC_DELAY,
+    INGESTED_HISTORY_SIZE,
+    REDERIVE_CHUNK_SIZE,
+    SESSION_FINALIZE_TIMEOUT,
+    STATISTICS_FLUSH_INTERVAL,
+    STORAGE_KEY,
+    STORAGE_SAVE_DELAY,
+    STORAGE_VERSION,
+)
+from .generic_bt_api.const import (
+    DEFAULT_PROTOCOL,
+    DEFAULT_STREAM_QUEUE_SIZE,
+    ESPHOME_PROXY_SLOTS,
+    LOCAL_ADAPTER_SLOTS,
+    LOCAL_SOURCE,
+)
 from .generic_bt_api.device import GenericBTDevice
-from .generic_bt_api.parser import BTScaleData
+from .generic_bt_api.fields import FieldDecoder, FieldSchemaError, FieldValue
+from .generic_bt_api.parser import PEOPLE_TYPE, BTScaleData, OneByoneNewLib, default_profile
+from .generic_bt_api.presence import DevicePresence
+from .generic_bt_api.profiles import Attribution, ProfileIndex, UserProfile
+from .generic_bt_api.protocols import Protocol, get_protocol
+from .generic_bt_api.recompute import (
+    HourlyAggregates,
+    merge_aggregates,
+    raw_chunks,
+    recompute_chunk,
+)
+from .generic_bt_api.routing import RssiRouter
+from .generic_bt_api.scheduler import ConnectionSlotScheduler
+from .generic_bt_api.store import MeasurementStore, RecordFlag, StoreError
+from .generic_bt_api.session import Phase, WeighInSession
+from .generic_bt_api.stream import MeasurementStream, Overflow, StreamHub
+from .generic_bt_api.timerwheel import TimerWheel
+from .generic_bt_api.trends import TrendEngine
+from .mqtt_export import SharedMqttExporter, async_get_mqtt_exporter
+from .rederive import RederiveJob
+from .statistics import STATISTIC_ATTRIBUTES, HourAccumulator, MeasurementStatistics
+
+if TYPE_CHECKING:
+    from habluetooth import HaBluetoothSlotAllocations
 
 _LOGGER = logging.getLogger(__name__)
 
+
+@callback
+def async_get_slot_scheduler(hass: HomeAssistant) -> ConnectionSlotScheduler:
+    """Return the connection slot scheduler shared by all scales.
+
+    Args:
+        hass: The Home Assistant instance.
+    """
+    if (scheduler := hass.data.get(DATA_SLOT_SCHEDULER)) is None:
+        scheduler = hass.data[DATA_SLOT_SCHEDULER] = ConnectionSlotScheduler()
+        _async_track_slot_allocations(scheduler)
+    return scheduler
+
+
+@callback
+def _async_track_slot_allocations(scheduler: ConnectionSlotScheduler) -> None:
+    """Size the sources of the scheduler from the slots they report.
+
+    Adapters and proxies report their connection limit and free slots to
+    Home Assistant, where the slots held through the scheduler count as
+    allocated, so a source can take what is free plus what it holds. Sources
+    that report nothing keep the default slot counts.
+
+    Args:
+        scheduler: The scheduler to keep sized.
+    """
+    manager = get_manager()
+    if not hasattr(manager, "async_register_allocation_callback"):
+        return
+
+    @callback
+    def _allocations_changed(allocations: HaBluetoothSlotAllocations) -> None:
+        scheduler.set_capacity(
+            allocations.source, allocations.free + scheduler.in_use(allocations.source)
+        )
+
+    for allocations in manager.async_current_allocations() or ():
+        _allocations_changed(allocations)
+    manager.async_register_allocation_callback(_allocations_changed, None)
+
+
+@callback
+def async_get_coordinator(
+    hass: HomeAssistant, address: str
+) -> Optional[ScaleDataUpdateCoordinator]:
+    """Return the coordinator of the scale with the given address, if set up.
+
+    Args:
+        hass: The Home Assistant instance.
+        address: The Bluetooth address of the scale, in any case.
+    """
+    address = address.upper()
+    for coordinator in hass.data.get(DOMAIN, {}).values():
+        if coordinator.address.upper() == address:
+            return coordinator
+    return None
+
+
+@callback
+def async_get_timer_wheel(hass: HomeAssistant) -> TimerWheel:
+    """Return the timer wheel shared by all scales.
+
+    The wheel is advanced by a single interval timer, so tracking the
+    presence of many devices costs one tick rather than one timer each.
+
+    Args:
+        hass: The Home Assistant instance.
+    """
+    if (wheel := hass.data.get(DATA_TIMER_WHEEL)) is not None:
+        return wheel
+
+    wheel = hass.data[DATA_TIMER_WHEEL] = TimerWheel()
+
+    @callback
+    def advance(_now: datetime) -> None:
+        wheel.advance(time.monotonic())
+
+    unsub = async_track_time_interval(hass, advance, timedelta(seconds=wheel.tick))
+
+    @callback
+    def stop(_event: Event) -> None:
+        unsub()
+        hass.data.pop(DATA_TIMER_WHEEL, None)
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, stop)
+    return wheel
+
 class BleakScannerESPHome(BaseBleakScanner):
     """
     A BLE scanner implementation that uses ESPHome devices as Bluetooth proxies.
@@ -579,17 +733,74 @@ class ScaleDataUpdateCoordinator:
     _birthdate: Optional[date] = None
     _height_m: Optional[float] = None
 
-    def __init__(self, hass: HomeAssistant, address: str) -> None:
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        address: str,
+        name: Optional[str] = None,
+        protocol: str = DEFAULT_PROTOCOL,
+    ) -> None:
         """Initialize the ScaleDataUpdateCoordinator.
 
         Args:
             hass: The Home Assistant instance.
             address: The Bluetooth address of the scale.
+            name: The name of the scale.
+            protocol: The registered protocol the scale advertises with.
         """
         self.address = address
+        try:
+            self._protocol: Protocol = get_protocol(protocol)
+        except KeyError:
+            _LOGGER.error(
+                "Unknown protocol %s for %s, using %s", protocol, address, DEFAULT_PROTOCOL
+            )
+            self._protocol = get_protocol(DEFAULT_PROTOCOL)
         self._hass = hass
         self._lock = asyncio.Lock()
         self._listeners: Dict[Callable[[], None], Callable[[any], None]] = {}
+        self._frame_listeners: Dict[Callable[[], None], Callable[[BTScaleData], None]] = {}
+        self._streams: StreamHub[BTScaleData] = StreamHub()
+        self._ingested: deque[BTScaleData] = deque(maxlen=INGESTED_HISTORY_SIZE)
+        self._last_measurement: Optional[BTScaleData] = None
+        self._slot_scheduler = async_get_slot_scheduler(hass)
+        self._router = RssiRouter(has_free_slot=self._slot_scheduler.has_free_slot)
+        self._profile: OneByoneNewLib = default_profile()
+        self.applied_options: Dict[str, Any] = {}
+        self._profiles = ProfileIndex()
+        self._last_by_user: Dict[str, BTScaleData] = {}
+        self._session = WeighInSession()
+        self._session_unsub: Optional[Callable[[], None]] = None
+        self._timer_wheel = async_get_timer_wheel(hass)
+        self._presence = DevicePresence()
+        self._presence_timeout: float = DEFAULT_PRESENCE_TIMEOUT
+        self._presence_listeners: Dict[Callable[[], None], Callable[[], None]] = {}
+        self._statistics = MeasurementStatistics(hass, address, name or address)
+        self._statistics_unsub: Optional[Callable[[], None]] = None
+        self._profile_version = 1
+        self._store: Store[Dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, f"{STORAGE_KEY}.{address}"
+        )
+        self._history = MeasurementStore(
+            hass.config.path(STORAGE_DIR, f"{HISTORY_STORE_KEY}.{slugify(address)}")
+        )
+        self._history_lock = asyncio.Lock()
+        self._trends = TrendEngine()
+        self._rederive_job: Optional[RederiveJob] = None
+        self._sync_lock = asyncio.Lock()
+        self._sync_task: Optional[asyncio.Task] = None
+        self._sync_due = False
+        # Profiles the statistics were last derived with, known once restored
+        self._derived_profiles: Optional[Dict[str, Any]] = None
+        self._trend_listeners: Dict[
+            Callable[[], None], Callable[[Optional[str]], None]
+        ] = {}
+        self._mqtt_settings: Optional[Dict[str, Any]] = None
+        self._mqtt: Optional[SharedMqttExporter] = None
+        self._mqtt_unsub: Optional[Callable[[], None]] = None
+        self._field_decoder: Optional[FieldDecoder] = None
+        self._field_values: Dict[str, FieldValue] = {}
+        self._field_listeners: Dict[Callable[[], None], Callable[[], None]] = {}
 
     def set_display_unit(self, unit:str) -> None:
         """Set the display unit for the scale.
@@ -721,9 +932,24 @@ class ScaleDataUpdateCoordinator:
                 if not data:
                     _LOGGER.warning("Received empty data update from scale %s", self.address)
                     return
-                
-                # decode the data to be published
-                new_data = BTScaleData(data)
+
+                # The scanner filters on service UUIDs other devices share,
+                # e.g. HID or another scale of the same protocol
+                if device.address.upper() != self.address.upper():
+                    return
+                source = self._record_sources(device, data)
+                self._record_presence(source, data.rssi)
+                payload = self._protocol.payload(data)
+                if self._field_decoder is not None and payload is not None:
+                    self._decode_fields(payload)
+
+                # decode the data to be published, straight with the
+                # protocol fingerprinted when the entry was created
+                if payload is None:
+                    return
+                if (new_data := self._protocol.decode(payload, self._profile)) is None:
+                    return
+                new_data.timestamp = datetime.now(timezone.utc)
                 _LOGGER.debug(new_data)
 
                 # Log received measurements
@@ -735,24 +961,26 @@ class ScaleDataUpdateCoordinator:
                 #     ", ".join(measurements),
                 # )
 
-                # Update all listeners
-                listener_count = len(self._listeners)
-                _LOGGER.debug("Updating %d listeners with new scale data", listener_count)
-
-                # Make a copy of listeners to avoid modification during iteration
-                for update_callback in list(self._listeners.values()):
-                    try:
-                        update_callback(new_data)
-                    except Exception as ex:
-                        _LOGGER.error("Error updating listener: %s", ex)
+                if self._frame_listeners:
+                    if not new_data.full_bytes:
+                        new_data.full_bytes = list(payload)
+                    for frame_callback in list(self._frame_listeners.values()):
+                        frame_callback(new_data)
+                self._handle_frame(new_data)
 
             # Initialize appropriate client
             try:
                 _LOGGER.debug("Initializing new SmartScale client")
                 self._client = GenericBTDevice(self.address)
+                self._client.set_connection_candidates(
+                    partial(self._router.routes, self.address)
+                )
+                self._client.set_slot_scheduler(self._slot_scheduler)
 
                 await asyncio.wait_for(self._client.async_start(
-                    detection_callback=update_listeners), timeout=30.0)
+                    detection_callback=update_listeners,
+                    service_uuids=sorted(self._protocol.service_uuids) or None,
+                ), timeout=30.0)
                 _LOGGER.debug("Scale client started successfully")
             except asyncio.TimeoutError:
                 _LOGGER.error(
@@ -787,6 +1015,785 @@ class ScaleDataUpdateCoordinator:
             _LOGGER.exception("Failed to initialize scale client: %s", ex)
             raise
 
+    @callback
+    def _record_sources(self, device: BLEDevice, data: AdvertisementData) -> str:
+        """Record the RSSI of the scale at every source that hears it.
+
+        Home Assistant tracks the latest advertisement of the scale per
+        adapter and proxy, with a BLEDevice for each; the advertisement
+        itself only tells the source with an ESPHome scanner.
+
+        Args:
+            device: The device of the advertisement.
+            data: The advertisement data from a scanner callback.
+
+        Returns:
+            The source with the strongest signal.
+        """
+        scanner_devices = async_scanner_devices_by_address(
+            self._hass, self.address, connectable=True
+        )
+        if not scanner_devices:
+            source = self._advertisement_source(data)
+            self._ensure_slots(source)
+            self._router.record(self.address, source, data.rssi, device)
+            return source
+        for scanner_device in scanner_devices:
+            self._ensure_slots(scanner_device.scanner.source)
+            self._router.record(
+                self.address,
+                scanner_device.scanner.source,
+                scanner_device.advertisement.rssi,
+                scanner_device.ble_device,
+            )
+        best = max(scanner_devices, key=lambda scanner_device: scanner_device.advertisement.rssi)
+        return best.scanner.source
+
+    @callback
+    def _ensure_slots(self, source: str) -> None:
+        self._slot_scheduler.ensure_source(
+            source,
+            LOCAL_ADAPTER_SLOTS if source == LOCAL_SOURCE else ESPHOME_PROXY_SLOTS,
+        )
+
+    @staticmethod
+    def _advertisement_source(data: AdvertisementData) -> str:
+        """Name the scanner source an advertisement was heard through.
+
+        Args:
+            data: The advertisement data from a scanner callback.
+
+        Returns:
+            The ESPHome proxy address for proxied advertisements, otherwise
+            the local adapter source.
+        """
+        platform_data = data.platform_data
+        if (
+            isinstance(platform_data, tuple)
+            and len(platform_data) == 2
+            and isinstance(platform_data[1], APIClient)
+        ):
+            return platform_data[1].address
+        return LOCAL_SOURCE
+
+    @property
+    def source_rssi(self) -> Dict[str, float]:
+        """Smoothed RSSI of the scale per scanner source, strongest first."""
+        return {
+            reading.source: reading.rssi for reading in self._router.readings(self.address)
+        }
+
+    @property
+    def presence(self) -> DevicePresence:
+        """Presence, last sighting and advertisement rate of the scale."""
+        return self._presence
+
+    @callback
+    def _record_presence(self, source: str, rssi: Optional[int]) -> None:
+        """Push back the presence timeout on an advertisement of the scale.
+
+        Args:
+            source: The scanner source the advertisement was heard through.
+            rssi: The signal strength of the advertisement.
+        """
+        now = time.monotonic()
+        arrived = self._presence.seen(now, datetime.now(timezone.utc), rssi, source)
+        wheel = self._timer_wheel
+        wheel.schedule(
+            (self.address, "presence"), self._presence_timeout, self._presence_expired, now
+        )
+        if arrived:
+            _LOGGER.debug("Scale %s is in range", self.address)
+            self._notify_presence()
+            # Fetch what was weighed while out of range, once the weigh-in
+            # that woke the scale is over
+            if self._protocol.has_history and async_ble_device_from_address(
+                self._hass, self.address, connectable=True
+            ):
+                self._sync_due = True
+                wheel.schedule(
+                    (self.address, "history_sync"),
+                    HISTORY_SYNC_DELAY,
+                    self._history_sync_due,
+                    now,
+                )
+        # Diagnostics are refreshed periodically, not per advertisement
+        if (self.address, "diagnostics") not in wheel:
+            wheel.schedule(
+                (self.address, "diagnostics"),
+                DIAGNOSTICS_INTERVAL,
+                self._diagnostics_due,
+                now,
+            )
+
+    @property
+    def field_decoder(self) -> Optional[FieldDecoder]:
+        """The decoder of the user-declared fields, None if none are declared."""
+        return self._field_decoder
+
+    @property
+    def field_values(self) -> Dict[str, FieldValue]:
+        """The user-declared fields of the latest frame that had them all."""
+        return self._field_values
+
+    @callback
+    def _decode_fields(self, frame: bytes) -> None:
+        # A broken declared field must not cost the scale's own measurement
+        try:
+            values = self._field_decoder.decode(frame)
+        except Exception as ex:  # pylint: disable=broad-except
+            _LOGGER.debug("Failed to decode the declared fields of %s: %s", self.address, ex)
+            return
+        if values is None:
+            return
+        self._field_values = values
+        for field_callback in list(self._field_listeners.values()):
+            field_callback()
+
+    @callback
+    def add_field_listener(self, update_callback: Callable[[], None]) -> Callable[[], None]:
+        """Listen for newly decoded user-declared fields.
+
+        Args:
+            update_callback: Function to call, read field_values for the values.
+
+        Returns:
+            Function to call to remove the listener.
+        """
+
+        @callback
+        def remove_listener() -> None:
+            self._field_listeners.pop(remove_listener, None)
+
+        self._field_listeners[remove_listener] = update_callback
+        return remove_listener
+
+    @property
+    def health(self) -> Dict[str, Any]:
+        """Presence and advertisement statistics, as exported to MQTT."""
+        presence = self._presence
+        return {
+            "present": presence.present,
+            "last_seen": presence.last_seen_at.isoformat() if presence.last_seen_at else None,
+            "rssi": presence.rssi,
+            "source": presence.source,
+            "advertisements": presence.advertisements,
+            "advertisement_rate": presence.rate,
+        }
+
+    @callback
+    def _export_health(self) -> None:
+        if self._mqtt is not None:
+            self._mqtt.publish_health(self.address, self.health)
+
+    @callback
+    def _presence_expired(self) -> None:
+        if self._presence.expire():
+            _LOGGER.info(
+                "Scale %s not seen for %s seconds", self.address, self._presence_timeout
+            )
+            self._timer_wheel.cancel((self.address, "diagnostics"))
+            self._notify_presence()
+
+    @callback
+    def _history_sync_due(self) -> None:
+        """Start a pending history download unless a weigh-in is in progress."""
+        if not self._sync_due:
+            return
+        wheel = self._timer_wheel
+        if self._session.pending:
+            wheel.schedule(
+                (self.address, "history_sync"),
+                HISTORY_SYNC_DELAY,
+                self._history_sync_due,
+                time.monotonic(),
+            )
+            return
+        wheel.cancel((self.address, "history_sync"))
+        if self._sync_task is None and not self._sync_lock.locked():
+            self._sync_due = False
+            self._sync_task = self._hass.async_create_task(
+                self._async_sync_history_on_arrival()
+            )
+
+    @callback
+    def _diagnostics_due(self) -> None:
+        self._notify_presence()
+
+    @callback
+    def _notify_presence(self) -> None:
+        for presence_callback in list(self._presence_listeners.values()):
+            presence_callback()
+
+    @callback
+    def add_presence_listener(self, update_callback: Callable[[], None]) -> Callable[[], None]:
+        """Listen for presence changes and periodic diagnostics refreshes.
+
+        Args:
+            update_callback: Function to call, read presence for the state.
+
+        Returns:
+            Function to call to remove the listener.
+        """
+
+        @callback
+        def remove_listener() -> None:
+            self._presence_listeners.pop(remove_listener, None)
+
+        self._presence_listeners[remove_listener] = update_callback
+        return remove_listener
+
+    @property
+    def slot_stats(self) -> Dict[str, Any]:
+        """Queue depth and wait times of the shared connection slot scheduler."""
+        return self._slot_scheduler.stats
+
+    @property
+    def last_measurement(self) -> Optional[BTScaleData]:
+        """The latest measurement published to the listeners."""
+        return self._last_measurement
+
+    def _publish(self, data: BTScaleData, persist: bool = True) -> None:
+        """Update all registered listeners with a measurement.
+
+        Args:
+            data: The scale data to send to listeners.
+            persist: Whether to save the raw readings for the next startup.
+        """
+        self._last_measurement = data
+        if persist:
+            self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+        listener_count = len(self._listeners)
+        _LOGGER.debug("Updating %d listeners with new scale data", listener_count)
+
+        # Make a copy of listeners to avoid modification during iteration
+        for update_callback in list(self._listeners.values()):
+            try:
+                update_callback(data)
+            except Exception as ex:
+                _LOGGER.error("Error updating listener: %s", ex)
+        self._streams.publish(data)
+
+    @staticmethod
+    def _raw_record(data: BTScaleData) -> Dict[str, Any]:
+        """Return the raw readings a measurement can be recomputed from."""
+        return {
+            "raw_weight": data.raw_weight,
+            "impedance": data.impedance,
+            "unit_flag": data.unit_flag,
+            "timestamp": data.timestamp.isoformat() if data.timestamp else None,
+            "user_id": data.user_id,
+        }
+
+    def _from_raw_record(self, stored: Dict[str, Any]) -> BTScaleData:
+        """Recompute a measurement from stored raw readings.
+
+        Raises:
+            KeyError, TypeError, ValueError: The stored record is invalid.
+        """
+        timestamp = stored.get("timestamp")
+        data = BTScaleData.from_raw(
+            stored["raw_weight"],
+            stored["impedance"],
+            stored.get("unit_flag", 1),
+            datetime.fromisoformat(timestamp) if timestamp else None,
+            self._profile,
+        )
+        if (user_id := stored.get("user_id")) and (profile := self._profiles.get(user_id)):
+            self._profiles.update_weight(user_id, data.weight_kg)
+            self._apply_user(data, profile)
+        return data
+
+    @callback
+    def _data_to_save(self) -> Dict[str, Any]:
+        """Return the raw readings of the last measurements for storage."""
+        last = self._last_measurement
+        return {
+            **(self._raw_record(last) if last is not None else {}),
+            "profile_version": self._profile_version,
+            "users": {
+                user_id: self._raw_record(data)
+                for user_id, data in self._last_by_user.items()
+            },
+            "trends": self._trends.as_dict(),
+            "derived_profiles": self._derived_profiles or {},
+        }
+
+    async def _async_restore(self) -> None:
+        """Recompute the last measurements from their stored raw readings.
+
+        Every sensor is derived from the same raw weight and impedance, so
+        one stored record per user restores all of them in a single publish.
+        """
+        if (stored := await self._store.async_load()) is None:
+            self._derived_profiles = {}
+            return
+        self._derived_profiles = stored.get("derived_profiles", {})
+        try:
+            self._trends = TrendEngine.from_dict(stored.get("trends", {}))
+        except (KeyError, TypeError, ValueError) as ex:
+            _LOGGER.warning("Ignoring invalid stored trends for %s: %s", self.address, ex)
+        for user_id in {user_id for user_id, _metric in self._trends}:
+            for trend_callback in list(self._trend_listeners.values()):
+                trend_callback(user_id)
+        if "raw_weight" not in stored:
+            return
+        try:
+            for user_record in stored.get("users", {}).values():
+                data = self._from_raw_record(user_record)
+                if data.user_id:
+                    self._last_by_user[data.user_id] = data
+                    self._publish(data, persist=False)
+            data = self._from_raw_record(stored)
+        except (KeyError, TypeError, ValueError, ZeroDivisionError) as ex:
+            _LOGGER.warning("Ignoring invalid stored measurement for %s: %s", self.address, ex)
+            return
+        _LOGGER.debug(
+            "Restored measurement for %s stored with profile version %s",
+            self.address,
+            stored.get("profile_version"),
+        )
+        self._publish(data, persist=False)
+
+    def statistic_id(self, user_id: Optional[str], key: str) -> str:
+        """Return the long-term statistic id of a user's measurement."""
+        return self._statistics.statistic_id(user_id, key)
+
+    @callback
+    def replace_statistics(
+        self, hours: Dict[Tuple[str, str, datetime], HourAccumulator]
+    ) -> None:
+        """Overwrite whole hours of the long-term statistics.
+
+        Args:
+            hours: Accumulators keyed by user ("" for the scale), statistic
+                key and hour start.
+        """
+        self._statistics.async_replace(hours)
+
+    @callback
+    def replace_trends(self, users: List[Optional[str]], trends: TrendEngine) -> None:
+        """Overwrite the trends of users with recomputed ones.
+
+        Args:
+            users: The users to replace, None for unattributed measurements.
+            trends: Trends rebuilt from the recomputed history.
+        """
+        self._trends.replace(users, trends)
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+        for user_id in users:
+            for trend_callback in list(self._trend_listeners.values()):
+                trend_callback(user_id)
+
+    def _rederive_profiles(self) -> Dict[Optional[str], Any]:
+        """Return the profile to recompute the history of every user with.
+
+        People are returned as UserProfile so workers can use their age on
+        the day of each measurement.
+        """
+        scale: Any = self._profile
+        if self.body_metrics_enabled and None not in (self._sex, self._birthdate, self._height_m):
+            scale = UserProfile(
+                user_id="",
+                name="",
+                sex=_sex_to_int(self._sex),
+                birthdate=self._birthdate,
+                height_cm=self._height_m * 100,
+            )
+        profiles: Dict[Optional[str], Any] = {None: scale}
+        for profile in self._profiles:
+            profiles[profile.user_id] = profile
+        return profiles
+
+    def _profile_fingerprints(self) -> Dict[str, Any]:
+        """Describe the inputs of every profile, keyed by user id or ""."""
+        fingerprints: Dict[str, Any] = {
+            "": [self._sex, self._birthdate and self._birthdate.isoformat(), self._height_m]
+        }
+        for profile in self._profiles:
+            fingerprints[profile.user_id] = [
+                profile.sex,
+                profile.birthdate.isoformat(),
+                profile.height_cm,
+                profile.people_type,
+            ]
+        return fingerprints
+
+    @callback
+    def _check_profiles(self) -> None:
+        """Recompute the history of every user whose profile changed."""
+        if self._derived_profiles is None:
+            return
+        current = self._profile_fingerprints()
+        changed = [
+            user_id
+            for user_id, fingerprint in current.items()
+            if user_id in self._derived_profiles
+            and self._derived_profiles[user_id] != fingerprint
+        ]
+        if current == self._derived_profiles:
+            return
+        self._derived_profiles = current
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+        if changed:
+            _LOGGER.info(
+                "Body metrics profiles of %s changed, recomputing their history",
+                self.address,
+            )
+            self.async_rederive([user_id or None for user_id in changed])
+
+    @callback
+    def async_rederive(
+        self,
+        users: Optional[List[Optional[str]]] = None,
+        workers: Optional[int] = None,
+    ) -> RederiveJob:
+        """Recompute the stored history and rewrite its long-term statistics.
+
+        Runs in the background; a job already running is cancelled first.
+        Progress is fired as EVENT_REDERIVE_PROGRESS events.
+
+        Args:
+            users: The users to recompute, None for unattributed
+                measurements. Defaults to everyone.
+            workers: Worker processes, 0 to use an executor thread.
+
+        Returns:
+            The started job.
+        """
+        self.cancel_rederive()
+        profiles = self._rederive_profiles()
+        if users is not None:
+            profiles = {
+                user_id: profile for user_id, profile in profiles.items() if user_id in users
+            }
+        self._rederive_job = RederiveJob(self._hass, self, profiles, workers)
+        self._rederive_job.start()
+        return self._rederive_job
+
+    @callback
+    def cancel_rederive(self) -> bool:
+        """Cancel the running recompute job, returns whether one was running."""
+        if (job := self._rederive_job) is None or job.done:
+            return False
+        job.cancel()
+        return True
+
+    @property
+    def rederive_status(self) -> Optional[Dict[str, Any]]:
+        """State and progress of the last recompute job."""
+        return self._rederive_job.as_dict() if self._rederive_job else None
+
+    def calculation_profiles(self) -> Dict[Optional[str], OneByoneNewLib]:
+        """Snapshot the body metrics profile of the scale and every user.
+
+        Returns:
+            The profile keyed by user id, the scale's own profile under None.
+        """
+        profiles: Dict[Optional[str], OneByoneNewLib] = {None: self._profile}
+        for profile in self._profiles:
+            profiles[profile.user_id] = profile.calculation_object()
+        return profiles
+
+    @property
+    def profiles(self) -> ProfileIndex:
+        """The household profiles measurements are attributed to."""
+        return self._profiles
+
+    @staticmethod
+    def _apply_user(data: BTScaleData, profile: UserProfile) -> None:
+        """Recompute a measurement's body metrics for the person it belongs to."""
+        data.user_id = profile.user_id
+        data.user_name = profile.name
+        data.attribution = Attribution.MATCHED.value
+        data.calculation_object = profile.calculation_object()
+        data.calculate(data.raw_weight, data.impedance, data.unit_flag)
+
+    def _attribute(self, data: BTScaleData) -> BTScaleData:
+        """Attribute a measurement to the household profile it belongs to.
+
+        Args:
+            data: A decoded measurement.
+
+        Returns:
+            The measurement, recomputed with the matched person's profile.
+            Ambiguous and unknown weigh-ins keep the scale's own profile.
+        """
+        if not len(self._profiles):
+            return data
+
+        result = self._profiles.match(data.weight_kg)
+        data.attribution = result.attribution.value
+        if result.profile is None:
+            _LOGGER.debug(
+                "Weigh-in of %s kg on %s is %s", data.weight_kg, self.address, data.attribution
+            )
+            return data
+
+        self._profiles.update_weight(result.profile.user_id, data.weight_kg)
+        self._apply_user(data, result.profile)
+        self._last_by_user[result.profile.user_id] = data
+        return data
+
+    @callback
+    def _handle_frame(self, data: BTScaleData) -> None:
+        """Publish a live frame in two phases.
+
+        A stable weight is published right away with body composition held
+        back; the frame carrying the impedance result publishes every value
+        at once and finalizes the weigh-in.
+
+        Args:
+            data: A frame decoded from an advertisement.
+        """
+        phase = self._session.feed(data, time.monotonic())
+        if self._session.pending:
+            # Finalize with the weight alone if no impedance follows
+            self._cancel_session_timeout()
+            self._session_unsub = async_call_later(
+                self._hass, SESSION_FINALIZE_TIMEOUT, self._session_timeout
+            )
+        if phase is None:
+            return
+
+        self._attribute(data)
+        self._publish(data)
+        if phase is Phase.FINAL:
+            self._cancel_session_timeout()
+            self._complete(data)
+
+    @callback
+    def _session_timeout(self, _now: Any) -> None:
+        self._session_unsub = None
+        if (data := self._session.finalize()) is not None:
+            _LOGGER.debug("Weigh-in on %s ended without impedance", self.address)
+            self._complete(data)
+
+    def _cancel_session_timeout(self) -> None:
+        if self._session_unsub:
+            self._session_unsub()
+            self._session_unsub = None
+
+    def _complete(self, data: BTScaleData) -> None:
+        self._ingested.append(data)
+        self._finalize(data)
+        self._history_sync_due()
+
+    @callback
+    def _finalize(self, data: BTScaleData) -> None:
+        """Record a finalized measurement beyond the entity states.
+
+        Args:
+            data: The measurement, timestamped when it was taken.
+        """
+        self._statistics.add(data)
+
+        flags = RecordFlag(0)
+        if data.impedance_valid:
+            flags |= RecordFlag.IMPEDANCE_VALID
+        if data.historical:
+            flags |= RecordFlag.HISTORICAL
+        if data.attribution == Attribution.MATCHED.value:
+            flags |= RecordFlag.MATCHED
+        elif data.attribution == Attribution.AMBIGUOUS.value:
+            flags |= RecordFlag.AMBIGUOUS
+        self._history.append(
+            data.timestamp or datetime.now(timezone.utc),
+            data.raw_weight,
+            data.impedance,
+            data.unit_flag,
+            data.user_id,
+            flags,
+        )
+        if self._history.batch_due:
+            self._hass.async_create_task(self.async_flush_history())
+
+        if self._trends.add(data):
+            self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+            for trend_callback in list(self._trend_listeners.values()):
+                trend_callback(data.user_id)
+
+        if self._mqtt is not None:
+            self._mqtt.publish_measurement(self.address, data)
+
+    @property
+    def trends(self) -> TrendEngine:
+        """Moving averages, deltas and ranges per user and metric."""
+        return self._trends
+
+    @callback
+    def add_trend_listener(
+        self, update_callback: Callable[[Optional[str]], None]
+    ) -> Callable[[], None]:
+        """Listen for trend updates.
+
+        Args:
+            update_callback: Function to call with the user id whose trends
+                changed, None for unattributed measurements.
+
+        Returns:
+            Function to call to remove the listener.
+        """
+
+        @callback
+        def remove_listener() -> None:
+            self._trend_listeners.pop(remove_listener, None)
+
+        self._trend_listeners[remove_listener] = update_callback
+        return remove_listener
+
+    @property
+    def history(self) -> MeasurementStore:
+        """Raw readings of every finalized measurement of the scale.
+
+        Reading the store does file I/O, iterate it in an executor.
+        """
+        return self._history
+
+    async def async_flush_history(self) -> None:
+        """Write the buffered measurements to the history store."""
+        async with self._history_lock:
+            if not (batch := self._history.take_pending()):
+                return
+            try:
+                await self._hass.async_add_executor_job(self._history.write, batch)
+            except OSError as ex:
+                _LOGGER.error(
+                    "Failed to write measurement history of %s: %s", self.address, ex
+                )
+
+    async def _async_flush(self, _now: Any = None) -> None:
+        # Hours new to this run are rebuilt from the history, written first
+        await self.async_flush_history()
+        await self._async_seed_statistics()
+        self._statistics.async_flush()
+
+    async def _async_seed_statistics(self) -> None:
+        """Rebuild the hours the statistics have not seen whole from the history."""
+        if not (hours := self._statistics.take_unseeded()):
+            return
+        try:
+            aggregates = await self._hass.async_add_executor_job(
+                self._hourly_aggregates, hours, self._rederive_profiles()
+            )
+        except (OSError, StoreError) as ex:
+            _LOGGER.error(
+                "Failed to read measurement history of %s: %s", self.address, ex
+            )
+            aggregates = {}
+        self._statistics.seed(
+            hours,
+            {
+                (user_id or "", key, datetime.fromtimestamp(hour, timezone.utc)): HourAccumulator(
+                    int(count), total, minimum, maximum
+                )
+                for (user_id, key, hour), (count, total, minimum, maximum) in aggregates.items()
+            },
+        )
+
+    def _hourly_aggregates(
+        self, hours: set[datetime], profiles: Dict[Optional[str], Any]
+    ) -> HourlyAggregates:
+        """Aggregate every statistic of the stored measurements of hours, in an executor."""
+        attributes = {key: attribute for key, (attribute, _unit) in STATISTIC_ATTRIBUTES.items()}
+        aggregates: HourlyAggregates = {}
+        for hour in hours:
+            records = self._history.records(hour, hour + timedelta(hours=1))
+            for chunk in raw_chunks(records, REDERIVE_CHUNK_SIZE):
+                merge_aggregates(aggregates, recompute_chunk(chunk, profiles, attributes))
+        return aggregates
+
+    def _stored_timestamps(self) -> Dict[Tuple[int, int], List[datetime]]:
+        """Timestamps of the stored measurements by record key, in an executor."""
+        stored: Dict[Tuple[int, int], List[datetime]] = {}
+        for record in self._history.records():
+            stored.setdefault((record.raw_weight, record.impedance), []).append(
+                record.timestamp
+            )
+        return stored
+
+    def _is_ingested(
+        self, stored: Dict[Tuple[int, int], List[datetime]], record: BTScaleData
+    ) -> bool:
+        """Check whether a history record was already received or imported.
+
+        Args:
+            stored: Timestamps of the history store by record key, which
+                survives restarts unlike the recently ingested measurements.
+            record: A weigh-in downloaded from the scale's memory.
+
+        Returns:
+            bool: True if a measurement with the same values was ingested
+            within the dedupe window around the record's timestamp.
+        """
+        window = timedelta(seconds=HISTORY_DEDUPE_WINDOW_SECONDS)
+        if any(
+            abs(timestamp - record.timestamp) <= window
+            for timestamp in stored.get(record.record_key, ())
+        ):
+            return True
+        return any(
+            known.record_key == record.record_key
+            and abs(known.timestamp - record.timestamp) <= window
+            for known in self._ingested
+        )
+
+    async def async_sync_history(self) -> List[BTScaleData]:
+        """Import the weigh-ins the scale stored while out of range.
+
+        Returns:
+            The newly imported records, oldest first.
+        """
+        if not self._client:
+            raise BleakError(f"Scale {self.address} is not started")
+        if not self._protocol.has_history:
+            raise BleakError(
+                f"Scale {self.address} ({self._protocol.name}) keeps no history"
+            )
+
+        async with self._sync_lock:
+            await self.async_flush_history()
+            try:
+                stored = await self._hass.async_add_executor_job(self._stored_timestamps)
+            except (OSError, StoreError) as ex:
+                _LOGGER.warning(
+                    "Failed to read measurement history of %s: %s", self.address, ex
+                )
+                stored = {}
+            records = await self._client.async_sync_history(
+                is_known=partial(self._is_ingested, stored),
+                calculation_object=self._profile,
+            )
+            _LOGGER.debug(
+                "Imported %d offline measurements from scale %s", len(records), self.address
+            )
+            if not records:
+                return records
+
+            for record in records:
+                self._attribute(record)
+                self._finalize(record)
+            self._ingested.extend(records)
+            # Entities only reflect the latest weigh-in; older records keep
+            # their original timestamps for anything consuming the history.
+            newest = records[-1]
+            last = self._last_measurement
+            if last is None or last.timestamp is None or newest.timestamp > last.timestamp:
+                self._publish(newest)
+            return records
+
+    async def _async_sync_history_on_arrival(self) -> None:
+        """Import the offline weigh-ins once the scale comes into range."""
+        try:
+            await self.async_sync_history()
+        except (BleakError, asyncio.TimeoutError) as ex:
+            _LOGGER.warning(
+                "Failed to import offline measurements from scale %s: %s", self.address, ex
+            )
+        finally:
+            self._sync_task = None
+
     def _registration_changed(self, _: HaScannerRegistration) -> None:
         """Handle Bluetooth scanner registration changes."""
         self._hass.async_create_task(self._async_registration_changed())
@@ -827,6 +1834,22 @@ class ScaleDataUpdateCoordinator:
                 )
             )
 
+        if self._last_measurement is None:
+            await self._async_restore()
+        self._check_profiles()
+
+        if self._mqtt_settings and self._mqtt is None:
+            self._mqtt = await async_get_mqtt_exporter(self._hass, self._mqtt_settings)
+            if self._mqtt is not None:
+                self._mqtt_unsub = self.add_presence_listener(self._export_health)
+
+        if self._statistics_unsub is None:
+            self._statistics_unsub = async_track_time_interval(
+                self._hass,
+                self._async_flush,
+                timedelta(seconds=STATISTICS_FLUSH_INTERVAL),
+            )
+
         async with self._lock:
             try:
                 await self._async_start()
@@ -855,6 +1878,30 @@ class ScaleDataUpdateCoordinator:
                 finally:
                     self._scanner_change_cb_unregister = None
 
+            self._cancel_session_timeout()
+            self._timer_wheel.cancel((self.address, "presence"))
+            self._timer_wheel.cancel((self.address, "diagnostics"))
+            self._streams.close()
+            self.cancel_rederive()
+            self._sync_due = False
+            self._timer_wheel.cancel((self.address, "history_sync"))
+            if self._sync_task is not None:
+                self._sync_task.cancel()
+                self._sync_task = None
+
+            # Flush pending statistics and history
+            if self._statistics_unsub:
+                self._statistics_unsub()
+                self._statistics_unsub = None
+            await self._async_flush()
+
+            if self._mqtt_unsub:
+                self._mqtt_unsub()
+                self._mqtt_unsub = None
+            if self._mqtt is not None:
+                await self._mqtt.async_release()
+                self._mqtt = None
+
             # Stop the client
             if self._client:
                 try:
@@ -886,12 +1933,96 @@ class ScaleDataUpdateCoordinator:
 
         self._listeners[remove_listener] = update_callback
         return remove_listener
+
+    @callback
+    def add_frame_listener(
+        self, frame_callback: Callable[[BTScaleData], None]
+    ) -> Callable[[], None]:
+        """Listen for every decoded frame, before weigh-in filtering.
+
+        Unlike add_listener(), which only sees the frames a weigh-in
+        publishes, this sees every frame the scale advertises, unattributed.
+
+        Args:
+            frame_callback: Function to call with each decoded frame.
+
+        Returns:
+            Function to call to remove the listener.
+        """
+
+        @callback
+        def remove_listener() -> None:
+            self._frame_listeners.pop(remove_listener, None)
+
+        self._frame_listeners[remove_listener] = frame_callback
+        return remove_listener
     
+    @callback
+    def stream(
+        self,
+        maxsize: int = DEFAULT_STREAM_QUEUE_SIZE,
+        overflow: Overflow | str = Overflow.DROP_OLDEST,
+    ) -> MeasurementStream[BTScaleData]:
+        """Consume measurements asynchronously.
+
+        Each stream has its own bounded queue, so a slow consumer only
+        falls behind itself and never delays the entity updates::
+
+            async for measurement in coordinator.stream():
+                ...
+
+        Args:
+            maxsize: How many measurements the consumer may fall behind by.
+            overflow: What happens once it does: drop the oldest queued
+                measurement, drop the newest, or close the stream with
+                StreamOverflowError.
+
+        Returns:
+            The stream, an async iterator that ends when the coordinator
+            stops or the stream is closed.
+        """
+        return self._streams.open(maxsize, Overflow(overflow))
+
+    @property
+    def stream_stats(self) -> List[Dict[str, Any]]:
+        """Queue depth, drops and delivery lag of every open stream."""
+        return self._streams.stats
+
     @callback
     def disconnect_listener(self, devices: BLEDevice, data: AdvertisementData) -> None:
         _LOGGER.debug("Disconnected")
         pass
 
+    @property
+    def profile_version(self) -> int:
+        """Incremented whenever the body metrics profile changes."""
+        return self._profile_version
+
+    @callback
+    def _set_profile(self, profile: OneByoneNewLib) -> None:
+        """Swap the body metrics profile and re-evaluate the last measurement.
+
+        The running scanner and client are left untouched; only measurements
+        decoded from now on, and the re-published last one, use the profile.
+
+        Args:
+            profile: The new body metrics profile.
+        """
+        self._profile = profile
+        self._profile_version += 1
+
+        # Attributed measurements are calculated with their user's profile
+        if (last := self._last_measurement) is not None and last.user_id is None:
+            self._publish(
+                BTScaleData.from_raw(
+                    last.raw_weight,
+                    last.impedance,
+                    last.unit_flag,
+                    last.timestamp,
+                    profile,
+                )
+            )
+
     async def enable_body_metrics(
         self, sex: Sex, birthdate: date, height_m: float
     ) -> None:
@@ -902,45 +2033,112 @@ class ScaleDataUpdateCoordinator:
             birthdate: The birthdate of the user.
             height_m: The height of the user in meters.
         """
-        if not self.body_metrics_enabled:
-            _LOGGER.debug(
-                "Enabling body metrics with sex=%s, birthdate=%s, height=%f",
-                sex,
-                birthdate,
-                height_m,
-            )
-
-            async with self._lock:
-                self.body_metrics_enabled = True
-                self._sex = sex
-                self._birthdate = birthdate
-                self._height_m = height_m
+        _LOGGER.debug(
+            "Enabling body metrics with sex=%s, birthdate=%s, height=%f",
+            sex,
+            birthdate,
+            height_m,
+        )
 
-                if self._client:
-                    try:
-                        await self._async_start()
-                    except Exception as ex:
-                        _LOGGER.error(
-                            "Failed to restart client after enabling body metrics: %s",
-                            ex,
-                        )
+        self.body_metrics_enabled = True
+        self._sex = sex
+        self._birthdate = birthdate
+        self._height_m = height_m
+        self._set_profile(
+            OneByoneNewLib(
+                sex=_sex_to_int(sex),
+                age=_age_on(birthdate, date.today()),
+                height=height_m * 100,
+                people_type=PEOPLE_TYPE,
+            )
+        )
 
     async def disable_body_metrics(self) -> None:
         """Disable body metrics calculations."""
         if self.body_metrics_enabled:
             _LOGGER.debug("Disabling body metrics")
 
-            async with self._lock:
-                self.body_metrics_enabled = False
-                self._sex = None
-                self._birthdate = None
-                self._height_m = None
+            self.body_metrics_enabled = False
+            self._sex = None
+            self._birthdate = None
+            self._height_m = None
+            self._set_profile(default_profile())
 
-                if self._client:
-                    try:
-                        await self._async_start()
-                    except Exception as ex:
-                        _LOGGER.error(
-                            "Failed to restart client after disabling body metrics: %s",
-                            ex,
-                        )
\ No newline at end of file
+    async def async_apply_options(self, options: Dict[str, Any]) -> None:
+        """Apply the body metrics profile from the config entry options.
+
+        Args:
+            options: The config entry options.
+        """
+        self.applied_options = dict(options)
+        self._presence_timeout = float(
+            options.get(CONF_PRESENCE_TIMEOUT, DEFAULT_PRESENCE_TIMEOUT)
+        )
+        self._apply_user_options(options.get(CONF_USERS, []))
+        # Applied on the next start, changing it reloads the entry
+        self._mqtt_settings = options.get(CONF_MQTT) or None
+        # Compiled once here, not per frame
+        self._field_decoder = None
+        if fields := options.get(CONF_FIELDS):
+            try:
+                self._field_decoder = FieldDecoder.from_config(fields)
+            except FieldSchemaError as ex:
+                _LOGGER.error("Ignoring the fields declared for %s: %s", self.address, ex)
+
+        height_cm = options.get(CONF_HEIGHT)
+        birthdate = options.get(CONF_BIRTHDATE)
+        sex = options.get(CONF_SEX)
+        if not options.get(CONF_CALC_BODY_METRICS) or None in (height_cm, birthdate, sex):
+            await self.disable_body_metrics()
+        else:
+            if isinstance(birthdate, str):
+                birthdate = date.fromisoformat(birthdate)
+            height_m = float(height_cm) / 100
+            if (sex, birthdate, height_m) != (self._sex, self._birthdate, self._height_m):
+                await self.enable_body_metrics(sex, birthdate, height_m)
+        self._check_profiles()
+
+
+    def _apply_user_options(self, users: List[Dict[str, Any]]) -> None:
+        """Rebuild the profile index from the configured household users.
+
+        Args:
+            users: The user dicts from the config entry options.
+        """
+        profiles: List[UserProfile] = []
+        for user in users:
+            try:
+                user_id = slugify(user[CONF_NAME])
+                birthdate = user[CONF_BIRTHDATE]
+                if isinstance(birthdate, str):
+                    birthdate = date.fromisoformat(birthdate)
+                previous = self._profiles.get(user_id)
+                profiles.append(
+                    UserProfile(
+                        user_id=user_id,
+                        name=user[CONF_NAME],
+                        sex=_sex_to_int(user[CONF_SEX]),
+                        birthdate=birthdate,
+                        height_cm=float(user[CONF_HEIGHT]),
+                        last_weight=previous.last_weight
+                        if previous and previous.last_weight is not None
+                        else user.get(CONF_WEIGHT),
+                    )
+                )
+            except (KeyError, TypeError, ValueError) as ex:
+                _LOGGER.warning("Ignoring invalid user profile %s: %s", user, ex)
+        self._profiles = ProfileIndex(profiles)
+
+
+def _sex_to_int(sex: Any) -> int:
+    """Map a configured sex to the calculation library's 0 female, 1 male."""
+    if isinstance(sex, str):
+        return 1 if sex.lower() == "male" else 0
+    return int(sex)
+
+
+def _age_on(birthdate: date, today: date) -> int:
+    """Return the age in whole years on a given day."""
+    return today.year - birthdate.year - (
+        (today.month, today.day) < (birthdate.month, birthdate.day)
+    )
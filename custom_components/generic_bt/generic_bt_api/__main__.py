@@ -0,0 +1,5 @@
+"""Entry point of python -m generic_bt_api"""
+from .cli import main
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,386 @@
+"""Decode captured scale frames offline, without Home Assistant
+
+Run from the directory holding generic_bt_api:
+
+    python -m generic_bt_api capture.txt -o measurements.csv
+
+Every input line holds one captured payload as hex, optionally preceded by
+the time it was captured (ISO 8601 or seconds since the epoch):
+
+    2024-05-01T07:30:12+00:00 1d02...
+    1714548612.5,1d02...
+    {"timestamp": 1714548612.5, "data": "1d02..."}
+
+Blank lines and lines starting with # are skipped; files ending in .gz are
+decompressed on the fly. Lines are read lazily and decoded in chunks on a
+process pool with a bounded number of chunks in flight, and the results are
+written in input order as they come back, so memory does not grow with the
+size of the capture.
+"""
+from __future__ import annotations
+
+import argparse
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+import gzip
+import json
+import logging
+import os
+import sys
+from typing import IO, Any, TypeVar, Union
+
+from .const import DEFAULT_EXPORT_CHUNK_SIZE, DEFAULT_PROTOCOL
+from .export import FORMAT_CSV, FORMATS, METRIC_COLUMNS, STDOUT, chunked, open_writer
+from .framer import FrameReassembler
+from .parser import (
+    AGE,
+    HEIGHT,
+    PEOPLE_TYPE,
+    SEX,
+    BTScaleData,
+    OneByoneNewLib,
+    default_profile,
+)
+from .protocols import PROTOCOLS, get_protocol
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# The payload of an advertisement in the chosen protocol, one per line
+MODE_ADVERTISEMENT = "advertisement"
+# Notifications that may split or merge frames, reassembled by header
+MODE_NOTIFY = "notify"
+# Stored weigh-ins replayed by the scale, timestamped by the scale itself
+MODE_HISTORY = "history"
+MODES = (MODE_ADVERTISEMENT, MODE_NOTIFY, MODE_HISTORY)
+
+# Bytes a notified or history frame needs for parse_scale_packet()
+MIN_PAYLOAD_LENGTH = 16
+
+COLUMNS = (
+    "line",
+    "timestamp",
+    "weight_kg",
+    "raw_weight",
+    "impedance",
+    "impedance_valid",
+    "unit_flag",
+    "unit",
+    "historical",
+    "frame",
+    *METRIC_COLUMNS,
+)
+# Parquet types of the columns export.COLUMN_TYPES does not know
+COLUMN_TYPES = {"line": "int64", "impedance_valid": "bool_", "unit": "string", "frame": "string"}
+
+# (input line number, capture time, payload)
+Frame = tuple[int, Union[datetime, None], bytes]
+
+
+class CaptureError(ValueError):
+    """A capture line that cannot be read"""
+
+
+def parse_timestamp(value: str | float | int | None) -> datetime | None:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc)
+    try:
+        return datetime.fromtimestamp(float(value), timezone.utc)
+    except ValueError:
+        pass
+    timestamp = datetime.fromisoformat(value)
+    return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+
+
+def parse_line(line: str) -> tuple[datetime | None, bytes] | None:
+    """Split a capture line into its capture time and payload
+
+    Returns:
+        None for blank and comment lines.
+
+    Raises:
+        CaptureError: The line holds no valid hex payload or timestamp.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    try:
+        if line.startswith("{"):
+            record = json.loads(line)
+            timestamp, payload = record.get("timestamp"), record["data"]
+        else:
+            *fields, payload = line.replace(",", " ").split()
+            timestamp = " ".join(fields) or None
+        return parse_timestamp(timestamp), bytes.fromhex(payload.replace(":", ""))
+    except (KeyError, TypeError, ValueError) as ex:
+        raise CaptureError(f"{ex}") from ex
+
+
+def read_lines(paths: Sequence[str]) -> Iterator[tuple[int, str]]:
+    """Yield the numbered lines of every input, "-" reads standard input"""
+    number = 0
+    for path in paths:
+        stream: IO[str]
+        if path == STDOUT:
+            stream = sys.stdin
+        elif path.endswith(".gz"):
+            stream = gzip.open(path, "rt", encoding="utf-8")
+        else:
+            stream = open(path, encoding="utf-8")
+        try:
+            for line in stream:
+                number += 1
+                yield number, line
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def read_frames(
+    lines: Iterable[tuple[int, str]], mode: str, stats: dict[str, int]
+) -> Iterator[Frame]:
+    """Turn capture lines into the frames to decode
+
+    Notifications are reassembled here, in input order; every frame is
+    attributed to the line that completed it.
+    """
+    reassembler = FrameReassembler() if mode == MODE_NOTIFY else None
+    for number, line in lines:
+        try:
+            parsed = parse_line(line)
+        except CaptureError as ex:
+            stats["invalid_lines"] += 1
+            _LOGGER.warning("Skipping line %d: %s", number, ex)
+            continue
+        if parsed is None:
+            continue
+        timestamp, payload = parsed
+        if reassembler is None:
+            yield number, timestamp, payload
+            continue
+        for frame in reassembler.feed(payload):
+            yield number, timestamp, bytes(frame)
+    if reassembler is not None:
+        stats["dropped_bytes"] = reassembler.dropped_bytes
+        stats["torn_frames"] = reassembler.torn_frames
+
+
+def decode_chunk(
+    frames: list[Frame], mode: str, profile: OneByoneNewLib, protocol: str = DEFAULT_PROTOCOL
+) -> tuple[list[dict[str, Any]], int]:
+    """Decode a chunk of frames, runs in a worker process
+
+    Advertisement payloads are decoded with the named protocol, notified
+    and history frames always use the framed layout of BTScaleData.
+
+    Returns:
+        The rows of the decoded frames and the number of frames skipped.
+    """
+    decoder = get_protocol(protocol)
+    min_length = decoder.min_length if mode == MODE_ADVERTISEMENT else MIN_PAYLOAD_LENGTH
+    rows = []
+    skipped = 0
+    for number, timestamp, payload in frames:
+        if len(payload) < min_length:
+            _LOGGER.warning("Skipping line %d: frame of %d bytes is too short", number, len(payload))
+            skipped += 1
+            continue
+        if mode == MODE_HISTORY:
+            data = BTScaleData.from_history_frame(payload, profile)
+        elif mode == MODE_NOTIFY:
+            data = BTScaleData.from_bytes(payload, timestamp, profile)
+        elif (data := decoder.decode(payload, profile)) is None:
+            # E.g. sent while stepping off the scale
+            skipped += 1
+            continue
+        else:
+            data.timestamp = timestamp
+        row = {
+            "line": number,
+            "timestamp": data.timestamp.isoformat() if data.timestamp else None,
+            "weight_kg": data.weight_kg,
+            "raw_weight": data.raw_weight,
+            "impedance": data.impedance,
+            "impedance_valid": data.impedance_valid,
+            "unit_flag": data.unit_flag,
+            "unit": data.unit_guess,
+            "historical": data.historical,
+            "frame": payload.hex(),
+        }
+        for column, attribute in METRIC_COLUMNS.items():
+            row[column] = getattr(data, attribute)
+        rows.append(row)
+    return rows, skipped
+
+
+def ordered_map(
+    executor: Executor | None, function: Callable[[T], R], items: Iterable[T], window: int
+) -> Iterator[R]:
+    """Map function over items on executor, yielding results in input order
+
+    At most window items are submitted ahead of the result being yielded, so
+    neither the input nor the results pile up in memory. Without an executor
+    the items are mapped in this process.
+    """
+    if executor is None:
+        yield from map(function, items)
+        return
+    pending: deque[Future[R]] = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def decode(
+    paths: Sequence[str],
+    output: str,
+    fmt: str = FORMAT_CSV,
+    mode: str = MODE_ADVERTISEMENT,
+    profile: OneByoneNewLib | None = None,
+    protocol: str = DEFAULT_PROTOCOL,
+    workers: int | None = None,
+    chunk_size: int = DEFAULT_EXPORT_CHUNK_SIZE,
+) -> dict[str, int]:
+    """Decode the frames of capture files and write a row per measurement
+
+    Args:
+        paths: Capture files, "-" for standard input.
+        output: The file to write, "-" for standard output.
+        fmt: One of FORMATS.
+        mode: One of MODES, how the payloads were captured.
+        profile: The profile to compute body metrics with.
+        protocol: The registered protocol of advertisement payloads.
+        workers: Worker processes, 0 to decode in this process; defaults to
+            the number of CPUs.
+        chunk_size: Frames per chunk sent to a worker.
+
+    Returns:
+        Counts of the lines and frames read, decoded and skipped.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    stats = {"frames": 0, "decoded": 0, "skipped": 0, "invalid_lines": 0}
+    lines = read_lines(paths)
+
+    def counted(frames: Iterator[Frame]) -> Iterator[Frame]:
+        for frame in frames:
+            stats["frames"] += 1
+            yield frame
+
+    chunks = chunked(counted(read_frames(lines, mode, stats)), chunk_size)
+    job = partial(
+        decode_chunk, mode=mode, profile=profile or default_profile(), protocol=protocol
+    )
+    executor = ProcessPoolExecutor(workers) if workers else None
+    try:
+        with open_writer(output, fmt, COLUMNS, COLUMN_TYPES) as writer:
+            for rows, skipped in ordered_map(executor, job, chunks, max(1, workers) * 2):
+                if rows:
+                    writer.write(rows)
+                stats["decoded"] += len(rows)
+                stats["skipped"] += skipped
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return stats
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m generic_bt_api",
+        description="Decode captured scale advertisements or notifications "
+        "and compute their body metrics.",
+    )
+    parser.add_argument(
+        "inputs", nargs="*", default=[STDOUT], help="capture files, - or none for stdin"
+    )
+    parser.add_argument("-o", "--output", default=STDOUT, help="output file, - for stdout")
+    parser.add_argument("-f", "--format", default=FORMAT_CSV, choices=FORMATS)
+    parser.add_argument(
+        "-m",
+        "--mode",
+        default=MODE_ADVERTISEMENT,
+        choices=MODES,
+        help="advertisement payloads, notification chunks or history frames",
+    )
+    parser.add_argument(
+        "-p",
+        "--protocol",
+        default=DEFAULT_PROTOCOL,
+        choices=sorted(PROTOCOLS),
+        help="protocol of advertisement payloads",
+    )
+    parser.add_argument("--sex", type=int, choices=(0, 1), default=SEX, help="0 female, 1 male")
+    parser.add_argument("--age", type=int, default=AGE)
+    parser.add_argument("--height", type=float, default=HEIGHT, help="in cm")
+    parser.add_argument(
+        "--people-type",
+        type=int,
+        choices=(0, 1, 2),
+        default=PEOPLE_TYPE,
+        help="activity level, 0 low to 2 high",
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, help="worker processes, 0 to decode inline"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=DEFAULT_EXPORT_CHUNK_SIZE, help="frames per worker task"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(levelname)s %(message)s",
+        stream=sys.stderr,
+    )
+    # The parser logs every frame at debug level
+    logging.getLogger(BTScaleData.__module__).setLevel(logging.INFO)
+    if args.chunk_size < 1 or (args.workers is not None and args.workers < 0):
+        _LOGGER.error("--chunk-size must be positive and --workers not negative")
+        return 2
+
+    profile = OneByoneNewLib(
+        sex=args.sex, age=args.age, height=args.height, people_type=args.people_type
+    )
+    try:
+        stats = decode(
+            args.inputs,
+            args.output,
+            args.format,
+            args.mode,
+            profile,
+            args.protocol,
+            args.workers,
+            args.chunk_size,
+        )
+    except (ImportError, OSError) as ex:
+        _LOGGER.error("%s", ex)
+        return 1
+    _LOGGER.info(
+        "Decoded %d of %d frames to %s", stats["decoded"], stats["frames"], args.output
+    )
+    if stats["skipped"] or stats["invalid_lines"]:
+        _LOGGER.warning(
+            "Skipped %d frames and %d unreadable lines",
+            stats["skipped"],
+            stats["invalid_lines"],
+        )
+    return 0
@@ -1,2 +1,100 @@
 """constants"""
 
+# Seconds a cached characteristic read stays valid unless a notification
+# for the same characteristic refreshes it first.
+DEFAULT_READ_CACHE_TTL = 300.0
+
+# Bulk writes without response yield to the event loop after this many
+# chunks so other tasks run during long transfers. This is not flow
+# control; bleak reports no backpressure on writes without response.
+DEFAULT_BULK_WRITE_YIELD_EVERY = 8
+# ATT header overhead subtracted from the MTU to get the usable payload.
+ATT_HEADER_SIZE = 3
+# Default ATT MTU every BLE link supports before negotiation.
+DEFAULT_ATT_MTU = 23
+
+# Offline history download. The scale streams its stored weigh-ins as
+# regular frames on the notify characteristic after the request command.
+HISTORY_WRITE_UUID = "0000ffb1-0000-1000-8000-00805f9b34fb"
+HISTORY_NOTIFY_UUID = "0000ffb2-0000-1000-8000-00805f9b34fb"
+HISTORY_REQUEST = "f100"
+# Offset of the big-endian 32 bit epoch timestamp inside a history frame.
+HISTORY_TIMESTAMP_OFFSET = 11
+# The transfer is complete once no notification arrived for this long.
+HISTORY_IDLE_TIMEOUT = 3.0
+HISTORY_TIMEOUT = 120.0
+
+# Connection routing. Readings older than the max age no longer rank a
+# source, and new readings are blended in to damp RSSI jitter.
+RSSI_MAX_AGE = 60.0
+RSSI_SMOOTHING = 0.3
+# Source name for advertisements heard by a local adapter.
+LOCAL_SOURCE = "local"
+
+# Connection slots, used for sources that do not report their allocations.
+# ESPHome proxies allow three concurrent connections by default; local
+# adapters are given a conservative limit of their own.
+ESPHOME_PROXY_SLOTS = 3
+LOCAL_ADAPTER_SLOTS = 5
+DEFAULT_SLOT_TIMEOUT = 30.0
+# Slots a device was granted count half as much after this many seconds
+# when ranking fair turns, so old activity does not hold a device back.
+SLOT_FAIRNESS_HALF_LIFE = 600.0
+# An idle connection is dropped after this many seconds, handing its slot
+# back; subscriptions keep it open.
+DEFAULT_IDLE_DISCONNECT = 10.0
+
+# Multi-user attribution. A weigh-in belongs to the profile with the
+# nearest recent weight within the tolerance, unless a second profile is
+# within the ambiguity margin of the same distance.
+DEFAULT_MATCH_TOLERANCE = 3.0
+DEFAULT_AMBIGUITY_MARGIN = 0.5
+
+# Weigh-in sessions. The weight is stable once this many consecutive frames
+# agree within the tolerance (raw units of 10 g); a gap this long between
+# frames starts a new session.
+SESSION_STABLE_FRAMES = 3
+SESSION_STABLE_TOLERANCE = 10
+SESSION_GAP = 30.0
+
+# Presence. The timer wheel ticks once per TIMER_WHEEL_TICK seconds; the
+# advertisement rate is smoothed over consecutive intervals.
+TIMER_WHEEL_TICK = 1.0
+TIMER_WHEEL_SLOTS = 512
+ADVERTISEMENT_RATE_SMOOTHING = 0.2
+
+# Items a measurement stream consumer may fall behind by
+DEFAULT_STREAM_QUEUE_SIZE = 64
+
+# Measurement store. Records are batched in memory until this many are
+# pending; the time index keeps the time span of every block of records.
+STORE_BATCH_SIZE = 32
+STORE_INDEX_STRIDE = 256
+
+# Rows written per chunk when exporting history
+DEFAULT_EXPORT_CHUNK_SIZE = 1000
+
+# Trends. The moving average covers the last TREND_WINDOW measurements,
+# min and max the last 30 days.
+TREND_WINDOW = 7
+TREND_EWMA_ALPHA = 0.3
+TREND_DELTA_SECONDS = 7 * 24 * 3600
+TREND_RANGE_SECONDS = 30 * 24 * 3600
+
+# MQTT export. Messages queued within a flush window are sent together; while
+# the broker is unreachable they are spooled to disk up to a size limit.
+DEFAULT_MQTT_PORT = 1883
+DEFAULT_MQTT_PREFIX = "generic_bt"
+DEFAULT_MQTT_QOS = 1
+MQTT_KEEPALIVE = 60
+MQTT_MAX_RECONNECT_DELAY = 120
+MQTT_SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+# Protocol fingerprinting. A protocol is picked when its mean score over the
+# sampled advertisements reaches the minimum and beats the runner-up by the
+# margin; weights and impedances above the maximum are not plausible.
+DEFAULT_PROTOCOL = "onebyone"
+PROTOCOL_MIN_SCORE = 0.6
+PROTOCOL_MIN_MARGIN = 0.1
+PLAUSIBLE_MAX_WEIGHT_KG = 300.0
+PLAUSIBLE_MAX_IMPEDANCE = 3000
@@ -3,7 +3,10 @@
 from uuid import UUID
 import asyncio
 import logging
+import time
 from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from typing import Callable, Optional
 
 from bleak import BleakClient, BleakScanner
 from bleak.exc import BleakError
@@ -12,18 +15,84 @@ from bleak.backends.scanner import (
     AdvertisementDataCallback,
     )
 
+from .const import (
+    ATT_HEADER_SIZE,
+    DEFAULT_ATT_MTU,
+    DEFAULT_BULK_WRITE_YIELD_EVERY,
+    DEFAULT_IDLE_DISCONNECT,
+    DEFAULT_READ_CACHE_TTL,
+    DEFAULT_SLOT_TIMEOUT,
+    HISTORY_IDLE_TIMEOUT,
+    HISTORY_NOTIFY_UUID,
+    HISTORY_REQUEST,
+    HISTORY_TIMEOUT,
+    HISTORY_WRITE_UUID,
+    LOCAL_SOURCE,
+)
+from .framer import FrameReassembler
+from .parser import BTScaleData, OneByoneNewLib
+from .scheduler import ConnectionSlotScheduler
+
 
 _LOGGER = logging.getLogger(__name__)
 
 connected_devices = set() 
 notify_uuid = ["00001812-0000-1000-8000-00805f9b34fb", "00001812-0000-1000-8000-00805f9b34fb"]
 
+
+def _to_uuid(target_uuid: str) -> UUID:
+    """Convert a characteristic uuid string into a UUID"""
+    return UUID("{" + target_uuid + "}")
+
+
+@dataclass
+class _CachedRead:
+    """A characteristic value and the monotonic time it expires at"""
+    value: bytes
+    expires: float
+
+
+@dataclass
+class BulkWriteResult:
+    """Outcome of a bulk characteristic write"""
+    bytes_written: int
+    chunks: int
+    chunk_size: int
+    mtu: int
+    with_response: bool
+    elapsed: float
+
+    @property
+    def throughput(self) -> float:
+        """Achieved throughput in bytes per second"""
+        if self.elapsed <= 0:
+            return float(self.bytes_written)
+        return self.bytes_written / self.elapsed
+
+
 class GenericBTDevice:
     """Generic BT Device Class"""
     def __init__(self, ble_device: str):
         self._ble_device = ble_device
         self._client_stack = AsyncExitStack()
         self._lock = asyncio.Lock()
+        self._client = None
+        self._connection_candidates: Optional[Callable[[], list]] = None
+        self._slot_scheduler: Optional[ConnectionSlotScheduler] = None
+        self._slot_priority = 0
+        self._slot_timeout = DEFAULT_SLOT_TIMEOUT
+        self._slot_source: Optional[str] = None
+        self._idle_timeout = DEFAULT_IDLE_DISCONNECT
+        self._idle_handle: Optional[asyncio.TimerHandle] = None
+        self._idle_task: Optional[asyncio.Task] = None
+        self._notifying: set[UUID] = set()
+        self._mtu_acquired = False
+
+        # Opt-in characteristic read cache, keyed by characteristic uuid
+        self._read_cache_ttl: dict[UUID, float] = {}
+        self._read_cache: dict[UUID, _CachedRead] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     async def update(self):
         """ Attempt to connect to the device? """
@@ -34,47 +103,398 @@ class GenericBTDevice:
     async def stop(self):
         """ stop device from scanning """
         _LOGGER.debug("Stopping device")
+        await self.disconnect()
 
     async def async_stop(self):
         """ stop device from scanning """
         _LOGGER.debug("async Stopping device")
-        pass
+        await self.disconnect()
+
+    async def disconnect(self):
+        """ Drop the connection and hand its slot back straight away """
+        self._cancel_idle_disconnect()
+        self._notifying.clear()
+        async with self._lock:
+            stack, self._client_stack = self._client_stack, AsyncExitStack()
+            try:
+                await stack.aclose()
+            except BleakError:
+                _LOGGER.debug("Error on disconnect", exc_info=True)
+            finally:
+                self._client = None
+                self._release_slot()
 
     @property
     def connected(self):
         return not self._client is None
 
+    @property
+    def address(self) -> str:
+        return getattr(self._ble_device, "address", self._ble_device)
+
+    def set_connection_candidates(self, provider: Optional[Callable[[], list]]) -> None:
+        """ Route connections through the (source, device) pairs from provider, in order """
+        self._connection_candidates = provider
+
+    def set_slot_scheduler(
+        self,
+        scheduler: Optional[ConnectionSlotScheduler],
+        priority: int = 0,
+        timeout: float = DEFAULT_SLOT_TIMEOUT,
+    ) -> None:
+        """ Queue for a connection slot on the chosen source before connecting """
+        self._slot_scheduler = scheduler
+        self._slot_priority = priority
+        self._slot_timeout = timeout
+
+    def _connection_targets(self) -> list:
+        targets = self._connection_candidates() if self._connection_candidates else []
+        return targets or [(LOCAL_SOURCE, self._ble_device)]
+
+    def _release_slot(self) -> None:
+        if self._slot_source is not None and self._slot_scheduler is not None:
+            self._slot_scheduler.release(self._slot_source)
+        self._slot_source = None
+
+    def _on_disconnected(self, _client) -> None:
+        _LOGGER.debug("Disconnected from %s", self.address)
+        self._release_slot()
+
+    def set_idle_timeout(self, timeout: float) -> None:
+        """ Seconds an unused connection is kept open for reuse """
+        self._idle_timeout = timeout
+
+    def _cancel_idle_disconnect(self) -> None:
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+
+    def _schedule_idle_disconnect(self) -> None:
+        """ Drop the connection once unused for the idle timeout, unless subscribed """
+        self._cancel_idle_disconnect()
+        if self._notifying or not self._client:
+            return
+        loop = asyncio.get_running_loop()
+        self._idle_handle = loop.call_later(self._idle_timeout, self._idle_disconnect)
+
+    def _idle_disconnect(self) -> None:
+        self._idle_handle = None
+        _LOGGER.debug("Disconnecting idle connection to %s", self.address)
+        self._idle_task = asyncio.get_running_loop().create_task(self.disconnect())
+
     async def get_client(self):
+        self._cancel_idle_disconnect()
         async with self._lock:
-            if not self._client:
-                _LOGGER.debug("Connecting")
-                try:
-                    self._client = await self._client_stack.enter_async_context(BleakClient(self._ble_device, timeout=30))
-                except asyncio.TimeoutError as exc:
-                    _LOGGER.debug("Timeout on connect", exc_info=True)
-                    # raise IdealLedTimeout("Timeout on connect") from exc
-                except BleakError as exc:
-                    _LOGGER.debug("Error on connect", exc_info=True)
-                    # raise IdealLedBleakError("Error on connect") from exc
+            if not self._client or not getattr(self._client, "is_connected", False):
+                # Fail over through the candidates, strongest link first
+                routes = dict(self._connection_targets())
+                error: Optional[Exception] = None
+                while routes:
+                    source = next(iter(routes))
+                    if self._slot_scheduler is not None:
+                        try:
+                            source = await self._slot_scheduler.acquire(
+                                self.address, list(routes), self._slot_priority, self._slot_timeout
+                            )
+                        except asyncio.TimeoutError as exc:
+                            raise asyncio.TimeoutError(
+                                f"No free connection slot for {self.address}"
+                            ) from exc
+                    target = routes.pop(source)
+                    _LOGGER.debug("Connecting via %s", source)
+                    try:
+                        self._client = await self._client_stack.enter_async_context(
+                            BleakClient(target, timeout=30, disconnected_callback=self._on_disconnected)
+                        )
+                        self._slot_source = source
+                        self._mtu_acquired = False
+                        return
+                    except asyncio.TimeoutError as exc:
+                        _LOGGER.debug("Timeout on connect", exc_info=True)
+                        error = exc
+                    except BleakError as exc:
+                        _LOGGER.debug("Error on connect", exc_info=True)
+                        error = exc
+                    if self._slot_scheduler is not None:
+                        self._slot_scheduler.release(source)
+                raise BleakError(f"Unable to connect to {self.address}: {error}") from error
             else:
                 _LOGGER.debug("Connection reused")
 
     async def write_gatt(self, target_uuid, data):
         await self.get_client()
-        uuid_str = "{" + target_uuid + "}"
-        uuid = UUID(uuid_str)
+        uuid = _to_uuid(target_uuid)
         data_as_bytes = bytearray.fromhex(data)
-        await self._client.write_gatt_char(uuid, data_as_bytes, True)
+        try:
+            await self._client.write_gatt_char(uuid, data_as_bytes, True)
+        finally:
+            self._schedule_idle_disconnect()
+        # The peripheral may have changed the value behind the cache
+        self._read_cache.pop(uuid, None)
+
+    async def write_gatt_bulk(
+        self,
+        target_uuid: str,
+        data: bytes | bytearray | str,
+        response: Optional[bool] = None,
+        yield_every: int = DEFAULT_BULK_WRITE_YIELD_EVERY,
+    ) -> BulkWriteResult:
+        """ Write a large payload in MTU sized chunks
+
+        Without an explicit response mode, chunks are pipelined as writes
+        without response when the characteristic supports it, otherwise each
+        chunk is acknowledged. A peripheral rejecting unacknowledged writes
+        makes the remainder fall back to acknowledged writes. Unacknowledged
+        writes yield to the event loop every yield_every chunks.
+
+        Chunks are sized from the negotiated MTU. BlueZ only reports it once
+        acquired, which is done once per connection; if that fails the
+        chunks fall back to the 20 bytes of the default MTU.
+
+        Raises:
+            ValueError: yield_every is less than 1.
+        """
+        if yield_every < 1:
+            raise ValueError("yield_every must be at least 1")
+        await self.get_client()
+        try:
+            return await self._write_gatt_bulk(target_uuid, data, response, yield_every)
+        finally:
+            self._schedule_idle_disconnect()
+
+    async def _write_gatt_bulk(
+        self,
+        target_uuid: str,
+        data: bytes | bytearray | str,
+        response: Optional[bool],
+        yield_every: int,
+    ) -> BulkWriteResult:
+        uuid = _to_uuid(target_uuid)
+        if isinstance(data, str):
+            data = bytes.fromhex(data)
+
+        mtu = await self._negotiated_mtu()
+        characteristic = self._client.services.get_characteristic(uuid)
+        properties = characteristic.properties if characteristic else []
+        if response is None:
+            response = "write-without-response" not in properties
+
+        target = characteristic or uuid
+        chunk_size = self._chunk_size(characteristic, mtu, response)
+        total = len(data)
+        chunks = 0
+        offset = 0
+        started = time.monotonic()
+        while offset < total:
+            chunk = data[offset:offset + chunk_size]
+            try:
+                await self._client.write_gatt_char(target, chunk, response)
+            except BleakError:
+                if response:
+                    raise
+                _LOGGER.debug(
+                    "Write without response rejected by %s, falling back to acknowledged writes",
+                    uuid,
+                )
+                response = True
+                chunk_size = self._chunk_size(characteristic, mtu, response)
+                continue
+            offset += len(chunk)
+            chunks += 1
+            if not response and chunks % yield_every == 0:
+                # A yield point, not flow control
+                await asyncio.sleep(0)
+
+        result = BulkWriteResult(
+            bytes_written=total,
+            chunks=chunks,
+            chunk_size=chunk_size,
+            mtu=mtu,
+            with_response=response,
+            elapsed=time.monotonic() - started,
+        )
+        self._read_cache.pop(uuid, None)
+        _LOGGER.debug(
+            "Bulk wrote %d bytes to %s in %d chunks at %.0f B/s",
+            total, uuid, chunks, result.throughput,
+        )
+        return result
+
+    async def _negotiated_mtu(self) -> int:
+        """ The ATT MTU of the connection """
+        backend = getattr(self._client, "_backend", None)
+        if not self._mtu_acquired and type(backend).__name__ == "BleakClientBlueZDBus":
+            # BlueZ reports the default MTU until a characteristic is
+            # acquired; bleak documents no public way, see its mtu_size.py
+            self._mtu_acquired = True
+            try:
+                await backend._acquire_mtu()  # pylint: disable=protected-access
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.debug("Unable to acquire the MTU of %s", self.address, exc_info=True)
+        return self._client.mtu_size or DEFAULT_ATT_MTU
+
+    @staticmethod
+    def _chunk_size(characteristic, mtu: int, response: bool) -> int:
+        if not response and characteristic is not None:
+            size = getattr(characteristic, "max_write_without_response_size", 0)
+            if size:
+                return size
+        return max(mtu - ATT_HEADER_SIZE, DEFAULT_ATT_MTU - ATT_HEADER_SIZE)
 
     async def read_gatt(self, target_uuid):
+        uuid = _to_uuid(target_uuid)
+        ttl = self._read_cache_ttl.get(uuid)
+        if ttl is not None:
+            cached = self._read_cache.get(uuid)
+            if cached is not None and cached.expires > time.monotonic():
+                self.cache_hits += 1
+                _LOGGER.debug("Read cache hit for %s", uuid)
+                return cached.value
+            self.cache_misses += 1
+
         await self.get_client()
-        uuid_str = "{" + target_uuid + "}"
-        uuid = UUID(uuid_str)
-        data = await self._client.read_gatt_char(uuid)
-        print(data)
+        try:
+            data = bytes(await self._client.read_gatt_char(uuid))
+        finally:
+            self._schedule_idle_disconnect()
+        _LOGGER.debug("Read %s: %r", uuid, data)
+        if ttl is not None:
+            self._read_cache[uuid] = _CachedRead(data, time.monotonic() + ttl)
         return data
 
-    async def async_start(self, detection_callback: AdvertisementDataCallback, scanning_mode: str = "passive"):
+    def enable_read_cache(self, target_uuid: str, ttl: float = DEFAULT_READ_CACHE_TTL) -> None:
+        """ Cache reads of a slow changing characteristic for ttl seconds """
+        if ttl <= 0:
+            raise ValueError("Read cache ttl must be greater than zero")
+        self._read_cache_ttl[_to_uuid(target_uuid)] = ttl
+
+    def disable_read_cache(self, target_uuid: str) -> None:
+        """ Stop caching reads of a characteristic """
+        uuid = _to_uuid(target_uuid)
+        self._read_cache_ttl.pop(uuid, None)
+        self._read_cache.pop(uuid, None)
+
+    def invalidate_read_cache(self, target_uuid: Optional[str] = None) -> None:
+        """ Drop one cached value, or all of them when no uuid is given """
+        if target_uuid is None:
+            self._read_cache.clear()
+        else:
+            self._read_cache.pop(_to_uuid(target_uuid), None)
+
+    @property
+    def read_cache_stats(self) -> dict[str, int]:
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "entries": len(self._read_cache),
+        }
+
+    def _refresh_read_cache(self, uuid: UUID, data: bytes) -> None:
+        """ A notification carries the current value, so it renews the cache entry """
+        ttl = self._read_cache_ttl.get(uuid)
+        if ttl is not None:
+            self._read_cache[uuid] = _CachedRead(bytes(data), time.monotonic() + ttl)
+
+    async def start_notify(self, target_uuid: str, callback: Optional[Callable] = None):
+        """ Subscribe to a characteristic, keeping its cached read value fresh """
+        await self.get_client()
+        uuid = _to_uuid(target_uuid)
+
+        def _on_notify(characteristic, data: bytearray):
+            self._refresh_read_cache(uuid, data)
+            if callback:
+                callback(characteristic, data)
+
+        self._notifying.add(uuid)
+        try:
+            await self._client.start_notify(uuid, _on_notify)
+        except BaseException:
+            self._notifying.discard(uuid)
+            self._schedule_idle_disconnect()
+            raise
+
+    async def stop_notify(self, target_uuid: str):
+        # Nothing to unsubscribe from once disconnected, don't reconnect
+        uuid = _to_uuid(target_uuid)
+        self._notifying.discard(uuid)
+        if not self._client or not getattr(self._client, "is_connected", False):
+            return
+        try:
+            await self._client.stop_notify(uuid)
+        finally:
+            self._schedule_idle_disconnect()
+
+    async def async_sync_history(
+        self,
+        is_known: Optional[Callable[[BTScaleData], bool]] = None,
+        calculation_object: Optional[OneByoneNewLib] = None,
+        idle_timeout: float = HISTORY_IDLE_TIMEOUT,
+        timeout: float = HISTORY_TIMEOUT,
+    ) -> list[BTScaleData]:
+        """ Download the weigh-ins the scale stored while out of range
+
+        All records are pulled in one session: the scale streams them as
+        notifications after a single request, and each frame is decoded as
+        soon as it is reassembled. Records already ingested, as reported by
+        is_known, are skipped. The connection is dropped afterwards, handing
+        its slot back.
+        """
+        framer = FrameReassembler()
+        records: list[BTScaleData] = []
+        seen: set[tuple] = set()
+        activity = asyncio.Event()
+        skipped = 0
+
+        def _on_notify(_characteristic, data: bytearray):
+            nonlocal skipped
+            activity.set()
+            for frame in framer.feed(data):
+                try:
+                    record = BTScaleData.from_history_frame(frame, calculation_object)
+                except (IndexError, ValueError, ZeroDivisionError) as exc:
+                    _LOGGER.debug("Skipping undecodable history frame: %s", exc)
+                    continue
+                key = (record.timestamp, *record.record_key)
+                if key in seen or (is_known and is_known(record)):
+                    skipped += 1
+                    continue
+                seen.add(key)
+                records.append(record)
+
+        try:
+            await self.start_notify(HISTORY_NOTIFY_UUID, _on_notify)
+            await self.write_gatt(HISTORY_WRITE_UUID, HISTORY_REQUEST)
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    _LOGGER.warning("History download did not finish within %ss", timeout)
+                    break
+                activity.clear()
+                try:
+                    await asyncio.wait_for(activity.wait(), min(idle_timeout, remaining))
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            try:
+                await self.stop_notify(HISTORY_NOTIFY_UUID)
+            except BleakError:
+                _LOGGER.debug("Error stopping history notifications", exc_info=True)
+            await self.disconnect()
+
+        _LOGGER.debug(
+            "History download finished: %d new records, %d already known, %s",
+            len(records), skipped, framer.stats,
+        )
+        records.sort(key=lambda record: record.timestamp)
+        return records
+
+    async def async_start(
+        self,
+        detection_callback: AdvertisementDataCallback,
+        scanning_mode: str = "passive",
+        service_uuids: list[str] | None = None,
+    ):
         _LOGGER.debug(
             "Device Starting ScaleDataUpdateCoordinator for address: %s", self._ble_device
         )
@@ -82,7 +502,7 @@ class GenericBTDevice:
         self._client = BleakClient(
             address_or_ble_device=self._ble_device)
         self._scanner = BleakScanner(
-            service_uuids=notify_uuid,
+            service_uuids=service_uuids or notify_uuid,
             detection_callback=detection_callback,
             scanning_mode=scanning_mode)
         try:
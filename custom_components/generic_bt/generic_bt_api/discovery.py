@@ -0,0 +1,120 @@
+"""Narrow discovered devices down to the ones worth probing"""
+from __future__ import annotations
+
+import asyncio
+from collections import defaultdict
+from collections.abc import Awaitable, Callable, Iterable
+import logging
+from typing import Protocol as TypingProtocol, TypeVar
+
+from .protocols import PROTOCOLS, Advertisement, Protocol
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class RankedAdvertisement(Advertisement, TypingProtocol):
+    rssi: int | None
+
+
+A = TypeVar("A", bound=RankedAdvertisement)
+
+
+class DiscoveryIndex:
+    """
+    The registered protocols by header, manufacturer id and service UUID.
+
+    Looking up an advertisement costs one dict lookup per manufacturer data
+    value, manufacturer id and service UUID it carries, however many devices
+    and protocols there are, so hundreds of nearby devices are filtered
+    without decoding any. Protocols with a header are only indexed by it,
+    like Protocol.identifies(), so e.g. every HID keyboard in range is not
+    a candidate.
+    """
+
+    def __init__(self, protocols: Iterable[Protocol] | None = None) -> None:
+        # Header length -> header -> protocol names
+        self._by_header: dict[int, dict[bytes, set[str]]] = defaultdict(
+            lambda: defaultdict(set)
+        )
+        self._by_manufacturer: dict[int, set[str]] = defaultdict(set)
+        self._by_service: dict[str, set[str]] = defaultdict(set)
+        for protocol in PROTOCOLS.values() if protocols is None else protocols:
+            if protocol.header:
+                self._by_header[len(protocol.header)][protocol.header].add(protocol.name)
+                continue
+            for manufacturer_id in protocol.manufacturer_ids:
+                self._by_manufacturer[manufacturer_id].add(protocol.name)
+            for uuid in protocol.service_uuids:
+                self._by_service[uuid.lower()].add(protocol.name)
+
+    def candidates(self, advertisement: Advertisement) -> set[str]:
+        """The protocols an advertisement may be in"""
+        names: set[str] = set()
+        for manufacturer_id, value in advertisement.manufacturer_data.items():
+            names.update(self._by_manufacturer.get(manufacturer_id, ()))
+            for length, headers in self._by_header.items():
+                names.update(headers.get(bytes(value[:length]), ()))
+        for uuid in (*advertisement.service_uuids, *advertisement.service_data):
+            names.update(self._by_service.get(uuid.lower(), ()))
+        return names
+
+    def rank(self, advertisements: Iterable[A], limit: int | None = None) -> list[A]:
+        """The advertisements of any protocol, strongest signal first
+
+        Args:
+            advertisements: E.g. the discovered service infos.
+            limit: Keep at most this many.
+        """
+        matches = [
+            advertisement for advertisement in advertisements if self.candidates(advertisement)
+        ]
+        matches.sort(
+            key=lambda advertisement: -999 if advertisement.rssi is None else advertisement.rssi,
+            reverse=True,
+        )
+        return matches[:limit]
+
+
+async def probe_all(
+    items: Iterable[T],
+    probe: Callable[[T], Awaitable[R]],
+    limit: int,
+    deadline: float,
+) -> list[tuple[T, R]]:
+    """Probe items concurrently, at most limit at a time, until the deadline
+
+    Probes still queued or running at the deadline are cancelled and
+    probes that raised are logged; both are left out of the result.
+
+    Returns:
+        (item, result) of every probe that finished in time, in item order.
+    """
+    items = list(items)
+    if not items:
+        return []
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(item: T) -> R:
+        async with semaphore:
+            return await probe(item)
+
+    tasks = [asyncio.create_task(run(item)) for item in items]
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        _LOGGER.debug("%d of %d probes missed the deadline", len(pending), len(tasks))
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results = []
+    for item, task in zip(items, tasks):
+        if task not in done:
+            continue
+        if (error := task.exception()) is not None:
+            _LOGGER.debug("Probing %s failed: %s", item, error)
+            continue
+        results.append((item, task.result()))
+    return results
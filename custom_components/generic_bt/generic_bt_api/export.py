@@ -0,0 +1,277 @@
+"""Stream measurement history to CSV or Parquet in bounded memory"""
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import csv
+import json
+import logging
+import sys
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from itertools import islice
+from typing import Any, TypeVar
+
+from .const import DEFAULT_EXPORT_CHUNK_SIZE
+from .parser import BTScaleData, OneByoneNewLib
+from .store import RecordFlag, StoredMeasurement
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+FORMAT_JSONL = "jsonl"
+FORMATS = (FORMAT_CSV, FORMAT_PARQUET, FORMAT_JSONL)
+# Text formats write to standard output when given this path
+STDOUT = "-"
+
+RAW_COLUMNS = (
+    "timestamp",
+    "user_id",
+    "weight_kg",
+    "raw_weight",
+    "impedance",
+    "unit_flag",
+    "historical",
+    "attribution",
+)
+# Column -> BTScaleData attribute, filled in when metrics are recomputed
+METRIC_COLUMNS = {
+    "bmi": "bmi",
+    "basal_metabolic_rate": "bmmr",
+    "fat_percentage": "fat_percentage",
+    "water_percentage": "water_percentage",
+    "protein_percentage": "protein_percentage",
+    "muscle_mass": "muscle_mass",
+    "bone_mass": "bone_mass",
+    "skeletal_muscle_percentage": "skeletal_mass",
+    "visceral_fat": "visceral",
+}
+# Column -> pyarrow type factory of its Parquet column, so a column that
+# is empty in the first chunk still gets its type. Unlisted columns are
+# strings.
+COLUMN_TYPES = {
+    "timestamp": "string",
+    "user_id": "string",
+    "weight_kg": "float64",
+    "raw_weight": "int64",
+    "impedance": "int64",
+    "unit_flag": "int64",
+    "historical": "bool_",
+    "attribution": "string",
+    **{column: "float64" for column in METRIC_COLUMNS},
+}
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Group items into lists of at most size items"""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _attribution(flags: RecordFlag) -> str:
+    if flags & RecordFlag.MATCHED:
+        return "matched"
+    if flags & RecordFlag.AMBIGUOUS:
+        return "ambiguous"
+    return "unknown"
+
+
+def measurement_rows(
+    records: Iterable[StoredMeasurement],
+    profile_for: Callable[[str | None], OneByoneNewLib | None] | None = None,
+) -> Iterator[dict[str, Any]]:
+    """Turn stored records into export rows
+
+    Args:
+        records: Raw measurements, e.g. from MeasurementStore.records().
+        profile_for: Returns the profile to recompute a user's body metrics
+            with; without it only the raw readings are exported. A user
+            without a profile gets empty metric columns.
+    """
+    for record in records:
+        row: dict[str, Any] = {
+            "timestamp": record.timestamp.isoformat(),
+            "user_id": record.user_id,
+            "weight_kg": round(record.raw_weight / 100, 2),
+            "raw_weight": record.raw_weight,
+            "impedance": record.impedance,
+            "unit_flag": record.unit_flag,
+            "historical": bool(record.flags & RecordFlag.HISTORICAL),
+            "attribution": _attribution(record.flags),
+        }
+        if profile_for is not None:
+            profile = profile_for(record.user_id)
+            data = None
+            if profile is not None:
+                data = BTScaleData.from_raw(
+                    record.raw_weight,
+                    record.impedance,
+                    record.unit_flag,
+                    record.timestamp,
+                    profile,
+                )
+            for column, attribute in METRIC_COLUMNS.items():
+                row[column] = None if data is None else getattr(data, attribute)
+        yield row
+
+
+class ExportWriter(ABC):
+    """Write rows to a file chunk by chunk"""
+
+    def __init__(self, path: str, columns: Sequence[str]) -> None:
+        self.path = path
+        self.columns = list(columns)
+        self.rows = 0
+
+    @abstractmethod
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        """Append a chunk of rows"""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Finish the file"""
+
+    def __enter__(self) -> ExportWriter:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class TextExportWriter(ExportWriter):
+    """A writer of a text file, or of standard output for STDOUT"""
+
+    def __init__(self, path: str, columns: Sequence[str]) -> None:
+        super().__init__(path, columns)
+        if path == STDOUT:
+            self._file = sys.stdout
+        else:
+            self._file = open(path, "w", newline="", encoding="utf-8")
+
+    def close(self) -> None:
+        if self._file is sys.stdout:
+            self._file.flush()
+        else:
+            self._file.close()
+
+
+class CsvExportWriter(TextExportWriter):
+    def __init__(self, path: str, columns: Sequence[str]) -> None:
+        super().__init__(path, columns)
+        self._writer = csv.DictWriter(self._file, self.columns, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        self._writer.writerows(rows)
+        self.rows += len(rows)
+
+
+class JsonLinesExportWriter(TextExportWriter):
+    """One JSON object per row"""
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        self._file.writelines(
+            json.dumps({column: row.get(column) for column in self.columns}) + "\n"
+            for row in rows
+        )
+        self.rows += len(rows)
+
+
+class ParquetExportWriter(ExportWriter):
+    """One Parquet row group per chunk, pyarrow is only needed for this format"""
+
+    def __init__(
+        self, path: str, columns: Sequence[str], types: Mapping[str, str] | None = None
+    ) -> None:
+        """
+        Args:
+            types: Column -> pyarrow type factory, over COLUMN_TYPES.
+        """
+        super().__init__(path, columns)
+        try:
+            import pyarrow  # pylint: disable=import-outside-toplevel
+            import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+        except ImportError as ex:
+            raise ImportError("Parquet export requires the pyarrow package") from ex
+        types = {**COLUMN_TYPES, **(types or {})}
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema(
+            [(column, getattr(pyarrow, types.get(column, "string"))()) for column in self.columns]
+        )
+        self._writer: Any = None
+        self._parquet = pyarrow.parquet
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        table = self._pyarrow.Table.from_pylist(
+            [{column: row.get(column) for column in self.columns} for row in rows],
+            schema=self._schema,
+        )
+        if self._writer is None:
+            self._writer = self._parquet.ParquetWriter(self.path, self._schema)
+        self._writer.write_table(table)
+        self.rows += len(rows)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_writer(
+    path: str, fmt: str, columns: Sequence[str], types: Mapping[str, str] | None = None
+) -> ExportWriter:
+    """Open the writer of a format, types only matter to Parquet"""
+    if fmt == FORMAT_CSV:
+        return CsvExportWriter(path, columns)
+    if fmt == FORMAT_PARQUET:
+        return ParquetExportWriter(path, columns, types)
+    if fmt == FORMAT_JSONL:
+        return JsonLinesExportWriter(path, columns)
+    raise ValueError(f"Unsupported export format {fmt}, use one of {FORMATS}")
+
+
+def write_rows(
+    rows: Iterable[dict[str, Any]],
+    path: str,
+    fmt: str,
+    columns: Sequence[str],
+    chunk_size: int = DEFAULT_EXPORT_CHUNK_SIZE,
+) -> int:
+    """Write rows in chunks of chunk_size, returns the number of rows written"""
+    with open_writer(path, fmt, columns) as writer:
+        for chunk in chunked(rows, chunk_size):
+            writer.write(chunk)
+        return writer.rows
+
+
+def export_measurements(
+    records: Iterable[StoredMeasurement],
+    path: str,
+    fmt: str = FORMAT_CSV,
+    profile_for: Callable[[str | None], OneByoneNewLib | None] | None = None,
+    chunk_size: int = DEFAULT_EXPORT_CHUNK_SIZE,
+) -> int:
+    """Export measurements to a CSV or Parquet file
+
+    Records are pulled lazily and written chunk_size rows at a time, so the
+    memory used does not grow with the length of the history.
+
+    Args:
+        records: Raw measurements, e.g. MeasurementStore.records(start, end, user).
+        path: The file to create.
+        fmt: One of FORMATS; Parquet needs pyarrow.
+        profile_for: Recompute body metrics with the profile it returns for
+            each user id, see measurement_rows().
+        chunk_size: Rows per write.
+
+    Returns:
+        The number of rows written.
+    """
+    columns = list(RAW_COLUMNS)
+    if profile_for is not None:
+        columns.extend(METRIC_COLUMNS)
+    count = write_rows(measurement_rows(records, profile_for), path, fmt, columns, chunk_size)
+    _LOGGER.debug("Exported %d measurements to %s", count, path)
+    return count
+
@@ -0,0 +1,360 @@
+"""User-declared frame fields, compiled once into struct layouts and closures"""
+from __future__ import annotations
+
+import ast
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass
+import keyword
+import math
+import struct
+from typing import Any, Union
+
+FieldValue = Union[int, float, None]
+
+# Width in bytes -> struct format character, upper case is unsigned.
+# Three byte fields are unpacked as bytes and converted afterwards.
+FIELD_FORMATS = {1: "B", 2: "H", 3: "3s", 4: "I", 8: "Q"}
+ENDIANNESS = {"little": "<", "big": ">"}
+
+# Functions formulas may call
+FORMULA_FUNCTIONS: dict[str, Callable[..., Any]] = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "round": round,
+}
+FORMULA_GLOBALS = {"__builtins__": {}, **FORMULA_FUNCTIONS}
+# Exponents are limited to constants up to this size, and powers may not
+# be nested
+MAX_FORMULA_EXPONENT = 16
+# Integer results beyond this magnitude are dropped, so formulas reading
+# other formulas cannot grow numbers without bound
+MAX_FORMULA_INT = 2**64
+# round() may only round to a constant number of digits up to this many
+MAX_ROUND_DIGITS = 12
+
+_FORMULA_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.BoolOp,
+    ast.Compare,
+    ast.IfExp,
+    ast.Call,
+    ast.Name,
+    ast.Load,
+    ast.Constant,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.Pow,
+    ast.BitAnd,
+    ast.BitOr,
+    ast.BitXor,
+    ast.RShift,
+    ast.UAdd,
+    ast.USub,
+    ast.Not,
+    ast.Invert,
+    ast.And,
+    ast.Or,
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+)
+
+
+class FieldSchemaError(ValueError):
+    """The declared fields cannot be compiled"""
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """
+    One declared field.
+
+    A field is either read from the frame, at offset with the given width,
+    endianness and signedness and multiplied by scale, or computed by a
+    formula over other fields.
+    """
+
+    name: str
+    offset: int | None = None
+    width: int = 1
+    endian: str = "little"
+    signed: bool = False
+    scale: float = 1.0
+    formula: str | None = None
+    unit: str | None = None
+
+    @classmethod
+    def from_dict(cls, config: Mapping[str, Any]) -> FieldSpec:
+        """Build a spec from its options dict, checking every value
+
+        Raises:
+            FieldSchemaError: A value is missing, unknown or out of range.
+        """
+        if not isinstance(config, Mapping):
+            raise FieldSchemaError(f"A field must be a mapping, got {config!r}")
+        unknown = set(config) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise FieldSchemaError(f"Unknown field keys {sorted(unknown)}")
+        name = config.get("name")
+        if not isinstance(name, str) or not name.isidentifier() or keyword.iskeyword(name):
+            raise FieldSchemaError(f"Field name {name!r} is not a valid identifier")
+        if name in FORMULA_FUNCTIONS:
+            raise FieldSchemaError(f"Field name {name!r} is reserved")
+
+        formula = config.get("formula")
+        offset = config.get("offset")
+        if (formula is None) == (offset is None):
+            raise FieldSchemaError(f"Field {name} needs either an offset or a formula")
+        try:
+            spec = cls(
+                name=name,
+                offset=None if offset is None else int(offset),
+                width=int(config.get("width", 1)),
+                endian=str(config.get("endian", "little")),
+                signed=bool(config.get("signed", False)),
+                scale=float(config.get("scale", 1.0)),
+                formula=None if formula is None else str(formula),
+                unit=None if config.get("unit") is None else str(config["unit"]),
+            )
+        except (TypeError, ValueError) as ex:
+            raise FieldSchemaError(f"Field {name}: {ex}") from ex
+
+        if spec.offset is not None:
+            if spec.offset < 0:
+                raise FieldSchemaError(f"Field {name} has a negative offset")
+            if spec.width not in FIELD_FORMATS:
+                raise FieldSchemaError(
+                    f"Field {name} has width {spec.width}, use one of {sorted(FIELD_FORMATS)}"
+                )
+            if spec.endian not in ENDIANNESS:
+                raise FieldSchemaError(f"Field {name} endian must be little or big")
+        elif spec.scale != 1.0:
+            raise FieldSchemaError(f"Formula field {name} cannot have a scale")
+        return spec
+
+
+def _parse_formula(spec: FieldSpec) -> tuple[ast.Expression, set[str]]:
+    """Parse and whitelist a formula, returns its tree and the names it reads"""
+    try:
+        tree = ast.parse(spec.formula, mode="eval")
+    except SyntaxError as ex:
+        raise FieldSchemaError(f"Formula of {spec.name} is invalid: {ex.msg}") from ex
+    names = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, _FORMULA_NODES):
+            raise FieldSchemaError(
+                f"Formula of {spec.name} may not use {type(node).__name__}"
+            )
+        if isinstance(node, ast.Constant) and (
+            isinstance(node.value, bool) or not isinstance(node.value, (int, float))
+        ):
+            raise FieldSchemaError(f"Formula of {spec.name} may only contain numbers")
+        if isinstance(node, ast.Call):
+            if (
+                not isinstance(node.func, ast.Name)
+                or node.func.id not in FORMULA_FUNCTIONS
+                or node.keywords
+            ):
+                raise FieldSchemaError(
+                    f"Formula of {spec.name} may only call {sorted(FORMULA_FUNCTIONS)}"
+                )
+            if node.func.id == "round" and len(node.args) > 1:
+                try:
+                    ndigits = ast.literal_eval(node.args[1])
+                except ValueError:
+                    ndigits = None
+                if not (
+                    len(node.args) == 2
+                    and type(ndigits) is int  # pylint: disable=unidiomatic-typecheck
+                    and abs(ndigits) <= MAX_ROUND_DIGITS
+                ):
+                    raise FieldSchemaError(
+                        f"Formula of {spec.name} may only round to a constant number"
+                        f" of digits of at most {MAX_ROUND_DIGITS}"
+                    )
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+            if any(
+                isinstance(inner, ast.BinOp) and isinstance(inner.op, ast.Pow)
+                for inner in ast.walk(node.left)
+            ):
+                raise FieldSchemaError(f"Formula of {spec.name} may not nest powers")
+            exponent = node.right
+            if not (
+                isinstance(exponent, ast.Constant)
+                and isinstance(exponent.value, (int, float))
+                and abs(exponent.value) <= MAX_FORMULA_EXPONENT
+            ):
+                raise FieldSchemaError(
+                    f"Formula of {spec.name} may only raise to a constant power"
+                    f" of at most {MAX_FORMULA_EXPONENT}"
+                )
+        elif isinstance(node, ast.Name) and node.id not in FORMULA_FUNCTIONS:
+            names.add(node.id)
+    return tree, names
+
+
+Formula = Callable[[dict[str, FieldValue]], FieldValue]
+Converter = Callable[[Any], FieldValue]
+
+
+def _compile_formula(tree: ast.Expression, name: str) -> Formula:
+    code = compile(tree, f"<field {name}>", "eval")
+
+    def evaluate(values: dict[str, FieldValue]) -> FieldValue:
+        try:
+            result = eval(code, FORMULA_GLOBALS, values)  # pylint: disable=eval-used
+        except (ArithmeticError, TypeError, ValueError):
+            # A division by zero or a field missing from this frame
+            return None
+        if isinstance(result, float):
+            return result if math.isfinite(result) else None
+        if isinstance(result, int):
+            return result if -MAX_FORMULA_INT <= result <= MAX_FORMULA_INT else None
+        # E.g. the complex root of a negative field
+        return None
+
+    return evaluate
+
+
+def _converter(spec: FieldSpec) -> Converter | None:
+    """The conversion of an unpacked value, None when it is used as is"""
+    scale = spec.scale
+    if spec.width == 3:
+        from_bytes = int.from_bytes
+        if scale == 1.0:
+            return lambda value: from_bytes(value, spec.endian, signed=spec.signed)
+        return lambda value: from_bytes(value, spec.endian, signed=spec.signed) * scale
+    if scale == 1.0:
+        return None
+    return lambda value: value * scale
+
+
+class FieldDecoder:
+    """
+    Decode declared fields from frames.
+
+    Compiling does all the work up front: fields read from the frame are
+    packed into as few struct.Struct layouts as possible, one per run of
+    non-overlapping fields of the same endianness with pad bytes in
+    between, and formulas are validated against a whitelist of expression
+    nodes and compiled to code objects evaluated in dependency order.
+    Decoding a frame is then one unpack_from() per layout plus the
+    conversions and formulas, without looking at the specs again.
+    """
+
+    def __init__(self, specs: Iterable[FieldSpec]) -> None:
+        """
+        Raises:
+            FieldSchemaError: Duplicate names, unknown or circular formula
+                references.
+        """
+        self.specs = list(specs)
+        self.names = [spec.name for spec in self.specs]
+        if len(set(self.names)) != len(self.names):
+            raise FieldSchemaError("Field names must be unique")
+        if not self.specs:
+            raise FieldSchemaError("No fields declared")
+
+        raw = sorted(
+            (spec for spec in self.specs if spec.offset is not None),
+            key=lambda spec: (spec.offset, spec.width),
+        )
+        self.min_length = max((spec.offset + spec.width for spec in raw), default=0)
+
+        # (endian, end offset, specs) of the layouts being built
+        groups: list[tuple[str, int, list[FieldSpec]]] = []
+        for spec in raw:
+            for index, (endian, end, members) in enumerate(groups):
+                if endian == spec.endian and end <= spec.offset:
+                    members.append(spec)
+                    groups[index] = (endian, spec.offset + spec.width, members)
+                    break
+            else:
+                groups.append((spec.endian, spec.offset + spec.width, [spec]))
+
+        # (unpack_from of the layout, its offset, field names, converters)
+        self._layouts: list[
+            tuple[Callable[..., tuple], int, tuple[str, ...], tuple[Converter | None, ...]]
+        ] = []
+        for endian, _end, members in groups:
+            start = position = members[0].offset
+            fmt = ENDIANNESS[endian]
+            for spec in members:
+                if spec.offset > position:
+                    fmt += f"{spec.offset - position}x"
+                code = FIELD_FORMATS[spec.width]
+                fmt += code.lower() if spec.signed and spec.width != 3 else code
+                position = spec.offset + spec.width
+            self._layouts.append(
+                (
+                    struct.Struct(fmt).unpack_from,
+                    start,
+                    tuple(spec.name for spec in members),
+                    tuple(_converter(spec) for spec in members),
+                )
+            )
+
+        self._formulas = self._compile_formulas()
+
+    def _compile_formulas(self) -> list[tuple[str, Formula]]:
+        parsed = {
+            spec.name: _parse_formula(spec) for spec in self.specs if spec.formula is not None
+        }
+        known = set(self.names)
+        for name, (_tree, references) in parsed.items():
+            if unknown := references - known:
+                raise FieldSchemaError(f"Formula of {name} uses unknown fields {sorted(unknown)}")
+
+        # Depth-first topological order, so every formula runs after the
+        # formulas it reads
+        ordered: list[str] = []
+        state: dict[str, bool] = {}
+
+        def visit(name: str, path: tuple[str, ...]) -> None:
+            if state.get(name):
+                return
+            if name in state:
+                raise FieldSchemaError(f"Circular formulas: {' -> '.join((*path, name))}")
+            state[name] = False
+            for reference in sorted(parsed[name][1]):
+                if reference in parsed:
+                    visit(reference, (*path, name))
+            state[name] = True
+            ordered.append(name)
+
+        for name in parsed:
+            visit(name, ())
+        return [(name, _compile_formula(parsed[name][0], name)) for name in ordered]
+
+    @classmethod
+    def from_config(cls, config: Iterable[Mapping[str, Any]]) -> FieldDecoder:
+        """Compile the fields of the options, a list of FieldSpec dicts"""
+        if isinstance(config, (str, bytes, Mapping)) or not isinstance(config, Iterable):
+            raise FieldSchemaError("Fields must be a list of field mappings")
+        return cls(FieldSpec.from_dict(item) for item in config)
+
+    def decode(self, frame: bytes | bytearray | memoryview) -> dict[str, FieldValue] | None:
+        """Decode every declared field of a frame
+
+        Returns:
+            The value of every field by name, None if the frame is too short.
+        """
+        if len(frame) < self.min_length:
+            return None
+        values: dict[str, FieldValue] = {}
+        for unpack_from, start, names, converters in self._layouts:
+            for name, convert, value in zip(names, converters, unpack_from(frame, start)):
+                values[name] = value if convert is None else convert(value)
+        for name, evaluate in self._formulas:
+            values[name] = evaluate(values)
+        return values
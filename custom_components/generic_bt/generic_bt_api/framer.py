@@ -0,0 +1,188 @@
+"""Reassemble framed scale messages that arrive split across notifications"""
+from __future__ import annotations
+
+import logging
+from typing import Iterator
+
+from .parser import HEADER_BYTES, MSG_LENGTH
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FrameReassembler:
+    """
+    Streaming framer built on a preallocated ring buffer.
+
+    Notifications are copied into the ring as they arrive and complete frames
+    are handed out as memoryviews over the ring, so no bytes objects are
+    concatenated per frame. A frame that wraps around the end of the ring is
+    copied once into a preallocated scratch buffer instead.
+
+    The memoryviews returned by feed() are only valid until the generator is
+    advanced or feed() is called again; copy them with bytes() to keep them.
+    """
+
+    def __init__(
+        self,
+        header: bytes = HEADER_BYTES,
+        frame_length: int = MSG_LENGTH,
+        capacity: int | None = None,
+        sync_on_chunk: bool = True,
+    ) -> None:
+        """
+        Args:
+            header: The bytes every frame starts with.
+            frame_length: Length of a complete frame, header included.
+            capacity: Size of the ring buffer, defaults to 16 frames.
+            sync_on_chunk: Treat a chunk starting with the header as the start
+                of a new frame, discarding any incomplete frame still pending.
+        """
+        if not header:
+            raise ValueError("Frame header must not be empty")
+        if frame_length < len(header):
+            raise ValueError("Frame length must be at least the header length")
+        capacity = capacity or frame_length * 16
+        if capacity < frame_length * 2:
+            raise ValueError("Ring capacity must hold at least two frames")
+
+        self._header = bytes(header)
+        self._frame_length = frame_length
+        self._capacity = capacity
+        self._sync_on_chunk = sync_on_chunk
+
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._scratch = memoryview(bytearray(frame_length))
+        self._start = 0
+        self._size = 0
+
+        self.frames = 0
+        self.dropped_bytes = 0
+        self.torn_frames = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered bytes not yet handed out as a frame"""
+        return self._size
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "frames": self.frames,
+            "dropped_bytes": self.dropped_bytes,
+            "torn_frames": self.torn_frames,
+            "pending": self._size,
+        }
+
+    def reset(self) -> None:
+        """Forget any partial frame, e.g. after a disconnect"""
+        if self._size:
+            self.torn_frames += 1
+            self.dropped_bytes += self._size
+        self._start = 0
+        self._size = 0
+
+    def feed(self, data: bytes | bytearray | memoryview) -> Iterator[memoryview]:
+        """Add a notification payload and yield every frame it completes"""
+        src = memoryview(data)
+        length = len(src)
+        if not length:
+            return
+
+        if (
+            self._sync_on_chunk
+            and self._size
+            and src[: len(self._header)] == self._header
+        ):
+            # A new frame started before the previous one completed
+            _LOGGER.debug("Discarding torn frame of %d bytes", self._size)
+            self.reset()
+
+        offset = 0
+        while offset < length:
+            free = self._capacity - self._size
+            if not free:
+                # Only reachable with a pathological header, drop the oldest byte
+                self._discard(1)
+                self.dropped_bytes += 1
+                free = 1
+            count = min(free, length - offset)
+            self._write(src[offset : offset + count])
+            offset += count
+            yield from self._drain()
+
+    def _write(self, chunk: memoryview) -> None:
+        count = len(chunk)
+        end = (self._start + self._size) % self._capacity
+        first = min(count, self._capacity - end)
+        self._view[end : end + first] = chunk[:first]
+        if first < count:
+            self._view[: count - first] = chunk[first:]
+        self._size += count
+
+    def _discard(self, count: int) -> None:
+        self._start = (self._start + count) % self._capacity
+        self._size -= count
+
+    def _drain(self) -> Iterator[memoryview]:
+        header_length = len(self._header)
+        while self._size >= header_length:
+            index = self._find_header()
+            if index < 0:
+                # Keep a possible header prefix at the tail of the buffer
+                drop = self._size - (header_length - 1)
+                self._discard(drop)
+                self.dropped_bytes += drop
+                return
+            if index:
+                _LOGGER.debug("Skipping %d bytes to the next frame header", index)
+                self._discard(index)
+                self.dropped_bytes += index
+                self.torn_frames += 1
+            if self._size < self._frame_length:
+                return
+            frame = self._frame()
+            self._discard(self._frame_length)
+            self.frames += 1
+            yield frame
+
+    def _find_header(self) -> int:
+        """Return the offset of the first header relative to the read index, or -1"""
+        header = self._header
+        header_length = len(header)
+        start = self._start
+        end = start + self._size
+
+        if end <= self._capacity:
+            index = self._buffer.find(header, start, end)
+            return -1 if index < 0 else index - start
+
+        # Contiguous part up to the end of the ring
+        index = self._buffer.find(header, start, self._capacity)
+        if index >= 0:
+            return index - start
+
+        # Header split across the wrap point
+        tail = self._capacity - start
+        for split in range(1, header_length):
+            if (
+                split <= tail
+                and header_length - split <= end - self._capacity
+                and self._view[self._capacity - split :] == header[:split]
+                and self._view[: header_length - split] == header[split:]
+            ):
+                return tail - split
+
+        index = self._buffer.find(header, 0, end - self._capacity)
+        return -1 if index < 0 else tail + index
+
+    def _frame(self) -> memoryview:
+        start = self._start
+        stop = start + self._frame_length
+        if stop <= self._capacity:
+            return self._view[start:stop]
+
+        first = self._capacity - start
+        self._scratch[:first] = self._view[start:]
+        self._scratch[first:] = self._view[: self._frame_length - first]
+        return self._scratch
@@ -0,0 +1,304 @@
+"""Publish measurements and device health to an MQTT broker in batches"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from typing import Any, NamedTuple
+
+from .const import (
+    DEFAULT_MQTT_PORT,
+    DEFAULT_MQTT_PREFIX,
+    DEFAULT_MQTT_QOS,
+    MQTT_KEEPALIVE,
+    MQTT_MAX_RECONNECT_DELAY,
+    MQTT_SPOOL_MAX_BYTES,
+)
+from .export import METRIC_COLUMNS
+from .parser import BTScaleData
+
+_LOGGER = logging.getLogger(__name__)
+
+STATUS_ONLINE = "online"
+STATUS_OFFLINE = "offline"
+
+
+class Message(NamedTuple):
+    topic: str
+    payload: str
+    qos: int
+    retain: bool
+
+
+def measurement_payload(data: BTScaleData) -> dict[str, Any]:
+    """The JSON document published for a finalized measurement"""
+    payload = {
+        "timestamp": data.timestamp.isoformat() if data.timestamp else None,
+        "user_id": data.user_id,
+        "user_name": data.user_name,
+        "attribution": data.attribution,
+        "historical": data.historical,
+        "weight_kg": data.weight_kg,
+        "raw_weight": data.raw_weight,
+        "impedance": data.impedance,
+        "impedance_valid": data.impedance_valid,
+        "unit": data.unit_guess,
+    }
+    for column, attribute in METRIC_COLUMNS.items():
+        payload[column] = getattr(data, attribute, None)
+    return payload
+
+
+class MqttExporter:
+    """
+    One broker connection shared by every scale.
+
+    publish() only queues a message; flush() sends everything queued since
+    the last flush, so the owner decides the flush window. Within a window a
+    retained topic keeps only its newest value. While the broker is
+    unreachable flushed messages are appended to a spool file instead and
+    replayed in order before the next batch once it is back.
+
+    Topics, below the prefix:
+        status: "online", or "offline" as the will when the connection drops.
+        <address>/measurement: every finalized measurement.
+        <address>/<user id or "scale">/last: the newest one, retained.
+        <address>/health: presence and diagnostics, retained.
+
+    paho-mqtt is only needed once the exporter is started.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = DEFAULT_MQTT_PORT,
+        prefix: str = DEFAULT_MQTT_PREFIX,
+        qos: int = DEFAULT_MQTT_QOS,
+        username: str | None = None,
+        password: str | None = None,
+        client_id: str | None = None,
+        spool_path: str | None = None,
+        spool_max_bytes: int = MQTT_SPOOL_MAX_BYTES,
+    ) -> None:
+        """
+        Args:
+            host: The broker host name.
+            port: The broker port.
+            prefix: The topic every published topic starts with.
+            qos: QoS of the published messages.
+            username: Username, if the broker requires one.
+            password: Password of the username.
+            client_id: The client id, random by default.
+            spool_path: The file messages are spooled to while disconnected;
+                without it they are dropped.
+            spool_max_bytes: Size the spool may grow to before messages are
+                dropped.
+        """
+        self.host = host
+        self.port = port
+        self.prefix = prefix.rstrip("/")
+        self.qos = qos
+        self._username = username
+        self._password = password
+        self._client_id = client_id
+        self._spool_path = spool_path
+        self._spool_max_bytes = spool_max_bytes
+        self._client: Any = None
+
+        # Guards the queues, publish() is called from another thread than flush()
+        self._lock = threading.Lock()
+        # Serializes flushes, which own the spool file
+        self._flush_lock = threading.Lock()
+        self._events: list[Message] = []
+        self._retained: dict[str, Message] = {}
+
+        self.published = 0
+        self.spooled = 0
+        self.dropped = 0
+
+    def topic(self, *parts: str) -> str:
+        return "/".join((self.prefix, *parts))
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None and self._client.is_connected()
+
+    @property
+    def pending(self) -> int:
+        """Messages queued for the next flush"""
+        with self._lock:
+            return len(self._events) + len(self._retained)
+
+    @property
+    def spool_bytes(self) -> int:
+        """Size of the spool still to be replayed"""
+        try:
+            return os.path.getsize(self._spool_path) if self._spool_path else 0
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "pending": self.pending,
+            "published": self.published,
+            "spooled": self.spooled,
+            "dropped": self.dropped,
+            "spool_bytes": self.spool_bytes,
+        }
+
+    def start(self) -> None:
+        """Connect in the background, reconnecting until stopped
+
+        Raises:
+            ImportError: paho-mqtt is not installed.
+        """
+        try:
+            from paho.mqtt import client as mqtt  # pylint: disable=import-outside-toplevel
+        except ImportError as ex:
+            raise ImportError("MQTT export requires the paho-mqtt package") from ex
+
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            client = mqtt.Client(
+                mqtt.CallbackAPIVersion.VERSION2, client_id=self._client_id or ""
+            )
+        else:
+            client = mqtt.Client(client_id=self._client_id or "")
+        if self._username:
+            client.username_pw_set(self._username, self._password)
+        client.will_set(self.topic("status"), STATUS_OFFLINE, self.qos, retain=True)
+        client.reconnect_delay_set(1, MQTT_MAX_RECONNECT_DELAY)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        self._client = client
+        client.connect_async(self.host, self.port, MQTT_KEEPALIVE)
+        client.loop_start()
+
+    def stop(self) -> None:
+        """Flush what is queued and disconnect cleanly"""
+        if self._client is None:
+            return
+        self.flush()
+        if self.connected:
+            self._client.publish(self.topic("status"), STATUS_OFFLINE, self.qos, retain=True)
+        self._client.disconnect()
+        self._client.loop_stop()
+        self._client = None
+
+    # Callbacks run on the paho network thread; paho 2 passes extra arguments
+    def _on_connect(
+        self, client: Any, _userdata: Any, _flags: Any, reason_code: Any, *_args: Any
+    ) -> None:
+        if reason_code != 0:
+            _LOGGER.warning(
+                "MQTT broker %s:%s refused the connection: %s", self.host, self.port, reason_code
+            )
+            return
+        _LOGGER.info("Connected to MQTT broker %s:%s", self.host, self.port)
+        client.publish(self.topic("status"), STATUS_ONLINE, self.qos, retain=True)
+
+    def _on_disconnect(self, _client: Any, _userdata: Any, *_args: Any) -> None:
+        _LOGGER.info("Disconnected from MQTT broker %s:%s", self.host, self.port)
+
+    def publish(self, topic: str, payload: Any, retain: bool = False) -> None:
+        """Queue a message for the next flush, payloads are sent as JSON"""
+        message = Message(topic, json.dumps(payload), self.qos, retain)
+        with self._lock:
+            if retain:
+                # Only the newest value of a retained topic matters
+                self._retained[topic] = message
+            else:
+                self._events.append(message)
+
+    def publish_measurement(self, address: str, data: BTScaleData) -> None:
+        payload = measurement_payload(data)
+        self.publish(self.topic(address, "measurement"), payload)
+        self.publish(self.topic(address, data.user_id or "scale", "last"), payload, retain=True)
+
+    def publish_health(self, address: str, health: dict[str, Any]) -> None:
+        self.publish(self.topic(address, "health"), health, retain=True)
+
+    def flush(self) -> int:
+        """Send everything queued, or spool it while disconnected
+
+        Does blocking file I/O, call it from a worker thread.
+
+        Returns:
+            The number of messages handed to the broker connection.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = [*self._events, *self._retained.values()]
+                self._events = []
+                self._retained = {}
+
+            sent = 0
+            if self.connected and self.spool_bytes:
+                sent += self._replay_spool()
+            if not batch:
+                return sent
+            if self.spool_bytes:
+                # Still replaying, keep the order
+                self._spool(batch)
+                return sent
+
+            for index, message in enumerate(batch):
+                if not self._send(message):
+                    self._spool(batch[index:])
+                    break
+                sent += 1
+            return sent
+
+    def _send(self, message: Message) -> bool:
+        if not self.connected:
+            return False
+        info = self._client.publish(message.topic, message.payload, message.qos, message.retain)
+        if info.rc != 0:
+            return False
+        self.published += 1
+        return True
+
+    def _spool(self, messages: list[Message]) -> None:
+        if self._spool_path is None:
+            self.dropped += len(messages)
+            return
+        size = self.spool_bytes
+        lines = []
+        for message in messages:
+            line = json.dumps(message) + "\n"
+            if size + len(line) > self._spool_max_bytes:
+                self.dropped += 1
+                continue
+            size += len(line)
+            lines.append(line)
+        if len(lines) < len(messages):
+            _LOGGER.warning(
+                "MQTT spool %s is full, dropped %d messages",
+                self._spool_path,
+                len(messages) - len(lines),
+            )
+        if lines:
+            os.makedirs(os.path.dirname(self._spool_path) or ".", exist_ok=True)
+            with open(self._spool_path, "a", encoding="utf-8") as spool:
+                spool.writelines(lines)
+            self.spooled += len(lines)
+
+    def _replay_spool(self) -> int:
+        """Send the spooled messages in order, keeping what could not be sent"""
+        with open(self._spool_path, encoding="utf-8") as spool:
+            messages = [Message(*json.loads(line)) for line in spool if line.strip()]
+        sent = 0
+        for message in messages:
+            if not self._send(message):
+                break
+            sent += 1
+        remaining = messages[sent:]
+        if remaining:
+            with open(self._spool_path, "w", encoding="utf-8") as spool:
+                spool.writelines(json.dumps(message) + "\n" for message in remaining)
+        else:
+            os.remove(self._spool_path)
+        _LOGGER.debug("Replayed %d of %d spooled MQTT messages", sent, len(messages))
+        return sent
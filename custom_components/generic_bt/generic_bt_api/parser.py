@@ -4,26 +4,33 @@ import asyncio
 import dataclasses
 import struct
 from collections import namedtuple
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
 
 # from logging import Logger
 from math import exp
-from typing import Any, Callable, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Tuple
 
-from bleak.backends.scanner import (
-    AdvertisementData,
-)
+if TYPE_CHECKING:
+    from bleak.backends.scanner import AdvertisementData
+
+from .const import HISTORY_TIMESTAMP_OFFSET
 
 _LOGGER = logging.getLogger(__name__)
 HEADER_BYTES = b'\x1d\x02'
 MSG_LENGTH = 17  # Adjust if needed
+INVALID_IMPEDANCE = 0xFFFF
 HEIGHT = 171 # in cmm (temporary)
 SEX=1
 PEOPLE_TYPE=1
 AGE=38
 
 
+def default_profile() -> OneByoneNewLib:
+    """The body metrics profile used until one is configured"""
+    return OneByoneNewLib(sex=SEX, age=AGE, height=HEIGHT, people_type=PEOPLE_TYPE)
+
+
 class BTScaleData:
     """
     Convert the device data into usable object for the visuals
@@ -34,17 +41,67 @@ class BTScaleData:
     weight: str = "0"
     impedance: str = "0"
     timestamp: str = "0"
+    user_id: str | None = None
+    user_name: str | None = None
+    attribution: str | None = None
+    historical: bool = False
 
     calculation_object: OneByoneNewLib | None
 
-    def __init__(self, data: AdvertisementData):
+    def __init__(self, data: AdvertisementData, calculation_object: OneByoneNewLib | None = None):
         _LOGGER.debug("Manufacture Data: %s", data.manufacturer_data) # data to be decoded
         _LOGGER.debug("Platform Data: %s", data.platform_data)
         _LOGGER.debug("Service Data: %s", data.service_data)
-        self.calculation_object = OneByoneNewLib(sex=SEX, age=AGE, height=HEIGHT, people_type=PEOPLE_TYPE)
+        self.calculation_object = calculation_object or default_profile()
         byte_data = list(data.manufacturer_data.values())[0]
         self.parse_scale_packet(data_bytes=byte_data)
 
+    @classmethod
+    def from_bytes(
+        cls,
+        data_bytes: bytes,
+        timestamp: datetime | None = None,
+        calculation_object: OneByoneNewLib | None = None,
+    ) -> BTScaleData:
+        """Decode a frame received outside of an advertisement, e.g. a notification"""
+        self = cls.__new__(cls)
+        self.calculation_object = calculation_object or default_profile()
+        self.parse_scale_packet(data_bytes=data_bytes)
+        self.timestamp = timestamp
+        return self
+
+    @classmethod
+    def from_history_frame(
+        cls, data_bytes: bytes, calculation_object: OneByoneNewLib | None = None
+    ) -> BTScaleData:
+        """Decode a stored weigh-in, which carries the time it was taken"""
+        self = cls.from_bytes(data_bytes, calculation_object=calculation_object)
+        self.timestamp = self.get_timestamp32(data_bytes, HISTORY_TIMESTAMP_OFFSET)
+        self.historical = True
+        return self
+
+    @classmethod
+    def from_raw(
+        cls,
+        raw_weight: int,
+        impedance: int,
+        unit_flag: int = 1,
+        timestamp: datetime | None = None,
+        calculation_object: OneByoneNewLib | None = None,
+    ) -> BTScaleData:
+        """Recompute a measurement from its persisted raw readings"""
+        self = cls.__new__(cls)
+        self.calculation_object = calculation_object or default_profile()
+        self.full_bytes = []
+        self.calculate(raw_weight, impedance, unit_flag)
+        self.timestamp = timestamp
+        return self
+
+    @property
+    def record_key(self) -> tuple:
+        """Identify a weigh-in independent of how it was received"""
+        return (self.raw_weight, self.impedance)
+
     def _parse_scale_data(packet: bytes) -> float:
         if len(packet) != 17:
             raise ValueError("Unexpected packet length.")
@@ -76,7 +133,7 @@ class BTScaleData:
     def get_timestamp32(self, data, offset):
         """Decode a 32-bit timestamp, interpreted as seconds since Unix epoch."""
         timestamp = struct.unpack('>I', data[offset:offset + 4])[0]
-        return datetime.utcfromtimestamp(timestamp)
+        return datetime.fromtimestamp(timestamp, timezone.utc)
 
     def parse_scale_packet(self, data_bytes: bytearray):
         if not data_bytes:
@@ -86,12 +143,16 @@ class BTScaleData:
         _LOGGER.debug("Data: %r", data_bytes)
 
         weight_raw = data_bytes[9] + (data_bytes[10] << 8)
+        impedance_raw = self.from_unsigned_int16_be(data=data_bytes, offset=4)
+        unit_flag = data_bytes[15]
+
+        self.full_bytes = list(data_bytes)
+        self.calculate(weight_raw, impedance_raw, unit_flag)
 
+    def calculate(self, weight_raw: int, impedance_raw: int, unit_flag: int):
+        """Derive the weight and body metrics from the raw readings"""
         weight_kg = weight_raw / 100  # assuming scale uses 0.1kg units
         weight_lb = weight_raw / 100 * 2.20462
-        impedance_raw = self.from_unsigned_int16_be(data=data_bytes, offset=4)
-
-        unit_flag = data_bytes[15]
         unit = "kg" if unit_flag == 1 else "lb"
 
         self.raw_weight = weight_raw
@@ -99,20 +160,31 @@ class BTScaleData:
         self.impedance = impedance_raw
         self.bmi = self.calculation_object.get_bmi(weight_raw)
         self.bmmr = self.calculation_object.get_bmmr(weight=weight_kg)
-        self.fat_percentage  = self.calculation_object.get_body_fat_percentage(weight=weight_kg, impedance=impedance_raw)
-        self.bone_mass = self.calculation_object.get_bone_mass(weight=weight_kg, impedance=impedance_raw)
-        self.muscle_mass = self.calculation_object.get_muscle_mass(weight=weight_kg, impedance=impedance_raw)
-        self.skeletal_mass = self.calculation_object.get_skeleton_muscle_percentage(weight=weight_kg, impedance=impedance_raw)
         self.visceral = self.calculation_object.get_visceral_fat(weight=weight_kg)
-        self.water_percentage = self.calculation_object.get_water_percentage(weight=weight_kg, impedance=impedance_raw)
-        self.protein_percentage = self.calculation_object.get_protein_percentage(weight=weight_kg, impedance=impedance_raw)
+
+        # Body composition needs a completed impedance measurement; frames
+        # sent while it is still running carry no usable impedance
+        self.impedance_valid = 0 < impedance_raw < INVALID_IMPEDANCE
+        if self.impedance_valid:
+            self.fat_percentage  = self.calculation_object.get_body_fat_percentage(weight=weight_kg, impedance=impedance_raw)
+            self.bone_mass = self.calculation_object.get_bone_mass(weight=weight_kg, impedance=impedance_raw)
+            self.muscle_mass = self.calculation_object.get_muscle_mass(weight=weight_kg, impedance=impedance_raw)
+            self.skeletal_mass = self.calculation_object.get_skeleton_muscle_percentage(weight=weight_kg, impedance=impedance_raw)
+            self.water_percentage = self.calculation_object.get_water_percentage(weight=weight_kg, impedance=impedance_raw)
+            self.protein_percentage = self.calculation_object.get_protein_percentage(weight=weight_kg, impedance=impedance_raw)
+        else:
+            self.fat_percentage = None
+            self.bone_mass = None
+            self.muscle_mass = None
+            self.skeletal_mass = None
+            self.water_percentage = None
+            self.protein_percentage = None
         self.weight_lb = weight_lb
         self.unit_flag = unit_flag
         self.unit_guess = unit
-        self.full_bytes = list(data_bytes)
         
     def __str__(self):
-        return "Weight: %s, Raw: %s", self.weight_kg, self.raw_weight
+        return "Weight: %s, Raw: %s" % (self.weight_kg, self.raw_weight)
 
     pass
 
@@ -0,0 +1,78 @@
+"""Presence and advertisement statistics of a BLE device"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+
+from .const import ADVERTISEMENT_RATE_SMOOTHING
+
+
+@dataclass
+class DevicePresence:
+    """
+    What the scanner saw of one device.
+
+    Updated from every advertisement in O(1); whether the device went quiet
+    is decided by a timeout on the shared timer wheel, not by this class.
+    """
+
+    present: bool = False
+    last_seen: float | None = None
+    last_seen_at: datetime | None = None
+    rssi: int | None = None
+    source: str | None = None
+    interval: float | None = None
+    advertisements: int = 0
+
+    @property
+    def rate(self) -> float:
+        """Advertisements per minute, 0 while the device is absent"""
+        if not self.present or not self.interval:
+            return 0.0
+        return round(60.0 / self.interval, 2)
+
+    def seen(
+        self,
+        now: float,
+        wall: datetime,
+        rssi: int | None = None,
+        source: str | None = None,
+        smoothing: float = ADVERTISEMENT_RATE_SMOOTHING,
+    ) -> bool:
+        """Record an advertisement
+
+        Args:
+            now: Monotonic time of the advertisement.
+            wall: Wall clock time of the advertisement.
+            rssi: Signal strength as reported by the scanner.
+            source: The scanner that received it.
+            smoothing: Weight of the newest interval in the rate average.
+
+        Returns:
+            True if the device just came back.
+        """
+        arrived = not self.present
+        if self.last_seen is not None and not arrived:
+            elapsed = now - self.last_seen
+            if self.interval is None:
+                self.interval = elapsed
+            else:
+                self.interval += smoothing * (elapsed - self.interval)
+        elif arrived:
+            # The gap while absent says nothing about the advertising rate
+            self.interval = None
+        self.present = True
+        self.last_seen = now
+        self.last_seen_at = wall
+        self.advertisements += 1
+        if rssi is not None:
+            self.rssi = rssi
+        if source is not None:
+            self.source = source
+        return arrived
+
+    def expire(self) -> bool:
+        """Mark the device absent, returns True if it was present"""
+        was_present = self.present
+        self.present = False
+        return was_present
@@ -0,0 +1,127 @@
+"""Attribute weigh-ins on a shared scale to the people using it"""
+from __future__ import annotations
+
+import bisect
+from dataclasses import dataclass
+from datetime import date
+from enum import Enum
+
+from .const import DEFAULT_AMBIGUITY_MARGIN, DEFAULT_MATCH_TOLERANCE
+from .parser import PEOPLE_TYPE, OneByoneNewLib
+
+
+@dataclass
+class UserProfile:
+    """A person weighing themselves on the scale"""
+    user_id: str
+    name: str
+    sex: int  # 0 = female, 1 = male
+    birthdate: date
+    height_cm: float
+    people_type: int = PEOPLE_TYPE
+    last_weight: float | None = None
+
+    def age_on(self, today: date) -> int:
+        return today.year - self.birthdate.year - (
+            (today.month, today.day) < (self.birthdate.month, self.birthdate.day)
+        )
+
+    def calculation_object(self, today: date | None = None) -> OneByoneNewLib:
+        return OneByoneNewLib(
+            sex=self.sex,
+            age=self.age_on(today or date.today()),
+            height=self.height_cm,
+            people_type=self.people_type,
+        )
+
+
+class Attribution(str, Enum):
+    MATCHED = "matched"
+    AMBIGUOUS = "ambiguous"
+    UNKNOWN = "unknown"
+
+
+@dataclass
+class MatchResult:
+    attribution: Attribution
+    profile: UserProfile | None = None
+    distance: float | None = None
+
+
+class ProfileIndex:
+    """
+    Profiles kept sorted by their most recent weight.
+
+    A lookup bisects into the sorted weights and only compares the
+    neighbours around the insertion point, so matching stays O(log n) no
+    matter how many profiles share the scale.
+    """
+
+    def __init__(
+        self,
+        profiles: list[UserProfile] | tuple = (),
+        tolerance: float = DEFAULT_MATCH_TOLERANCE,
+        ambiguity_margin: float = DEFAULT_AMBIGUITY_MARGIN,
+    ) -> None:
+        self.tolerance = tolerance
+        self.ambiguity_margin = ambiguity_margin
+        self._profiles: dict[str, UserProfile] = {}
+        self._entries: list[tuple[float, str]] = []
+        for profile in profiles:
+            self.add(profile)
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def __iter__(self):
+        return iter(self._profiles.values())
+
+    def get(self, user_id: str) -> UserProfile | None:
+        return self._profiles.get(user_id)
+
+    def add(self, profile: UserProfile) -> None:
+        self.remove(profile.user_id)
+        self._profiles[profile.user_id] = profile
+        if profile.last_weight is not None:
+            bisect.insort(self._entries, (profile.last_weight, profile.user_id))
+
+    def remove(self, user_id: str) -> None:
+        profile = self._profiles.pop(user_id, None)
+        if profile is None or profile.last_weight is None:
+            return
+        entry = (profile.last_weight, user_id)
+        index = bisect.bisect_left(self._entries, entry)
+        if index < len(self._entries) and self._entries[index] == entry:
+            del self._entries[index]
+
+    def update_weight(self, user_id: str, weight: float) -> None:
+        """Move a profile to its newly measured weight"""
+        if (profile := self._profiles.get(user_id)) is None:
+            return
+        self.remove(user_id)
+        profile.last_weight = weight
+        self.add(profile)
+
+    def match(self, weight: float) -> MatchResult:
+        """Find the profile whose recent weight is nearest to a weigh-in"""
+        if len(self._profiles) == 1:
+            # A scale with a single user needs no guessing
+            return MatchResult(Attribution.MATCHED, next(iter(self._profiles.values())))
+
+        index = bisect.bisect_left(self._entries, (weight, ""))
+        # The two nearest weights are within two places of the insertion point
+        nearest = sorted(
+            (abs(self._entries[i][0] - weight), self._entries[i][1])
+            for i in range(max(index - 2, 0), min(index + 2, len(self._entries)))
+        )
+        if not nearest or nearest[0][0] > self.tolerance:
+            return MatchResult(Attribution.UNKNOWN)
+
+        distance, user_id = nearest[0]
+        if (
+            len(nearest) > 1
+            and nearest[1][0] <= self.tolerance
+            and nearest[1][0] - distance <= self.ambiguity_margin
+        ):
+            return MatchResult(Attribution.AMBIGUOUS, distance=distance)
+        return MatchResult(Attribution.MATCHED, self._profiles[user_id], distance)
@@ -0,0 +1,271 @@
+"""Registry of advertisement protocols and fingerprinting against it"""
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
+import logging
+from typing import NamedTuple, Protocol as TypingProtocol
+
+from .const import (
+    PLAUSIBLE_MAX_IMPEDANCE,
+    PLAUSIBLE_MAX_WEIGHT_KG,
+    PROTOCOL_MIN_MARGIN,
+    PROTOCOL_MIN_SCORE,
+)
+from .parser import HEADER_BYTES, INVALID_IMPEDANCE, MSG_LENGTH, BTScaleData, OneByoneNewLib
+
+_LOGGER = logging.getLogger(__name__)
+
+LB_TO_KG = 0.45359237
+JIN_TO_KG = 0.5
+
+SERVICE_HID = "00001812-0000-1000-8000-00805f9b34fb"
+SERVICE_WEIGHT_SCALE = "0000181d-0000-1000-8000-00805f9b34fb"
+SERVICE_BODY_COMPOSITION = "0000181b-0000-1000-8000-00805f9b34fb"
+
+
+class Advertisement(TypingProtocol):
+    """What a protocol reads of an advertisement
+
+    Satisfied by bleak's AdvertisementData, Home Assistant's
+    BluetoothServiceInfo and AdvertisementSample alike.
+    """
+
+    manufacturer_data: Mapping[int, bytes]
+    service_data: Mapping[str, bytes]
+    service_uuids: Sequence[str]
+
+
+class AdvertisementSample(NamedTuple):
+    """A copy of the parts of an advertisement fingerprinting looks at"""
+
+    manufacturer_data: Mapping[int, bytes]
+    service_data: Mapping[str, bytes]
+    service_uuids: Sequence[str]
+
+    @classmethod
+    def of(cls, advertisement: Advertisement) -> AdvertisementSample:
+        return cls(
+            dict(advertisement.manufacturer_data),
+            dict(advertisement.service_data),
+            list(advertisement.service_uuids),
+        )
+
+
+@dataclass(frozen=True)
+class Protocol:
+    """
+    How one kind of scale advertises its measurements.
+
+    payload picks the protocol's bytes out of an advertisement and decode
+    turns them into a measurement, None for frames that carry none. The
+    header, service UUIDs and manufacturer ids identify the protocol when
+    fingerprinting and index it for discovery; a protocol with a header is
+    identified by the header alone, as its service UUIDs may be shared by
+    unrelated devices, e.g. HID. has_history tells whether the scale keeps
+    weigh-ins taken out of range for GenericBTDevice.async_sync_history().
+    """
+
+    name: str
+    payload: Callable[[Advertisement], bytes | None]
+    decode: Callable[[bytes, OneByoneNewLib | None], BTScaleData | None]
+    min_length: int
+    max_length: int
+    header: bytes = b""
+    service_uuids: frozenset[str] = field(default_factory=frozenset)
+    manufacturer_ids: frozenset[int] = field(default_factory=frozenset)
+    has_history: bool = False
+
+    def identifies(self, advertisement: Advertisement, payload: bytes) -> bool:
+        """Whether the advertisement carries a marker unique to the protocol"""
+        if self.header:
+            return payload.startswith(self.header)
+        if self.service_uuids and (
+            self.service_uuids.intersection(advertisement.service_uuids)
+            or self.service_uuids.intersection(advertisement.service_data)
+        ):
+            return True
+        return bool(self.manufacturer_ids.intersection(advertisement.manufacturer_data))
+
+
+class ProtocolScore(NamedTuple):
+    name: str
+    score: float
+
+
+PROTOCOLS: dict[str, Protocol] = {}
+
+
+def register_protocol(protocol: Protocol) -> Protocol:
+    """Add a protocol to the registry fingerprinting and discovery use"""
+    if protocol.name in PROTOCOLS:
+        raise ValueError(f"Protocol {protocol.name} is already registered")
+    PROTOCOLS[protocol.name] = protocol
+    return protocol
+
+
+def get_protocol(name: str) -> Protocol:
+    """The registered protocol of that name
+
+    Raises:
+        KeyError: No such protocol is registered.
+    """
+    return PROTOCOLS[name]
+
+
+def plausible(data: BTScaleData | None) -> bool:
+    """Whether a decoded measurement looks like one a scale would send"""
+    if data is None or not 0 <= data.weight_kg <= PLAUSIBLE_MAX_WEIGHT_KG:
+        return False
+    return data.impedance in (0, INVALID_IMPEDANCE) or data.impedance <= PLAUSIBLE_MAX_IMPEDANCE
+
+
+def score_sample(protocol: Protocol, advertisement: Advertisement) -> float:
+    """
+    Score how well one advertisement matches a protocol, from 0 to 1.
+
+    A quarter for a payload of a valid length, a quarter for a marker that
+    identifies the protocol and a half for a plausible decoded measurement.
+    """
+    if (payload := protocol.payload(advertisement)) is None:
+        return 0.0
+    if not protocol.min_length <= len(payload) <= protocol.max_length:
+        return 0.0
+    score = 0.25
+    if protocol.identifies(advertisement, payload):
+        score += 0.25
+    try:
+        data = protocol.decode(payload, None)
+    except (IndexError, ValueError, ArithmeticError):
+        data = None
+    if plausible(data):
+        score += 0.5
+    return score
+
+
+def fingerprint(
+    samples: Sequence[Advertisement], protocols: Iterable[Protocol] | None = None
+) -> list[ProtocolScore]:
+    """Rank the protocols by their mean score over the samples, best first"""
+    if not samples:
+        return []
+    ranking = [
+        ProtocolScore(
+            protocol.name,
+            sum(score_sample(protocol, sample) for sample in samples) / len(samples),
+        )
+        for protocol in (PROTOCOLS.values() if protocols is None else protocols)
+    ]
+    ranking.sort(key=lambda score: score.score, reverse=True)
+    return ranking
+
+
+def select_protocol(
+    samples: Sequence[Advertisement], protocols: Iterable[Protocol] | None = None
+) -> Protocol | None:
+    """The protocol the samples clearly match, None if none or several do"""
+    ranking = fingerprint(samples, protocols)
+    _LOGGER.debug("Protocol scores: %s", ranking)
+    if not ranking or ranking[0].score < PROTOCOL_MIN_SCORE:
+        return None
+    if len(ranking) > 1 and ranking[0].score - ranking[1].score < PROTOCOL_MIN_MARGIN:
+        return None
+    return PROTOCOLS[ranking[0].name]
+
+
+def _first_manufacturer_data(advertisement: Advertisement) -> bytes | None:
+    if not advertisement.manufacturer_data:
+        return None
+    return bytes(next(iter(advertisement.manufacturer_data.values())))
+
+
+def _service_data(uuid: str) -> Callable[[Advertisement], bytes | None]:
+    def payload(advertisement: Advertisement) -> bytes | None:
+        data = advertisement.service_data.get(uuid)
+        return None if data is None else bytes(data)
+
+    return payload
+
+
+def _decode_onebyone(payload: bytes, profile: OneByoneNewLib | None) -> BTScaleData | None:
+    # parse_scale_packet() reads up to the unit flag in byte 15
+    if len(payload) < 16:
+        return None
+    return BTScaleData.from_bytes(payload, calculation_object=profile)
+
+
+def _weight_kg(raw: int, imperial: bool, catty: bool) -> tuple[float, int]:
+    """Weight in kg and unit flag of a 0.005 kg, 0.01 lb or 0.01 jin reading"""
+    if imperial:
+        return raw / 100 * LB_TO_KG, 0
+    if catty:
+        return raw / 100 * JIN_TO_KG, 1
+    return raw / 200, 1
+
+
+def _decode_weight_scale(payload: bytes, profile: OneByoneNewLib | None) -> BTScaleData | None:
+    """Weight Scale service data, a Weight Measurement as sent by Mi Scale v1
+
+    Flags: bit 0 imperial, bit 4 catty, bit 7 the load was removed.
+    """
+    flags = payload[0]
+    if flags & 0x80:
+        return None
+    weight_kg, unit_flag = _weight_kg(
+        int.from_bytes(payload[1:3], "little"), bool(flags & 0x01), bool(flags & 0x10)
+    )
+    return BTScaleData.from_raw(round(weight_kg * 100), 0, unit_flag, None, profile)
+
+
+def _decode_body_composition(
+    payload: bytes, profile: OneByoneNewLib | None
+) -> BTScaleData | None:
+    """Body Composition service data as sent by the Mi Body Composition Scale
+
+    Control byte 0 bit 0 imperial; control byte 1 bit 1 impedance present,
+    bit 6 catty, bit 7 the load was removed. Impedance and weight are little
+    endian at offsets 9 and 11.
+    """
+    control = payload[1]
+    if control & 0x80:
+        return None
+    impedance = int.from_bytes(payload[9:11], "little") if control & 0x02 else 0
+    weight_kg, unit_flag = _weight_kg(
+        int.from_bytes(payload[11:13], "little"), bool(payload[0] & 0x01), bool(control & 0x40)
+    )
+    return BTScaleData.from_raw(round(weight_kg * 100), impedance, unit_flag, None, profile)
+
+
+ONEBYONE = register_protocol(
+    Protocol(
+        name="onebyone",
+        payload=_first_manufacturer_data,
+        decode=_decode_onebyone,
+        min_length=16,
+        max_length=MSG_LENGTH,
+        header=HEADER_BYTES,
+        service_uuids=frozenset({SERVICE_HID}),
+        has_history=True,
+    )
+)
+WEIGHT_SCALE = register_protocol(
+    Protocol(
+        name="weight_scale",
+        payload=_service_data(SERVICE_WEIGHT_SCALE),
+        decode=_decode_weight_scale,
+        # Flags and weight, up to a timestamp, user id, BMI and height
+        min_length=3,
+        max_length=15,
+        service_uuids=frozenset({SERVICE_WEIGHT_SCALE}),
+    )
+)
+BODY_COMPOSITION = register_protocol(
+    Protocol(
+        name="body_composition",
+        payload=_service_data(SERVICE_BODY_COMPOSITION),
+        decode=_decode_body_composition,
+        min_length=13,
+        max_length=13,
+        service_uuids=frozenset({SERVICE_BODY_COMPOSITION}),
+    )
+)
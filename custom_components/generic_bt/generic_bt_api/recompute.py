@@ -0,0 +1,118 @@
+"""Recompute body metrics of stored measurements in worker processes"""
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Union
+
+from .parser import BTScaleData, OneByoneNewLib
+from .profiles import UserProfile
+from .store import StoredMeasurement
+from .trends import TrendEngine
+
+# (timestamp in seconds, raw weight, impedance, unit flag, user id)
+RawRecord = tuple[float, int, int, int, Union[str, None]]
+# A fixed profile, or a person whose age follows the measurement date
+Profile = Union[OneByoneNewLib, UserProfile]
+# (user id, statistic key, hour start in seconds) -> [count, total, min, max]
+HourlyAggregates = dict[tuple[Union[str, None], str, int], list[float]]
+
+
+def _raw_records(records: Iterable[StoredMeasurement]) -> Iterator[RawRecord]:
+    return (
+        (record.timestamp.timestamp(), record.raw_weight, record.impedance,
+         record.unit_flag, record.user_id)
+        for record in records
+    )
+
+
+def raw_chunks(records: Iterable[StoredMeasurement], size: int) -> Iterator[list[RawRecord]]:
+    """Pack stored measurements into compact chunks of size for the workers"""
+    iterator = _raw_records(records)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _recompute(
+    records: Iterable[RawRecord], profiles: dict[str | None, Profile]
+) -> Iterator[tuple[float, str | None, BTScaleData]]:
+    """Recompute every measurement of a user in profiles"""
+    calculators: dict[tuple[str | None, int], OneByoneNewLib] = {}
+    for timestamp, raw_weight, impedance, unit_flag, user_id in records:
+        if (profile := profiles.get(user_id)) is None:
+            continue
+        if isinstance(profile, UserProfile):
+            day = datetime.fromtimestamp(timestamp, timezone.utc).date()
+            age = profile.age_on(day)
+            if (calculator := calculators.get((user_id, age))) is None:
+                calculator = calculators[(user_id, age)] = profile.calculation_object(day)
+        else:
+            calculator = profile
+        yield timestamp, user_id, BTScaleData.from_raw(
+            raw_weight, impedance, unit_flag, None, calculator
+        )
+
+
+def recompute_chunk(
+    records: list[RawRecord],
+    profiles: dict[str | None, Profile],
+    attributes: dict[str, str],
+) -> HourlyAggregates:
+    """Recompute a chunk of measurements and fold them into hourly aggregates
+
+    Runs in a worker process, so everything passed in and out is plain
+    picklable data.
+
+    Args:
+        records: Raw measurements from raw_chunks().
+        profiles: The profile of every user id; records of other users are
+            skipped.
+        attributes: Statistic key to the BTScaleData attribute to aggregate.
+
+    Returns:
+        Count, total, min and max per user, statistic and hour.
+    """
+    aggregates: HourlyAggregates = {}
+    for timestamp, user_id, data in _recompute(records, profiles):
+        hour = int(timestamp // 3600 * 3600)
+        for key, attribute in attributes.items():
+            if (value := getattr(data, attribute, None)) is None:
+                continue
+            value = float(value)
+            if (aggregate := aggregates.get((user_id, key, hour))) is None:
+                aggregates[(user_id, key, hour)] = [1, value, value, value]
+            else:
+                aggregate[0] += 1
+                aggregate[1] += value
+                aggregate[2] = min(aggregate[2], value)
+                aggregate[3] = max(aggregate[3], value)
+    return aggregates
+
+
+def merge_aggregates(into: HourlyAggregates, other: HourlyAggregates) -> None:
+    """Fold the aggregates of another chunk into into"""
+    for bucket, (count, total, minimum, maximum) in other.items():
+        if (aggregate := into.get(bucket)) is None:
+            into[bucket] = [count, total, minimum, maximum]
+        else:
+            aggregate[0] += count
+            aggregate[1] += total
+            aggregate[2] = min(aggregate[2], minimum)
+            aggregate[3] = max(aggregate[3], maximum)
+
+
+def recompute_trends(
+    records: Iterable[StoredMeasurement], profiles: dict[str | None, Profile]
+) -> TrendEngine:
+    """Rebuild the trends of the users in profiles from their whole history
+
+    Trends depend on the order of the measurements, so this replays them
+    one at a time instead of in chunks.
+    """
+    trends = TrendEngine()
+    for timestamp, user_id, data in _recompute(_raw_records(records), profiles):
+        data.timestamp = datetime.fromtimestamp(timestamp, timezone.utc)
+        data.user_id = user_id
+        trends.add(data)
+    return trends
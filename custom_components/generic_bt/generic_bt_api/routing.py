@@ -0,0 +1,105 @@
+"""Rank the adapters and proxies a device can be reached through"""
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from .const import RSSI_MAX_AGE, RSSI_SMOOTHING
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class SourceReading:
+    """The latest view of a device from one scanner source"""
+    source: str
+    rssi: float
+    ble_device: Any
+    seen: float
+
+
+class RssiRouter:
+    """
+    Keep recent per-source RSSI for each device and rank connection paths.
+
+    Every advertisement updates a smoothed RSSI for the source that heard
+    it. Connections are routed through the strongest fresh source that has
+    a free connection slot, failing over in RSSI order.
+
+    Routing is advisory under Home Assistant: its Bleak wrapper picks the
+    adapter or proxy for a connection itself, whichever BLEDevice it is
+    given, so the routes order the attempts and the slots accounted for
+    them rather than pin the link.
+    """
+
+    def __init__(
+        self,
+        max_age: float = RSSI_MAX_AGE,
+        smoothing: float = RSSI_SMOOTHING,
+        has_free_slot: Callable[[str], bool] | None = None,
+    ) -> None:
+        self._max_age = max_age
+        self._smoothing = smoothing
+        self._has_free_slot = has_free_slot
+        self._readings: dict[str, dict[str, SourceReading]] = {}
+        self._next_sweep = 0.0
+
+    def set_slot_check(self, has_free_slot: Callable[[str], bool] | None) -> None:
+        self._has_free_slot = has_free_slot
+
+    def record(self, address: str, source: str, rssi: int | None, ble_device: Any) -> None:
+        """Update the reading for a device from an advertisement"""
+        if rssi is None:
+            return
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        sources = self._readings.setdefault(address, {})
+        reading = sources.get(source)
+        if reading is None or now - reading.seen > self._max_age:
+            sources[source] = SourceReading(source, float(rssi), ble_device, now)
+            return
+        reading.rssi += self._smoothing * (rssi - reading.rssi)
+        reading.ble_device = ble_device
+        reading.seen = now
+
+    def _sweep(self, now: float) -> None:
+        """Drop devices not heard from for max_age, at most once per max_age"""
+        cutoff = now - self._max_age
+        for address in [
+            address
+            for address, sources in self._readings.items()
+            if all(reading.seen < cutoff for reading in sources.values())
+        ]:
+            del self._readings[address]
+        self._next_sweep = now + self._max_age
+
+    def forget(self, address: str) -> None:
+        self._readings.pop(address, None)
+
+    def readings(self, address: str) -> list[SourceReading]:
+        """Fresh readings for a device, strongest first"""
+        cutoff = time.monotonic() - self._max_age
+        sources = self._readings.get(address, {})
+        for source in [s for s, r in sources.items() if r.seen < cutoff]:
+            del sources[source]
+        return sorted(sources.values(), key=lambda reading: reading.rssi, reverse=True)
+
+    def candidates(self, address: str) -> list[SourceReading]:
+        """Readings to try connecting through, in failover order
+
+        Sources with a free connection slot come first, each group ordered
+        by RSSI, so a busy proxy is only used when nothing else hears the
+        device.
+        """
+        readings = self.readings(address)
+        if self._has_free_slot is None:
+            return readings
+        # Stable sort keeps RSSI order within the free and busy groups
+        return sorted(readings, key=lambda reading: not self._has_free_slot(reading.source))
+
+    def routes(self, address: str) -> list[tuple[str, Any]]:
+        """(source, ble_device) pairs to connect through, in failover order"""
+        return [(reading.source, reading.ble_device) for reading in self.candidates(address)]
@@ -0,0 +1,183 @@
+"""Share the limited connection slots of adapters and proxies between devices"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from .const import DEFAULT_SLOT_TIMEOUT, LOCAL_ADAPTER_SLOTS, SLOT_FAIRNESS_HALF_LIFE
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(order=True)
+class _Waiter:
+    """A queued connection request, ordered by priority, then fairness, then age"""
+    rank: int
+    served: float
+    seq: int
+    device: str = field(compare=False)
+    sources: list[str] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    queued: float = field(compare=False)
+
+
+class ConnectionSlotScheduler:
+    """
+    Hand out connection slots per scanner source, fairly across devices.
+
+    Each source has a fixed number of concurrent connection slots. A
+    request names the sources it can use in order of preference and waits
+    until one of them has a free slot. Higher priority requests go first;
+    within a priority the device that has been granted the fewest slots
+    recently goes first, so one chatty device cannot starve the others.
+    Grants decay with a half life, a device busy long ago is not held back.
+    """
+
+    def __init__(
+        self,
+        default_capacity: int = LOCAL_ADAPTER_SLOTS,
+        half_life: float = SLOT_FAIRNESS_HALF_LIFE,
+    ) -> None:
+        self._default_capacity = default_capacity
+        self._half_life = half_life
+        self._capacity: dict[str, int] = {}
+        self._in_use: dict[str, int] = {}
+        # Device -> (decayed number of grants, monotonic time of the last)
+        self._served: dict[str, tuple[float, float]] = {}
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+
+        self.granted = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def set_capacity(self, source: str, slots: int) -> None:
+        self._capacity[source] = max(slots, 0)
+        self._dispatch()
+
+    def ensure_source(self, source: str, slots: int) -> None:
+        """Register a source unless its capacity is already known"""
+        if source not in self._capacity:
+            self.set_capacity(source, slots)
+
+    def capacity(self, source: str) -> int:
+        return self._capacity.get(source, self._default_capacity)
+
+    def has_free_slot(self, source: str) -> bool:
+        return self._in_use.get(source, 0) < self.capacity(source)
+
+    def in_use(self, source: str) -> int:
+        """Slots of the source held through this scheduler"""
+        return self._in_use.get(source, 0)
+
+    def _served_count(self, device: str, now: float) -> float:
+        served, last = self._served.get(device, (0.0, now))
+        return served * 0.5 ** ((now - last) / self._half_life)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self._waiters),
+            "granted": self.granted,
+            "timeouts": self.timeouts,
+            "average_wait": self.total_wait / self.granted if self.granted else 0.0,
+            "max_wait": self.max_wait,
+            "in_use": dict(self._in_use),
+        }
+
+    async def acquire(
+        self,
+        device: str,
+        sources: list[str],
+        priority: int = 0,
+        timeout: float | None = DEFAULT_SLOT_TIMEOUT,
+    ) -> str:
+        """Wait for a free slot on one of the sources and return that source
+
+        Raises:
+            asyncio.TimeoutError: No slot became free before the deadline.
+        """
+        if not sources:
+            raise ValueError("At least one source is required")
+
+        waiter = _Waiter(
+            rank=-priority,
+            served=self._served_count(device, time.monotonic()),
+            seq=next(self._seq),
+            device=device,
+            sources=list(sources),
+            future=asyncio.get_running_loop().create_future(),
+            queued=time.monotonic(),
+        )
+        self._waiters.append(waiter)
+        self._dispatch()
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # Granted while we were timing out, hand the slot back
+                self.release(waiter.future.result())
+            if isinstance(exc, asyncio.TimeoutError):
+                self.timeouts += 1
+                _LOGGER.debug("No connection slot for %s within %ss", device, timeout)
+            raise
+
+    def release(self, source: str) -> None:
+        in_use = self._in_use.get(source, 0)
+        if in_use <= 0:
+            _LOGGER.debug("Released a slot on %s that was not in use", source)
+            return
+        self._in_use[source] = in_use - 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        device: str,
+        sources: list[str],
+        priority: int = 0,
+        timeout: float | None = DEFAULT_SLOT_TIMEOUT,
+    ) -> AsyncIterator[str]:
+        source = await self.acquire(device, sources, priority, timeout)
+        try:
+            yield source
+        finally:
+            self.release(source)
+
+    def _dispatch(self) -> None:
+        """Grant free slots to queued requests in priority order"""
+        if not self._waiters:
+            return
+        self._waiters.sort()
+        now = time.monotonic()
+        for waiter in list(self._waiters):
+            if waiter.future.done():
+                self._waiters.remove(waiter)
+                continue
+            source = next(
+                (source for source in waiter.sources if self.has_free_slot(source)), None
+            )
+            if source is None:
+                # Requests for other sources may still be served
+                continue
+            self._waiters.remove(waiter)
+            self._in_use[source] = self._in_use.get(source, 0) + 1
+            self._served[waiter.device] = (self._served_count(waiter.device, now) + 1, now)
+            wait = now - waiter.queued
+            self.granted += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            waiter.future.set_result(source)
@@ -0,0 +1,94 @@
+"""Track a weigh-in from the first weight frame to the impedance result"""
+from __future__ import annotations
+
+from enum import Enum
+
+from .const import SESSION_GAP, SESSION_STABLE_FRAMES, SESSION_STABLE_TOLERANCE
+from .parser import BTScaleData
+
+
+class Phase(str, Enum):
+    """What a frame completes in its weigh-in session"""
+    PROVISIONAL = "provisional"
+    FINAL = "final"
+
+
+class WeighInSession:
+    """
+    Decide when a stream of frames is worth publishing.
+
+    The scale sends weight frames while the reading settles and only later a
+    frame with the measured impedance. A session publishes a provisional
+    weight as soon as it is stable, then the final measurement once a valid
+    impedance arrives. Frames repeating an already final measurement are
+    ignored until a gap or a different weight starts a new session.
+    """
+
+    def __init__(
+        self,
+        stable_frames: int = SESSION_STABLE_FRAMES,
+        tolerance: int = SESSION_STABLE_TOLERANCE,
+        gap: float = SESSION_GAP,
+    ) -> None:
+        self._stable_frames = stable_frames
+        self._tolerance = tolerance
+        self._gap = gap
+        self._reset()
+        self._last_seen: float | None = None
+
+    def _reset(self) -> None:
+        self._reference: int | None = None
+        self._stable_count = 0
+        self.provisional: BTScaleData | None = None
+        self.final: BTScaleData | None = None
+
+    @property
+    def pending(self) -> bool:
+        """A provisional weight was published and no final one yet"""
+        return self.provisional is not None and self.final is None
+
+    def feed(self, data: BTScaleData, now: float) -> Phase | None:
+        """Add a frame received at monotonic time now
+
+        Returns:
+            The phase to publish the frame as, or None to hold it back.
+        """
+        if self._last_seen is None or now - self._last_seen > self._gap:
+            self._reset()
+        self._last_seen = now
+
+        close = (
+            self._reference is not None
+            and abs(data.raw_weight - self._reference) <= self._tolerance
+        )
+        if self.final is not None:
+            if close:
+                return None
+            # Someone else stepped on
+            self._reset()
+
+        if data.impedance_valid:
+            self.final = data
+            self._reference = data.raw_weight
+            return Phase.FINAL
+
+        if close:
+            self._stable_count += 1
+        else:
+            self._reference = data.raw_weight
+            self._stable_count = 1
+            if self.provisional is not None:
+                # The weight moved after it looked stable
+                self.provisional = None
+
+        if self.provisional is None and self._stable_count >= self._stable_frames:
+            self.provisional = data
+            return Phase.PROVISIONAL
+        return None
+
+    def finalize(self) -> BTScaleData | None:
+        """Close a session that never got an impedance, e.g. with shoes on"""
+        if not self.pending:
+            return None
+        self.final = self.provisional
+        return self.final
@@ -0,0 +1,295 @@
+"""Append-only binary store of raw measurements"""
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from enum import IntFlag
+from typing import NamedTuple
+
+from .const import STORE_BATCH_SIZE, STORE_INDEX_STRIDE
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"GBTM"
+VERSION = 1
+# magic, version, record size, reserved
+HEADER = struct.Struct("<4sHH8x")
+# timestamp in ms since the epoch, raw weight, impedance, user number
+# (0 for none), unit flag, flags
+RECORD = struct.Struct("<qIHHBB")
+TIMESTAMP = struct.Struct("<q")
+
+
+class RecordFlag(IntFlag):
+    """Bits of the flags field"""
+    IMPEDANCE_VALID = 1
+    HISTORICAL = 2
+    MATCHED = 4
+    AMBIGUOUS = 8
+
+
+class StoredMeasurement(NamedTuple):
+    timestamp: datetime
+    raw_weight: int
+    impedance: int
+    user_id: str | None
+    unit_flag: int
+    flags: RecordFlag
+
+
+class StoreError(Exception):
+    """The store file is not a measurement store of a supported version"""
+
+
+class MeasurementStore:
+    """
+    Fixed-width raw measurements of one device in a single append-only file.
+
+    Only the raw readings are stored; body metrics are recomputed from them
+    with whatever profile applies when they are read. Appends are buffered
+    in memory and written in batches by flush(). Reads map the file with
+    mmap and use a sparse index holding the time span of every block of
+    STORE_INDEX_STRIDE records, so a range query only unpacks the blocks
+    overlapping the range. Records are kept in the order they were added,
+    which is not time order once history is backfilled.
+
+    append() and take_pending() are cheap and meant for the event loop;
+    write(), flush() and records() do file I/O and belong in an executor.
+    User ids are mapped to small numbers kept in a JSON file next to the
+    store.
+    """
+
+    def __init__(self, path: str, batch_size: int = STORE_BATCH_SIZE) -> None:
+        self._path = path
+        self._users_path = f"{path}.users"
+        self._batch_size = batch_size
+        self._pending = bytearray()
+        self._io_lock = threading.Lock()
+        # Time span of every full or partial block: [min_ms, max_ms]
+        self._blocks: list[list[int]] = []
+        self._indexed = 0
+        self._users: list[str] = []
+        self._user_numbers: dict[str, int] = {}
+        self._users_saved = 0
+        self._tail_checked = False
+        self._load_users()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def pending(self) -> int:
+        """Number of records not written yet"""
+        return len(self._pending) // RECORD.size
+
+    @property
+    def batch_due(self) -> bool:
+        return self.pending >= self._batch_size
+
+    def __len__(self) -> int:
+        """Number of records written to the file"""
+        try:
+            size = os.path.getsize(self._path)
+        except FileNotFoundError:
+            return 0
+        return max(0, size - HEADER.size) // RECORD.size
+
+    def _load_users(self) -> None:
+        try:
+            with open(self._users_path, encoding="utf-8") as file:
+                users = json.load(file)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            _LOGGER.warning("Ignoring corrupt user table %s", self._users_path)
+            return
+        self._users = [str(user) for user in users]
+        self._user_numbers = {user: number for number, user in enumerate(self._users, 1)}
+        self._users_saved = len(self._users)
+
+    def _user_number(self, user_id: str | None) -> int:
+        if user_id is None:
+            return 0
+        if (number := self._user_numbers.get(user_id)) is None:
+            self._users.append(user_id)
+            number = self._user_numbers[user_id] = len(self._users)
+        return number
+
+    def user_id(self, number: int) -> str | None:
+        return self._users[number - 1] if 0 < number <= len(self._users) else None
+
+    def append(
+        self,
+        timestamp: datetime,
+        raw_weight: int,
+        impedance: int,
+        unit_flag: int = 1,
+        user_id: str | None = None,
+        flags: RecordFlag = RecordFlag(0),
+    ) -> None:
+        """Buffer a measurement for the next write"""
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        self._pending += RECORD.pack(
+            round(timestamp.timestamp() * 1000),
+            raw_weight,
+            min(impedance, 0xFFFF),
+            self._user_number(user_id),
+            unit_flag,
+            int(flags),
+        )
+
+    def take_pending(self) -> bytes:
+        """Hand over the buffered records, e.g. to write() them in an executor"""
+        batch = bytes(self._pending)
+        self._pending.clear()
+        return batch
+
+    def flush(self) -> int:
+        """Write every buffered record, returns how many were written"""
+        batch = self.take_pending()
+        self.write(batch)
+        return len(batch) // RECORD.size
+
+    def write(self, batch: bytes) -> None:
+        """Append a batch of packed records to the file"""
+        with self._io_lock:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            if len(self._users) > self._users_saved:
+                self._save_users()
+            if not batch:
+                return
+            if not self._tail_checked:
+                self._truncate_torn_tail()
+                self._tail_checked = True
+            new_file = not os.path.exists(self._path)
+            with open(self._path, "ab") as file:
+                if new_file or file.tell() == 0:
+                    file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+                file.write(batch)
+                file.flush()
+                os.fsync(file.fileno())
+
+    def _truncate_torn_tail(self) -> None:
+        """Cut a partial record a crash left at the end of the file
+
+        Appending after it would shift every later record off the record
+        boundaries.
+        """
+        try:
+            size = os.path.getsize(self._path)
+        except FileNotFoundError:
+            return
+        if size < HEADER.size:
+            whole = 0
+        else:
+            whole = HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size
+        if whole != size:
+            _LOGGER.warning(
+                "Dropping %d bytes of a partly written record from %s", size - whole, self._path
+            )
+            os.truncate(self._path, whole)
+
+    def _save_users(self) -> None:
+        users = list(self._users)
+        temp_path = f"{self._users_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(users, file)
+        os.replace(temp_path, self._users_path)
+        self._users_saved = len(users)
+
+    def records(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        user_id: str | None = None,
+    ) -> Iterator[StoredMeasurement]:
+        """Yield the written records within [start, end), in file order
+
+        Args:
+            start: Earliest timestamp to include.
+            end: Timestamp to stop before.
+            user_id: Only yield the records attributed to this user.
+        """
+        start_ms = None if start is None else round(start.timestamp() * 1000)
+        end_ms = None if end is None else round(end.timestamp() * 1000)
+        user_number = None
+        if user_id is not None:
+            if (user_number := self._user_numbers.get(user_id)) is None:
+                return
+
+        with self._io_lock:
+            try:
+                file = open(self._path, "rb")
+            except FileNotFoundError:
+                return
+            with file:
+                if os.fstat(file.fileno()).st_size <= HEADER.size:
+                    return
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                count = (len(mapped) - HEADER.size) // RECORD.size
+                try:
+                    self._check_header(mapped)
+                except StoreError:
+                    mapped.close()
+                    raise
+                self._extend_index(mapped, count)
+                blocks = list(enumerate(self._blocks))
+
+        try:
+            for number, (low, high) in blocks:
+                if (start_ms is not None and high < start_ms) or (
+                    end_ms is not None and low >= end_ms
+                ):
+                    continue
+                first = number * STORE_INDEX_STRIDE
+                for index in range(first, min(first + STORE_INDEX_STRIDE, count)):
+                    ms, raw_weight, impedance, user, unit_flag, flags = RECORD.unpack_from(
+                        mapped, HEADER.size + index * RECORD.size
+                    )
+                    if start_ms is not None and ms < start_ms:
+                        continue
+                    if end_ms is not None and ms >= end_ms:
+                        continue
+                    if user_number is not None and user != user_number:
+                        continue
+                    yield StoredMeasurement(
+                        datetime.fromtimestamp(ms / 1000, timezone.utc),
+                        raw_weight,
+                        impedance,
+                        self.user_id(user),
+                        unit_flag,
+                        RecordFlag(flags),
+                    )
+        finally:
+            mapped.close()
+
+    @staticmethod
+    def _check_header(mapped: mmap.mmap) -> None:
+        magic, version, record_size = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise StoreError(f"Unsupported measurement store {magic!r} v{version}")
+
+    def _extend_index(self, mapped: mmap.mmap, count: int) -> None:
+        """Index the records appended since the last read"""
+        index = self._indexed
+        if index and index % STORE_INDEX_STRIDE:
+            # Reopen the last, partial block
+            index -= index % STORE_INDEX_STRIDE
+            self._blocks.pop()
+        while index < count:
+            stop = min(index + STORE_INDEX_STRIDE, count)
+            timestamps = [
+                TIMESTAMP.unpack_from(mapped, HEADER.size + offset * RECORD.size)[0]
+                for offset in range(index, stop)
+            ]
+            self._blocks.append([min(timestamps), max(timestamps)])
+            index = stop
+        self._indexed = count
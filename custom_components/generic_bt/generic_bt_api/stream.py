@@ -0,0 +1,174 @@
+"""Fan measurements out to asynchronous consumers with bounded queues"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Generic, TypeVar
+
+from .const import DEFAULT_STREAM_QUEUE_SIZE
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Overflow(str, Enum):
+    """What a full consumer queue does with the next item"""
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    CLOSE = "close"
+
+
+class StreamOverflowError(Exception):
+    """Raised to a consumer whose queue overflowed with the close policy"""
+
+
+class MeasurementStream(Generic[T]):
+    """
+    One consumer's view of the published items.
+
+    The producer only appends to a bounded deque and wakes the consumer, so
+    a slow consumer never delays the producer or the other consumers. Use it
+    as an asynchronous iterator; iteration ends when the stream is closed.
+    """
+
+    def __init__(
+        self,
+        hub: StreamHub[T],
+        maxsize: int = DEFAULT_STREAM_QUEUE_SIZE,
+        overflow: Overflow = Overflow.DROP_OLDEST,
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("Stream queue size must be at least 1")
+        self._hub = hub
+        self._maxsize = maxsize
+        self._overflow = Overflow(overflow)
+        # (monotonic time published, item)
+        self._queue: deque[tuple[float, T]] = deque()
+        self._waiter: asyncio.Future[None] | None = None
+        self._closed = False
+        self._error: Exception | None = None
+
+        self.delivered = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "maxsize": self._maxsize,
+            "overflow": self._overflow.value,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "last_lag": round(self.last_lag, 6),
+            "max_lag": round(self.max_lag, 6),
+        }
+
+    def put(self, item: T, now: float | None = None) -> None:
+        """Queue an item for the consumer without waiting"""
+        if self._closed:
+            return
+        if len(self._queue) >= self._maxsize:
+            self.dropped += 1
+            if self._overflow is Overflow.DROP_NEWEST:
+                return
+            if self._overflow is Overflow.CLOSE:
+                self.close(StreamOverflowError(
+                    f"Consumer fell {len(self._queue)} items behind"
+                ))
+                return
+            self._queue.popleft()
+        self._queue.append((time.monotonic() if now is None else now, item))
+        self._wake()
+
+    def close(self, error: Exception | None = None) -> None:
+        """End the stream, the consumer sees the error after the queued items"""
+        if self._closed:
+            return
+        self._closed = True
+        self._error = error
+        self._hub.discard(self)
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def __aiter__(self) -> MeasurementStream[T]:
+        return self
+
+    async def __anext__(self) -> T:
+        while not self._queue:
+            if self._closed:
+                if self._error is not None:
+                    error, self._error = self._error, None
+                    raise error
+                raise StopAsyncIteration
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+        published, item = self._queue.popleft()
+        self.delivered += 1
+        self.last_lag = time.monotonic() - published
+        self.max_lag = max(self.max_lag, self.last_lag)
+        return item
+
+    async def aclose(self) -> None:
+        self.close()
+
+    async def __aenter__(self) -> MeasurementStream[T]:
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class StreamHub(Generic[T]):
+    """Publish items to every open MeasurementStream"""
+
+    def __init__(self) -> None:
+        self._streams: list[MeasurementStream[T]] = []
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    @property
+    def stats(self) -> list[dict[str, Any]]:
+        return [stream.stats for stream in self._streams]
+
+    def open(
+        self,
+        maxsize: int = DEFAULT_STREAM_QUEUE_SIZE,
+        overflow: Overflow = Overflow.DROP_OLDEST,
+    ) -> MeasurementStream[T]:
+        stream = MeasurementStream(self, maxsize, overflow)
+        self._streams.append(stream)
+        return stream
+
+    def discard(self, stream: MeasurementStream[T]) -> None:
+        try:
+            self._streams.remove(stream)
+        except ValueError:
+            pass
+
+    def publish(self, item: T) -> None:
+        now = time.monotonic()
+        # A stream closed by its overflow policy removes itself
+        for stream in list(self._streams):
+            stream.put(item, now)
+
+    def close(self) -> None:
+        for stream in list(self._streams):
+            stream.close()
@@ -0,0 +1,118 @@
+"""Hashed timer wheel for large numbers of resettable timeouts"""
+from __future__ import annotations
+
+import logging
+from collections.abc import Callable, Hashable
+from math import ceil
+
+from .const import TIMER_WHEEL_SLOTS, TIMER_WHEEL_TICK
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    """
+    Timeouts hashed into a ring of slots, advanced by one periodic tick.
+
+    Scheduling, rescheduling and cancelling a timer are O(1), so a timeout
+    can be pushed back on every advertisement. A timer lands in the slot of
+    its deadline tick; deadlines further out than one revolution simply stay
+    in their slot until the wheel comes round to the right tick. Timers fire
+    up to one tick late, never early.
+
+    The wheel keeps no clock of its own: callers pass monotonic time to
+    schedule() and advance().
+    """
+
+    def __init__(
+        self, tick: float = TIMER_WHEEL_TICK, slots: int = TIMER_WHEEL_SLOTS
+    ) -> None:
+        """
+        Args:
+            tick: Resolution of the wheel in seconds.
+            slots: Number of slots in the ring.
+        """
+        if tick <= 0:
+            raise ValueError("Tick must be positive")
+        if slots < 1:
+            raise ValueError("The wheel needs at least one slot")
+        self._tick = tick
+        self._slots: list[dict[Hashable, int]] = [{} for _ in range(slots)]
+        # key -> (deadline tick, callback)
+        self._timers: dict[Hashable, tuple[int, Callable[[], None]]] = {}
+        self._current: int | None = None
+
+        self.fired = 0
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    @property
+    def tick(self) -> float:
+        return self._tick
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"timers": len(self._timers), "fired": self.fired}
+
+    def _tick_of(self, now: float) -> int:
+        return int(now // self._tick)
+
+    def schedule(
+        self, key: Hashable, delay: float, callback: Callable[[], None], now: float
+    ) -> None:
+        """Start or restart the timer named key
+
+        Args:
+            key: Identifies the timer; an existing timer with it is replaced.
+            delay: Seconds from now until the timer fires.
+            callback: Called without arguments when the timer fires.
+            now: The current monotonic time.
+        """
+        if self._current is None:
+            self._current = self._tick_of(now)
+        self.cancel(key)
+        deadline = max(self._tick_of(now) + ceil(delay / self._tick), self._current + 1)
+        self._slots[deadline % len(self._slots)][key] = deadline
+        self._timers[key] = (deadline, callback)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Stop the timer named key, returns whether it was pending"""
+        if (timer := self._timers.pop(key, None)) is None:
+            return False
+        deadline = timer[0]
+        del self._slots[deadline % len(self._slots)][key]
+        return True
+
+    def advance(self, now: float) -> int:
+        """Fire every timer due by now, returns how many fired"""
+        target = self._tick_of(now)
+        if self._current is None:
+            self._current = target
+            return 0
+
+        fired = 0
+        slot_count = len(self._slots)
+        # After a long stall a single pass over every slot fires everything due
+        end = min(target, self._current + slot_count)
+        while self._current < end:
+            self._current += 1
+            fired += self._expire(self._current % slot_count, target)
+        self._current = target
+        return fired
+
+    def _expire(self, index: int, target: int) -> int:
+        slot = self._slots[index]
+        due = [key for key, deadline in slot.items() if deadline <= target]
+        for key in due:
+            del slot[key]
+            _deadline, callback = self._timers.pop(key)
+            self.fired += 1
+            try:
+                callback()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in timer callback for %s", key)
+        return len(due)
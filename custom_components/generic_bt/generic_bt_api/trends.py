@@ -0,0 +1,190 @@
+"""Incremental trends over finalized measurements"""
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+from .const import (
+    TREND_DELTA_SECONDS,
+    TREND_EWMA_ALPHA,
+    TREND_RANGE_SECONDS,
+    TREND_WINDOW,
+)
+from .parser import BTScaleData
+
+# Trend metric -> BTScaleData attribute
+TREND_METRICS = {
+    "weight": "weight_kg",
+    "fat_percentage": "fat_percentage",
+    "muscle_mass": "muscle_mass",
+}
+
+TREND_STATS = ("moving_average", "ewma", "weekly_delta", "min", "max")
+
+
+class MetricTrend:
+    """
+    Trends of one metric, updated in O(1) amortized per value.
+
+    - moving_average: mean of the last `window` values from a running sum.
+    - ewma: exponentially weighted moving average.
+    - weekly_delta: latest value minus the oldest value within `delta`
+      seconds, kept in a deque that is trimmed from the left.
+    - min / max: over the last `span` seconds, kept in monotonic deques so
+      the extreme is always at the left end.
+
+    Values must arrive in time order; older ones are ignored.
+    """
+
+    def __init__(
+        self,
+        window: int = TREND_WINDOW,
+        alpha: float = TREND_EWMA_ALPHA,
+        delta: float = TREND_DELTA_SECONDS,
+        span: float = TREND_RANGE_SECONDS,
+    ) -> None:
+        self._window = window
+        self._alpha = alpha
+        self._delta = delta
+        self._span = span
+        self._values: deque[float] = deque()
+        self._sum = 0.0
+        self.ewma: float | None = None
+        # (timestamp, value)
+        self._recent: deque[tuple[float, float]] = deque()
+        self._minimum: deque[tuple[float, float]] = deque()
+        self._maximum: deque[tuple[float, float]] = deque()
+        self.last_timestamp: float | None = None
+
+    @property
+    def moving_average(self) -> float | None:
+        return self._sum / len(self._values) if self._values else None
+
+    @property
+    def weekly_delta(self) -> float | None:
+        if len(self._recent) < 2:
+            return None
+        return self._recent[-1][1] - self._recent[0][1]
+
+    @property
+    def min(self) -> float | None:
+        return self._minimum[0][1] if self._minimum else None
+
+    @property
+    def max(self) -> float | None:
+        return self._maximum[0][1] if self._maximum else None
+
+    def add(self, timestamp: float, value: float) -> bool:
+        """Fold in a value taken at timestamp, returns False if it was too old"""
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            return False
+        self.last_timestamp = timestamp
+
+        self._values.append(value)
+        self._sum += value
+        if len(self._values) > self._window:
+            self._sum -= self._values.popleft()
+
+        self.ewma = value if self.ewma is None else self.ewma + self._alpha * (value - self.ewma)
+
+        self._recent.append((timestamp, value))
+        while self._recent[0][0] < timestamp - self._delta:
+            self._recent.popleft()
+
+        while self._minimum and self._minimum[-1][1] >= value:
+            self._minimum.pop()
+        self._minimum.append((timestamp, value))
+        while self._maximum and self._maximum[-1][1] <= value:
+            self._maximum.pop()
+        self._maximum.append((timestamp, value))
+        horizon = timestamp - self._span
+        while self._minimum[0][0] < horizon:
+            self._minimum.popleft()
+        while self._maximum[0][0] < horizon:
+            self._maximum.popleft()
+        return True
+
+    def value(self, stat: str) -> float | None:
+        result = getattr(self, stat)
+        return None if result is None else round(result, 2)
+
+    def as_dict(self) -> dict[str, Any]:
+        # The running sum is rebuilt from the values to shed float drift
+        return {
+            "values": list(self._values),
+            "ewma": self.ewma,
+            "recent": list(self._recent),
+            "minimum": list(self._minimum),
+            "maximum": list(self._maximum),
+            "last_timestamp": self.last_timestamp,
+        }
+
+    @classmethod
+    def from_dict(cls, stored: dict[str, Any], **kwargs: Any) -> MetricTrend:
+        self = cls(**kwargs)
+        self._values = deque(stored.get("values", [])[-self._window :])
+        self._sum = sum(self._values)
+        self.ewma = stored.get("ewma")
+        self._recent = deque(tuple(item) for item in stored.get("recent", []))
+        self._minimum = deque(tuple(item) for item in stored.get("minimum", []))
+        self._maximum = deque(tuple(item) for item in stored.get("maximum", []))
+        self.last_timestamp = stored.get("last_timestamp")
+        return self
+
+
+class TrendEngine:
+    """Trends of every TREND_METRICS metric per user, None for unattributed"""
+
+    def __init__(self) -> None:
+        self._trends: dict[tuple[str | None, str], MetricTrend] = {}
+
+    def __iter__(self) -> Iterator[tuple[str | None, str]]:
+        return iter(self._trends)
+
+    def get(self, user_id: str | None, metric: str) -> MetricTrend | None:
+        return self._trends.get((user_id, metric))
+
+    def add(self, data: BTScaleData) -> bool:
+        """Fold in a finalized, timestamped measurement
+
+        Returns:
+            True if any trend changed.
+        """
+        if data.timestamp is None:
+            return False
+        timestamp = data.timestamp.timestamp()
+        changed = False
+        for metric, attribute in TREND_METRICS.items():
+            if (value := getattr(data, attribute, None)) is None:
+                continue
+            key = (data.user_id, metric)
+            if (trend := self._trends.get(key)) is None:
+                trend = self._trends[key] = MetricTrend()
+            changed |= trend.add(timestamp, float(value))
+        return changed
+
+    def replace(self, users: Iterable[str | None], other: TrendEngine) -> None:
+        """Replace the trends of users with theirs in other"""
+        users = set(users)
+        self._trends = {
+            key: trend for key, trend in self._trends.items() if key[0] not in users
+        }
+        self._trends.update(
+            (key, trend) for key, trend in other._trends.items() if key[0] in users
+        )
+
+    def as_dict(self) -> dict[str, dict[str, Any]]:
+        return {
+            f"{user_id or ''}/{metric}": trend.as_dict()
+            for (user_id, metric), trend in self._trends.items()
+        }
+
+    @classmethod
+    def from_dict(cls, stored: dict[str, dict[str, Any]]) -> TrendEngine:
+        self = cls()
+        for key, trend in stored.items():
+            user_id, _, metric = key.rpartition("/")
+            if metric in TREND_METRICS:
+                self._trends[(user_id or None, metric)] = MetricTrend.from_dict(trend)
+        return self
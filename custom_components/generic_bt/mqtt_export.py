@@ -0,0 +1,141 @@
+"""Export finalized measurements and device health to an MQTT broker."""
+from __future__ import annotations
+
+import logging
+from typing import Any, Callable, Optional
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import STORAGE_DIR
+from homeassistant.util import slugify
+
+from .const import DATA_MQTT_EXPORTERS, DOMAIN, MQTT_FLUSH_INTERVAL, MQTT_RETRY_INTERVAL
+from .generic_bt_api.const import DEFAULT_MQTT_PORT, DEFAULT_MQTT_PREFIX, DEFAULT_MQTT_QOS
+from .generic_bt_api.mqtt import MqttExporter
+from .generic_bt_api.parser import BTScaleData
+
+_LOGGER = logging.getLogger(__name__)
+
+MQTT_SCHEMA = vol.Schema(
+    {
+        vol.Required("host"): cv.string,
+        vol.Optional("port", default=DEFAULT_MQTT_PORT): cv.port,
+        vol.Optional("username"): cv.string,
+        vol.Optional("password"): cv.string,
+        vol.Optional("prefix", default=DEFAULT_MQTT_PREFIX): vol.All(
+            cv.string, vol.Match(r"^[^#+]+$", msg="prefix must not contain wildcards")
+        ),
+        vol.Optional("qos", default=DEFAULT_MQTT_QOS): vol.All(vol.Coerce(int), vol.In((0, 1, 2))),
+    }
+)
+
+
+class SharedMqttExporter:
+    """An MqttExporter shared by the scales exporting to the same broker.
+
+    Publishing only queues; the queue is flushed in an executor once per
+    flush window, and retried periodically while messages are spooled.
+    """
+
+    def __init__(self, hass: HomeAssistant, key: tuple, exporter: MqttExporter) -> None:
+        self._hass = hass
+        self._key = key
+        self.exporter = exporter
+        self.users = 0
+        self._flush_unsub: Optional[Callable[[], None]] = None
+
+    @callback
+    def publish_measurement(self, address: str, data: BTScaleData) -> None:
+        self.exporter.publish_measurement(address, data)
+        self.async_schedule_flush(MQTT_FLUSH_INTERVAL)
+
+    @callback
+    def publish_health(self, address: str, health: dict[str, Any]) -> None:
+        self.exporter.publish_health(address, health)
+        self.async_schedule_flush(MQTT_FLUSH_INTERVAL)
+
+    @callback
+    def async_schedule_flush(self, delay: float) -> None:
+        if self._flush_unsub is None:
+            self._flush_unsub = async_call_later(self._hass, delay, self._async_flush)
+
+    def _flush(self) -> int:
+        """Flush in an executor, returns the bytes still spooled."""
+        self.exporter.flush()
+        return self.exporter.spool_bytes
+
+    async def _async_flush(self, _now: Any = None) -> None:
+        self._flush_unsub = None
+        try:
+            backlog = await self._hass.async_add_executor_job(self._flush)
+        except OSError as ex:
+            _LOGGER.error("Failed to spool MQTT messages: %s", ex)
+            backlog = 1
+        if backlog:
+            # Replayed once the broker is reachable again
+            self.async_schedule_flush(MQTT_RETRY_INTERVAL)
+
+    async def async_release(self) -> None:
+        """Drop a user, the last one flushes and disconnects."""
+        self.users -= 1
+        if self.users > 0:
+            return
+        self._hass.data[DATA_MQTT_EXPORTERS].pop(self._key, None)
+        if self._flush_unsub is not None:
+            self._flush_unsub()
+            self._flush_unsub = None
+        try:
+            await self._hass.async_add_executor_job(self.exporter.stop)
+        except OSError as ex:
+            _LOGGER.error("Failed to spool MQTT messages: %s", ex)
+
+
+async def async_get_mqtt_exporter(
+    hass: HomeAssistant, settings: dict[str, Any]
+) -> Optional[SharedMqttExporter]:
+    """Get the exporter for the broker of settings, connecting on first use.
+
+    Every call must be paired with SharedMqttExporter.async_release().
+
+    Args:
+        hass: The Home Assistant instance.
+        settings: The broker settings, see MQTT_SCHEMA.
+
+    Returns:
+        The exporter, None if the settings are invalid or paho-mqtt is missing.
+    """
+    try:
+        settings = MQTT_SCHEMA(settings)
+    except vol.Invalid as ex:
+        _LOGGER.error("Invalid MQTT export settings: %s", ex)
+        return None
+
+    key = (settings["host"], settings["port"], settings.get("username"), settings["prefix"])
+    exporters: dict[tuple, SharedMqttExporter] = hass.data.setdefault(DATA_MQTT_EXPORTERS, {})
+    if (shared := exporters.get(key)) is None:
+        exporter = MqttExporter(
+            settings["host"],
+            settings["port"],
+            settings["prefix"],
+            settings["qos"],
+            settings.get("username"),
+            settings.get("password"),
+            spool_path=hass.config.path(
+                STORAGE_DIR, f"{DOMAIN}.mqtt_spool.{slugify('_'.join(map(str, key)))}"
+            ),
+        )
+        # Registered before connecting so concurrent setups share it
+        shared = exporters[key] = SharedMqttExporter(hass, key, exporter)
+        try:
+            await hass.async_add_executor_job(exporter.start)
+        except ImportError as ex:
+            exporters.pop(key, None)
+            _LOGGER.error("MQTT export is disabled: %s", ex)
+            return None
+        # Replay what was spooled before the last shutdown once connected
+        shared.async_schedule_flush(MQTT_RETRY_INTERVAL)
+    shared.users += 1
+    return shared
@@ -0,0 +1,214 @@
+"""Recompute the body metrics statistics of a scale from its stored history."""
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+import logging
+import multiprocessing
+import os
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    EVENT_REDERIVE_PROGRESS,
+    REDERIVE_CHUNK_SIZE,
+    REDERIVE_MAX_WORKERS,
+    REDERIVE_PROGRESS_INTERVAL,
+)
+from .generic_bt_api.recompute import (
+    HourlyAggregates,
+    Profile,
+    merge_aggregates,
+    raw_chunks,
+    recompute_chunk,
+    recompute_trends,
+)
+from .statistics import STATISTIC_ATTRIBUTES, HourAccumulator
+
+if TYPE_CHECKING:
+    from .coordinator import ScaleDataUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_CANCELLED = "cancelled"
+STATE_FAILED = "failed"
+
+# Only the body composition depends on the profile
+RECOMPUTED_ATTRIBUTES = {
+    key: attribute
+    for key, (attribute, _unit) in STATISTIC_ATTRIBUTES.items()
+    if key != "weight"
+}
+
+
+class RederiveJob:
+    """Recompute a scale's long-term statistics under the current profiles.
+
+    The history store is read in chunks in an executor and every chunk is
+    recomputed on a process pool, with at most two chunks per worker in
+    flight so memory stays bounded. The results are only imported once all
+    chunks are done: a cancelled or failed job leaves the statistics as they
+    were.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        coordinator: ScaleDataUpdateCoordinator,
+        profiles: dict[Optional[str], Profile],
+        workers: Optional[int] = None,
+        chunk_size: int = REDERIVE_CHUNK_SIZE,
+    ) -> None:
+        """Initialize the job.
+
+        Args:
+            hass: The Home Assistant instance.
+            coordinator: The scale whose history is recomputed.
+            profiles: The profile to recompute each user with, None for
+                unattributed measurements. Other users are left untouched.
+            workers: Worker processes, 0 to recompute in an executor thread.
+            chunk_size: Measurements per chunk.
+        """
+        self._hass = hass
+        self._coordinator = coordinator
+        self._profiles = profiles
+        self._workers = (
+            min(REDERIVE_MAX_WORKERS, os.cpu_count() or 1) if workers is None else workers
+        )
+        self._chunk_size = chunk_size
+        self._task: Optional[asyncio.Task[None]] = None
+        self._last_progress = 0.0
+
+        self.state = STATE_RUNNING
+        self.processed = 0
+        self.total = 0
+        self.error: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.state != STATE_RUNNING
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "address": self._coordinator.address,
+            "state": self.state,
+            "processed": self.processed,
+            "total": self.total,
+            "users": [user_id for user_id in self._profiles if user_id is not None],
+            "error": self.error,
+        }
+
+    def start(self) -> asyncio.Task[None]:
+        self._task = self._hass.async_create_background_task(
+            self._async_run(), f"{DOMAIN} rederive {self._coordinator.address}"
+        )
+        return self._task
+
+    def cancel(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def async_wait(self) -> None:
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    def _report(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_progress < REDERIVE_PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        self._hass.bus.async_fire(EVENT_REDERIVE_PROGRESS, self.as_dict())
+
+    async def _async_run(self) -> None:
+        coordinator = self._coordinator
+        await coordinator.async_flush_history()
+        history = coordinator.history
+        self.total = await self._hass.async_add_executor_job(len, history)
+        _LOGGER.info(
+            "Recomputing %d measurements of %s for %s",
+            self.total,
+            coordinator.address,
+            ", ".join(user or "the scale" for user in self._profiles),
+        )
+        self._report(force=True)
+
+        pool: Optional[Executor] = None
+        if self._workers:
+            pool = ProcessPoolExecutor(
+                self._workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        aggregates: HourlyAggregates = {}
+        chunks = raw_chunks(history.records(), self._chunk_size)
+        try:
+            # Future -> number of measurements in its chunk
+            pending: dict[asyncio.Future[HourlyAggregates], int] = {}
+            in_flight = max(1, self._workers) * 2
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < in_flight:
+                    chunk = await self._hass.async_add_executor_job(next, chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    job = partial(recompute_chunk, chunk, self._profiles, RECOMPUTED_ATTRIBUTES)
+                    future = (
+                        loop.run_in_executor(pool, job)
+                        if pool
+                        else self._hass.async_add_executor_job(job)
+                    )
+                    pending[future] = len(chunk)
+                if not pending:
+                    break
+                finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in finished:
+                    merge_aggregates(aggregates, future.result())
+                    self.processed += pending.pop(future)
+                self._report()
+        except asyncio.CancelledError:
+            self.state = STATE_CANCELLED
+            _LOGGER.info("Recomputing the history of %s was cancelled", coordinator.address)
+            self._report(force=True)
+            raise
+        except Exception as ex:  # pylint: disable=broad-except
+            self.state = STATE_FAILED
+            self.error = str(ex)
+            _LOGGER.exception("Recomputing the history of %s failed", coordinator.address)
+            self._report(force=True)
+            return
+        finally:
+            if pool is not None:
+                # Do not wait for chunks of a cancelled job
+                pool.shutdown(wait=False, cancel_futures=True)
+            try:
+                chunks.close()
+            except ValueError:
+                # Still being read by the executor, it is closed when collected
+                pass
+
+        coordinator.replace_statistics(
+            {
+                (user_id or "", key, datetime.fromtimestamp(hour, timezone.utc)): HourAccumulator(
+                    int(count), total, minimum, maximum
+                )
+                for (user_id, key, hour), (count, total, minimum, maximum) in aggregates.items()
+            }
+        )
+        # Trends replay every measurement in order, so they are rebuilt
+        # after the chunks rather than merged from them
+        trends = await self._hass.async_add_executor_job(
+            recompute_trends, history.records(), self._profiles
+        )
+        coordinator.replace_trends(list(self._profiles), trends)
+        self.state = STATE_DONE
+        _LOGGER.info(
+            "Recomputed %d hours of statistics for %s", len(aggregates), coordinator.address
+        )
+        self._report(force=True)
@@ -1,32 +1,59 @@
+"""Support for generic bluetooth scale sensors."""
+from __future__ import annotations
 
-from dataclasses import dataclass
+from collections.abc import Callable
+from dataclasses import dataclass, field
 from datetime import date
+from functools import partial
 import logging
-from typing import Any, Self
+from operator import attrgetter
+import time
+from typing import Any
 
 from sensor_state_data import Units
 
 from homeassistant import config_entries
 from homeassistant.components.sensor import (
-    RestoreSensor,
     SensorDeviceClass,
+    SensorEntity,
     SensorEntityDescription,
-    SensorExtraStoredData,
     SensorStateClass,
     async_update_suggested_units,
 )
-from homeassistant.const import CONF_UNIT_SYSTEM, UnitOfMass
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers import device_registry as dr
+from homeassistant.const import (
+    CONF_UNIT_SYSTEM,
+    SIGNAL_STRENGTH_DECIBELS_MILLIWATT,
+    EntityCategory,
+    UnitOfMass,
+)
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.device_registry import CONNECTION_BLUETOOTH, DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_call_later
 from bleak.backends.scanner import (
     AdvertisementData,
 )
 
-from .const import CONF_BIRTHDATE, CONF_CALC_BODY_METRICS, CONF_HEIGHT, CONF_SEX, DOMAIN
-from .coordinator import ScaleDataUpdateCoordinator
+from .const import (
+    CONF_BIRTHDATE,
+    CONF_CALC_BODY_METRICS,
+    CONF_DEADBAND,
+    CONF_HEARTBEAT,
+    CONF_HEIGHT,
+    CONF_MIN_INTERVAL,
+    CONF_RELATIVE_DEADBAND,
+    CONF_SEX,
+    CONF_THROTTLE,
+    DEFAULT_HEARTBEAT,
+    DEFAULT_MIN_WRITE_INTERVAL,
+    DOMAIN,
+)
+from .coordinator import ScaleDataUpdateCoordinator, async_get_timer_wheel
+from .generic_bt_api.fields import FieldSpec
 from .generic_bt_api.parser import BTScaleData
+from .generic_bt_api.presence import DevicePresence
+from .generic_bt_api.profiles import UserProfile
+from .generic_bt_api.trends import TREND_METRICS, TREND_STATS
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -105,6 +132,180 @@ SENSOR_DESCRIPTIONS = [
     ),
 ]
 
+# Entity key to the BTScaleData attribute holding its value
+VALUE_ATTRIBUTES = {
+    "Weight": "weight_kg",
+    "Other": "impedance",
+    "WaterPercentage": "water_percentage",
+    "ProteinPercentage": "protein_percentage",
+    "FatPercentage": "fat_percentage",
+    "SkeletalMass": "skeletal_mass",
+    "MuscleMass": "muscle_mass",
+    "BoneMass": "bone_mass",
+    "User": "user_name",
+    "body_mass_index": "bmi",
+    "body_fat_percentage": "fat_percentage",
+    "visceral_fat_value": "visceral",
+    "body_water_percentage": "water_percentage",
+    "basal_metabolic_rate": "bmmr",
+    "skeletal_muscle_percentage": "skeletal_mass",
+    "muscle_mass": "muscle_mass",
+    "bone_mass": "bone_mass",
+    "protein_percentage": "protein_percentage",
+}
+
+# Precompiled value extractors, built once at import
+VALUE_EXTRACTORS: dict[str, Callable[[BTScaleData], Any]] = {
+    key: attrgetter(attribute) for key, attribute in VALUE_ATTRIBUTES.items()
+}
+
+# Default absolute deadband per sensor key, in the sensor's native unit
+DEFAULT_DEADBANDS = {
+    "Weight": 0.05,
+    "Other": 1.0,
+    "WaterPercentage": 0.1,
+    "ProteinPercentage": 0.1,
+    "FatPercentage": 0.1,
+    "SkeletalMass": 0.1,
+    "MuscleMass": 0.05,
+    "BoneMass": 0.05,
+}
+
+# Sensors created for every household user of a shared scale
+USER_SENSOR_DESCRIPTIONS = [
+    SensorEntityDescription(
+        key="Weight",
+        icon="mdi:human-handsdown",
+        native_unit_of_measurement=UnitOfMass.KILOGRAMS,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    SensorEntityDescription(
+        key="FatPercentage",
+        icon="mdi:human-handsdown",
+        native_unit_of_measurement=Units.PERCENTAGE,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    SensorEntityDescription(
+        key="WaterPercentage",
+        icon="mdi:water-percent",
+        native_unit_of_measurement=Units.PERCENTAGE,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    SensorEntityDescription(
+        key="MuscleMass",
+        icon="mdi:weight-lifter",
+        native_unit_of_measurement=UnitOfMass.KILOGRAMS,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    SensorEntityDescription(
+        key="BoneMass",
+        icon="mdi:bone",
+        native_unit_of_measurement=UnitOfMass.KILOGRAMS,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+]
+
+
+# Diagnostic sensors fed from the scale's presence, not its measurements
+DIAGNOSTIC_SENSOR_DESCRIPTIONS = [
+    SensorEntityDescription(
+        key="last_seen",
+        device_class=SensorDeviceClass.TIMESTAMP,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+    SensorEntityDescription(
+        key="advertisement_rate",
+        icon="mdi:broadcast",
+        native_unit_of_measurement="advertisements/min",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+    SensorEntityDescription(
+        key="rssi",
+        device_class=SensorDeviceClass.SIGNAL_STRENGTH,
+        native_unit_of_measurement=SIGNAL_STRENGTH_DECIBELS_MILLIWATT,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+]
+
+DIAGNOSTIC_EXTRACTORS: dict[str, Callable[[DevicePresence], Any]] = {
+    "last_seen": attrgetter("last_seen_at"),
+    "advertisement_rate": attrgetter("rate"),
+    "rssi": attrgetter("rssi"),
+}
+
+# Unit of every trend metric; deltas share the unit of their metric
+TREND_UNITS = {
+    "weight": UnitOfMass.KILOGRAMS,
+    "fat_percentage": Units.PERCENTAGE,
+    "muscle_mass": UnitOfMass.KILOGRAMS,
+}
+# Trends shown without enabling them in the entity registry
+DEFAULT_TREND_STATS = {"moving_average", "weekly_delta"}
+
+
+@dataclass(frozen=True)
+class ThrottlePolicy:
+    """When a changed sensor value is worth a state write.
+
+    Attributes:
+        deadband: Smallest absolute change that is written.
+        relative_deadband: Smallest change relative to the last written value.
+        min_interval: Seconds between two writes of the same sensor.
+        heartbeat: Seconds after which the value is written even if unchanged.
+    """
+
+    deadband: float = 0.0
+    relative_deadband: float = 0.0
+    min_interval: float = DEFAULT_MIN_WRITE_INTERVAL
+    heartbeat: float | None = DEFAULT_HEARTBEAT
+
+    def changed(self, previous: Any, value: Any) -> bool:
+        """Check whether value moved outside the deadband around previous."""
+        if not isinstance(value, (int, float)) or not isinstance(previous, (int, float)):
+            return value != previous
+        threshold = max(self.deadband, self.relative_deadband * abs(previous))
+        difference = abs(value - previous)
+        return difference > threshold if threshold else difference > 0
+
+
+def throttle_policies(options: dict[str, Any]) -> dict[str, ThrottlePolicy]:
+    """Build the throttle policy of every sensor key from the entry options.
+
+    Args:
+        options: The config entry options.
+
+    Returns:
+        The policy per sensor key.
+    """
+    overrides: dict[str, dict[str, Any]] = options.get(CONF_THROTTLE, {})
+    policies = {}
+    for key in VALUE_EXTRACTORS:
+        override = overrides.get(key, {})
+        policies[key] = ThrottlePolicy(
+            deadband=override.get(CONF_DEADBAND, DEFAULT_DEADBANDS.get(key, 0.0)),
+            relative_deadband=override.get(CONF_RELATIVE_DEADBAND, 0.0),
+            min_interval=override.get(CONF_MIN_INTERVAL, DEFAULT_MIN_WRITE_INTERVAL),
+            heartbeat=override.get(CONF_HEARTBEAT, DEFAULT_HEARTBEAT),
+        )
+    return policies
+
+
+@dataclass
+class _DispatchTarget:
+    """Dispatch and throttling state of one sensor."""
+
+    extractor: Callable[[BTScaleData], Any]
+    policy: ThrottlePolicy
+    user_id: str | None = None
+    last_write: float | None = None
+    pending: Any = None
+    cancel_trailing: Callable[[], None] | None = field(default=None, repr=False)
+    writes: int = 0
+    suppressed: int = 0
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -115,12 +316,14 @@ async def async_setup_entry(
     _LOGGER.debug("Setting up scale sensors for entry: %s", entry.entry_id)
     address = entry.unique_id
     coordinator: ScaleDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    dispatcher = ScaleSensorDispatcher(hass, address, throttle_policies(entry.options))
+    entry.async_on_unload(coordinator.add_listener(dispatcher.handle_update))
 
     entities = [
         ScaleWeightSensor(
             entry.title,
             address,
-            coordinator,
+            dispatcher,
             SensorEntityDescription(
                 key="Weight",
                 icon="mdi:human-handsdown",
@@ -132,7 +335,7 @@ async def async_setup_entry(
         ScaleSensor(
             entry.title,
             address,
-            coordinator,
+            dispatcher,
             SensorEntityDescription(
                 key="Other",
                 icon="mdi:omega",
@@ -143,7 +346,7 @@ async def async_setup_entry(
         PercentageSensor(
             entry.title,
             address,
-            coordinator,
+            dispatcher,
             SensorEntityDescription(
                 key="WaterPercentage",
                 icon="mdi:human-handsdown",
@@ -155,7 +358,7 @@ async def async_setup_entry(
         PercentageSensor(
             entry.title,
             address,
-            coordinator,
+            dispatcher,
             SensorEntityDescription(
                 key="ProteinPercentage",
                 icon="mdi:human-handsdown",
@@ -167,7 +370,7 @@ async def async_setup_entry(
         PercentageSensor(
             entry.title,
             address,
-            coordinator,
+            dispatcher,
             SensorEntityDescription(
                 key="FatPercentage",
                 icon="mdi:human-handsdown",
@@ -179,7 +382,7 @@ async def async_setup_entry(
         PercentageSensor(
             entry.title,
             address,
-            coordinator,
+            dispatcher,
             SensorEntityDescription(
                 key="WaterPercentage",
                 icon="mdi:human-handsdown",
@@ -191,7 +394,7 @@ async def async_setup_entry(
         MassSensor(
             entry.title,
             address,
-            coordinator,
+            dispatcher,
             SensorEntityDescription(
                 key="SkeletalMass",
                 icon="mdi:human-handsdown",
@@ -203,7 +406,7 @@ async def async_setup_entry(
         MassSensor(
             entry.title,
             address,
-            coordinator,
+            dispatcher,
             SensorEntityDescription(
                 key="MuscleMass",
                 icon="mdi:human-handsdown",
@@ -215,7 +418,7 @@ async def async_setup_entry(
         MassSensor(
             entry.title,
             address,
-            coordinator,
+            dispatcher,
             SensorEntityDescription(
                 key="BoneMass",
                 icon="mdi:human-handsdown",
@@ -227,7 +430,7 @@ async def async_setup_entry(
         MassSensor(
             entry.title,
             address,
-            coordinator,
+            dispatcher,
             SensorEntityDescription(
                 key="SkeletalMass",
                 icon="mdi:human-handsdown",
@@ -238,6 +441,36 @@ async def async_setup_entry(
         )
 
     ]
+    if len(coordinator.profiles):
+        entities.append(
+            ScaleSensor(
+                entry.title,
+                address,
+                dispatcher,
+                SensorEntityDescription(key="User", icon="mdi:account"),
+            )
+        )
+    entities.extend(
+        UserScaleSensor(entry.title, address, dispatcher, description, profile)
+        for profile in coordinator.profiles
+        for description in USER_SENSOR_DESCRIPTIONS
+    )
+    trend_users = list(coordinator.profiles) or [None]
+    entities.extend(
+        ScaleTrendSensor(entry.title, address, coordinator, profile, metric, stat)
+        for profile in trend_users
+        for metric in TREND_METRICS
+        for stat in TREND_STATS
+    )
+    entities.extend(
+        ScaleDiagnosticSensor(entry.title, address, coordinator, description)
+        for description in DIAGNOSTIC_SENSOR_DESCRIPTIONS
+    )
+    if (field_decoder := coordinator.field_decoder) is not None:
+        entities.extend(
+            ScaleFieldSensor(entry.title, address, coordinator, spec)
+            for spec in field_decoder.specs
+        )
     coordinator.set_display_unit("kg")
     async_add_entities(entities)
     async_update_suggested_units(hass)
@@ -245,18 +478,187 @@ async def async_setup_entry(
     _LOGGER.debug("Scale sensors setup completed for entry: %s", entry.entry_id)
 
 
-class ScaleSensor(RestoreSensor):
+class ScaleSensorDispatcher:
+    """Deliver each measurement to all sensors of a scale in one pass.
+
+    A single coordinator listener looks up every sensor's value through the
+    precompiled VALUE_EXTRACTORS. State is only written when the value
+    leaves the sensor's deadband and the minimum write interval has passed,
+    or when the heartbeat is due. A change held back by the minimum interval
+    is written once the interval ends. The heartbeat runs on the shared timer
+    wheel, so it also fires while no frames arrive.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        address: str,
+        policies: dict[str, ThrottlePolicy] | None = None,
+    ) -> None:
+        """Initialize the dispatcher.
+
+        Args:
+            hass: The Home Assistant instance.
+            address: The Bluetooth address of the scale.
+            policies: Throttle policy per sensor key.
+        """
+        self._hass = hass
+        self._address = address
+        self._policies = policies or {}
+        self._last_data: BTScaleData | None = None
+        self._last_by_user: dict[str, BTScaleData] = {}
+        self._targets: dict[ScaleSensor, _DispatchTarget] = {}
+        self._timer_wheel = async_get_timer_wheel(hass)
+
+    @property
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Written and suppressed state writes per sensor."""
+        return {
+            entity.entity_id: {"writes": target.writes, "suppressed": target.suppressed}
+            for entity, target in self._targets.items()
+        }
+
+    @callback
+    def add_entity(self, entity: ScaleSensor) -> Callable[[], None]:
+        """Start dispatching values to a sensor.
+
+        Args:
+            entity: The sensor, keyed by its entity description.
+
+        Returns:
+            Function to call to stop dispatching to the sensor.
+        """
+        key = entity.entity_description.key
+        if (extractor := VALUE_EXTRACTORS.get(key)) is None:
+            _LOGGER.warning("No value extractor for sensor key %s", key)
+            return lambda: None
+
+        user_id = entity.user_id
+        self._targets[entity] = _DispatchTarget(
+            extractor, self._policies.get(key, ThrottlePolicy()), user_id
+        )
+        last = self._last_data if user_id is None else self._last_by_user.get(user_id)
+        if last is not None:
+            # Sensors added after the restore start from the same measurement
+            try:
+                entity.async_restore_value(extractor(last))
+            except AttributeError:
+                pass
+
+        @callback
+        def remove_entity() -> None:
+            target = self._targets.pop(entity, None)
+            if target and target.cancel_trailing:
+                target.cancel_trailing()
+            self._timer_wheel.cancel((self._address, "heartbeat", entity))
+
+        return remove_entity
+
+    @callback
+    def handle_update(self, data: BTScaleData) -> None:
+        """Handle updated data from the scale.
+
+        Args:
+            data: The new scale data.
+        """
+        _LOGGER.debug("Dispatching update for %s: %s", self._address, data)
+        self._last_data = data
+        if data.user_id is not None:
+            self._last_by_user[data.user_id] = data
+        now = time.monotonic()
+        for entity, target in self._targets.items():
+            if target.user_id is not None and target.user_id != data.user_id:
+                continue
+            try:
+                value = target.extractor(data)
+            except AttributeError:
+                continue
+            if value is None:
+                # Body composition is held until the impedance measurement lands
+                continue
+            self._dispatch(entity, target, value, now)
+
+    def _dispatch(
+        self, entity: ScaleSensor, target: _DispatchTarget, value: Any, now: float
+    ) -> None:
+        policy = target.policy
+        if not entity.available or target.last_write is None:
+            self._write(entity, target, value, now)
+            return
+
+        elapsed = now - target.last_write
+        if policy.heartbeat is not None and elapsed >= policy.heartbeat:
+            self._write(entity, target, value, now)
+            return
+
+        if not policy.changed(entity.native_value, value):
+            target.pending = None
+            target.suppressed += 1
+            return
+
+        if elapsed < policy.min_interval:
+            target.pending = value
+            target.suppressed += 1
+            if target.cancel_trailing is None:
+                target.cancel_trailing = async_call_later(
+                    self._hass,
+                    policy.min_interval - elapsed,
+                    partial(self._flush_pending, entity),
+                )
+            return
+
+        self._write(entity, target, value, now)
+
+    @callback
+    def _flush_pending(self, entity: ScaleSensor, _now: Any) -> None:
+        """Write the change held back by the minimum write interval."""
+        if (target := self._targets.get(entity)) is None:
+            return
+        target.cancel_trailing = None
+        if target.pending is not None:
+            self._write(entity, target, target.pending, time.monotonic())
+
+    @callback
+    def _heartbeat(self, entity: ScaleSensor) -> None:
+        """Rewrite the current value of a sensor that has not changed."""
+        if (target := self._targets.get(entity)) is None:
+            return
+        if entity.available and entity.native_value is not None:
+            self._write(entity, target, entity.native_value, time.monotonic())
+
+    def _write(
+        self, entity: ScaleSensor, target: _DispatchTarget, value: Any, now: float
+    ) -> None:
+        if target.cancel_trailing:
+            target.cancel_trailing()
+            target.cancel_trailing = None
+        target.pending = None
+        target.last_write = now
+        target.writes += 1
+        entity.async_set_value(value)
+        if target.policy.heartbeat is not None:
+            self._timer_wheel.schedule(
+                (self._address, "heartbeat", entity),
+                target.policy.heartbeat,
+                partial(self._heartbeat, entity),
+                now,
+            )
+
+
+class ScaleSensor(SensorEntity):
     """Base sensor implementation for Etekcity scale measurements."""
 
     _attr_should_poll = False
     _attr_has_entity_name = True
     _attr_available = False
 
+    user_id: str | None = None
+
     def __init__(
         self,
         name: str,
         address: str,
-        coordinator: ScaleDataUpdateCoordinator,
+        dispatcher: ScaleSensorDispatcher,
         entity_description: SensorEntityDescription,
     ) -> None:
         """Initialize the scale sensor.
@@ -264,7 +666,7 @@ class ScaleSensor(RestoreSensor):
         Args:
             name: The name of the sensor.
             address: The Bluetooth address of the scale.
-            coordinator: The data update coordinator for the scale.
+            dispatcher: Delivers the scale's measurements to the sensor.
             entity_description: Description of the sensor entity.
 
         """
@@ -285,7 +687,7 @@ class ScaleSensor(RestoreSensor):
             name=name,
             manufacturer="Generic",
         )
-        self._coordinator = coordinator
+        self._dispatcher = dispatcher
 
     async def async_added_to_hass(self) -> None:
         """When entity is added to hass."""
@@ -293,188 +695,119 @@ class ScaleSensor(RestoreSensor):
         _LOGGER.debug("Adding sensor to Home Assistant: %s", self.entity_id)
         await super().async_added_to_hass()
 
-        self._attr_available = await self.async_restore_data()
-
-        self.async_on_remove(self._coordinator.add_listener(self.handle_update))
+        # The dispatcher seeds the sensor with the restored measurement
+        self.async_on_remove(self._dispatcher.add_entity(self))
         _LOGGER.info("Sensor added to Home Assistant: %s", self.entity_id)
 
-    async def async_restore_data(self) -> bool:
-        """Restore last state from storage."""
-        if last_state := await self.async_get_last_sensor_data():
-            _LOGGER.debug("Restoring previous state for sensor: %s", self.entity_id)
-            self._attr_native_value = last_state.native_value
-            return True
-        return False
-
-    def handle_update(
-        self,
-        data: BTScaleData,
-    ) -> None:
-        """Handle updated data from the scale.
-
-        This method is called when new data is received from the scale.
-        It updates the sensor's state and triggers a state update in Home Assistant.
+    @callback
+    def async_restore_value(self, value: Any) -> None:
+        """Seed the sensor with a value before its first state write.
 
         Args:
-            data: The new scale data.
+            value: The native value recomputed from the stored measurement.
 
         """
-        # if measurement := data.measurements.get(self.entity_description.key):
-        _LOGGER.debug(
-            "Received update for sensor %s: %s",
-            self.entity_id,
-            data,
-        )
         self._attr_available = True
-        self._attr_native_value = data.impedance
-
-        self.async_write_ha_state()
-        _LOGGER.debug("Sensor %s updated successfully", self.entity_id)
+        self._attr_native_value = value
 
+    @callback
+    def async_set_value(self, value: Any) -> None:
+        """Publish a new value dispatched from the scale.
 
-HW_VERSION_KEY = "hw_version"
-SW_VERSION_KEY = "sw_version"
+        Args:
+            value: The new native value of the sensor.
 
+        """
+        self.async_restore_value(value)
 
-@dataclass
-class ScaleWeightSensorExtraStoredData(SensorExtraStoredData):
-    """Object to hold extra stored data for the scale sensor."""
+        self.async_write_ha_state()
+        _LOGGER.debug("Sensor %s updated successfully", self.entity_id)
 
-    hw_version: str
-    sw_version: str
 
-    def as_dict(self) -> dict[str, Any]:
-        """Return a dict representation of the scale sensor data."""
-        data = super().as_dict()
-        data[HW_VERSION_KEY] = self.hw_version
-        data[SW_VERSION_KEY] = self.sw_version
+class ScaleWeightSensor(ScaleSensor):
+    """Representation of a weight sensor for the scale."""
 
-        return data
+    def __init__(
+        self,
+        name: str,
+        address: str,
+        dispatcher: ScaleSensorDispatcher,
+        entity_description: SensorEntityDescription,
+    ) -> None:
+        self._id = address
+        super().__init__(name, address, dispatcher, entity_description)
 
-    @classmethod
-    def from_dict(cls, restored: dict[str, Any]) -> Self | None:
-        """Initialize a stored sensor state from a dict."""
-        extra = SensorExtraStoredData.from_dict(restored)
-        if extra is None:
-            return None
 
-        restored.setdefault("")
-        hw_version: str = restored.get(HW_VERSION_KEY)
-        sw_version: str = restored.get(SW_VERSION_KEY)
+class PercentageSensor(ScaleSensor):
+    """ The percentage Sensor dictated by the key """
+    def __init__(
+        self,
+        name: str,
+        address: str,
+        dispatcher: ScaleSensorDispatcher,
+        entity_description: SensorEntityDescription,
+    ) -> None:
+        self._id = address
+        super().__init__(name, address, dispatcher, entity_description)
 
-        return cls(
-            extra.native_value,
-            extra.native_unit_of_measurement,
-            hw_version,
-            sw_version,
-        )
 
+class MassSensor(ScaleSensor):
+    def __init__(
+        self,
+        name: str,
+        address: str,
+        dispatcher: ScaleSensorDispatcher,
+        entity_description: SensorEntityDescription,
+    ) -> None:
+        self._id = address
+        super().__init__(name, address, dispatcher, entity_description)
 
-class ScaleWeightSensor(ScaleSensor):
-    """Representation of a weight sensor for the scale."""
 
+class VisceralSensor(ScaleSensor):
     def __init__(
         self,
         name: str,
         address: str,
-        coordinator: ScaleDataUpdateCoordinator,
+        dispatcher: ScaleSensorDispatcher,
         entity_description: SensorEntityDescription,
     ) -> None:
         self._id = address
-        super().__init__(name, address, coordinator, entity_description)
-
-    async def async_restore_data(self) -> bool:
-        """Restore last state from storage."""
-        if last_state := await self.async_get_last_sensor_data():
-            _LOGGER.debug("Restoring previous state for sensor: %s", self.entity_id)
-            self._attr_native_value = last_state.native_value
-            self._attr_native_unit_of_measurement = (
-                last_state.native_unit_of_measurement
-            )
+        super().__init__(name, address, dispatcher, entity_description)
 
-            address = self._id
-            device_registry = dr.async_get(self.hass)
-            device_entry = device_registry.async_get_device(
-                connections={(CONNECTION_BLUETOOTH, address)}
-            )
-            if device_entry and (
-                device_entry.hw_version != last_state.hw_version
-                or device_entry.sw_version != last_state.sw_version
-            ):
-                hw_version = last_state.hw_version
-                if hw_version is None or hw_version == "":
-                    hw_version = device_entry.hw_version
-
-                sw_version = last_state.sw_version
-                if sw_version is None or sw_version == "":
-                    sw_version = device_entry.sw_version
-
-                device_registry.async_update_device(
-                    device_entry.id, hw_version=hw_version, sw_version=sw_version
-                )
-                self._attr_device_info.update(
-                    {HW_VERSION_KEY: hw_version, SW_VERSION_KEY: sw_version}
-                )
-            return True
-        return False
 
-    def handle_update(
+class UserScaleSensor(ScaleSensor):
+    """A measurement of one household user of a shared scale."""
+
+    def __init__(
         self,
-        data: BTScaleData,
+        name: str,
+        address: str,
+        dispatcher: ScaleSensorDispatcher,
+        entity_description: SensorEntityDescription,
+        profile: UserProfile,
     ) -> None:
-        """Handle updated data from the scale."""
+        """Initialize the user sensor.
 
-        address = self._id
-        device_registry = dr.async_get(self.hass)
-        device_entry = device_registry.async_get_device(
-            connections={(CONNECTION_BLUETOOTH, address)}
-        )
-        device_registry.async_update_device(
-            device_entry.id
-        )
-
-        _LOGGER.debug(
-            "Received update for sensor %s: %s",
-            self.entity_id,
-            data,
-        )
-        self._attr_available = True
-        self._attr_native_value = data.weight_kg
+        Args:
+            name: The name of the scale.
+            address: The Bluetooth address of the scale.
+            dispatcher: Delivers the scale's measurements to the sensor.
+            entity_description: Description of the sensor entity.
+            profile: The user the sensor tracks.
 
-        self.async_write_ha_state()
-        _LOGGER.debug("Sensor %s updated successfully", self.entity_id)
+        """
+        super().__init__(name, address, dispatcher, entity_description)
+        self.user_id = profile.user_id
+        self._attr_name = f"{profile.name} {entity_description.key}"
+        self._attr_unique_id = f"{name}_{profile.user_id}_{entity_description.key}"
 
-    @property
-    def extra_state_attributes(self):
-        """Return the state attributes of the sensor."""
-        return {
-            HW_VERSION_KEY: self._attr_device_info.get(HW_VERSION_KEY),
-            SW_VERSION_KEY: self._attr_device_info.get(SW_VERSION_KEY),
-        }
 
-    @property
-    def extra_restore_state_data(self) -> ScaleWeightSensorExtraStoredData:
-        """Return sensor specific state data to be restored."""
-        return ScaleWeightSensorExtraStoredData(
-            self.native_value,
-            self.native_unit_of_measurement,
-            self._attr_device_info.get(HW_VERSION_KEY),
-            self._attr_device_info.get(SW_VERSION_KEY),
-        )
+class ScaleDiagnosticSensor(SensorEntity):
+    """How often and how well the scanners hear the scale."""
 
-    async def async_get_last_sensor_data(
-        self,
-    ) -> ScaleWeightSensorExtraStoredData | None:
-        """Restore Scale Sensor Extra Stored Data."""
-        if (restored_last_extra_data := await self.async_get_last_extra_data()) is None:
-            return None
+    _attr_should_poll = False
+    _attr_has_entity_name = True
 
-        return ScaleWeightSensorExtraStoredData.from_dict(
-            restored_last_extra_data.as_dict()
-        )
-    
-class PercentageSensor(ScaleSensor):
-    """ The percentage Sensor dictated by the key """
     def __init__(
         self,
         name: str,
@@ -482,300 +815,149 @@ class PercentageSensor(ScaleSensor):
         coordinator: ScaleDataUpdateCoordinator,
         entity_description: SensorEntityDescription,
     ) -> None:
-        self._id = address
-        super().__init__(name, address, coordinator, entity_description)
-
-    async def async_restore_data(self) -> bool:
-        """Restore last state from storage."""
-        if last_state := await self.async_get_last_sensor_data():
-            _LOGGER.debug("Restoring previous state for sensor: %s", self.entity_id)
-            self._attr_native_value = last_state.native_value
-            self._attr_native_unit_of_measurement = (
-                last_state.native_unit_of_measurement
-            )
-
-            address = self._id
-            device_registry = dr.async_get(self.hass)
-            device_entry = device_registry.async_get_device(
-                connections={(CONNECTION_BLUETOOTH, address)}
-            )
-            if device_entry and (
-                device_entry.hw_version != last_state.hw_version
-                or device_entry.sw_version != last_state.sw_version
-            ):
-                hw_version = last_state.hw_version
-                if hw_version is None or hw_version == "":
-                    hw_version = device_entry.hw_version
-
-                sw_version = last_state.sw_version
-                if sw_version is None or sw_version == "":
-                    sw_version = device_entry.sw_version
-
-                device_registry.async_update_device(
-                    device_entry.id, hw_version=hw_version, sw_version=sw_version
-                )
-                self._attr_device_info.update(
-                    {HW_VERSION_KEY: hw_version, SW_VERSION_KEY: sw_version}
-                )
-            return True
-        return False
+        """Initialize the diagnostic sensor.
 
-    def handle_update(
-        self,
-        data: BTScaleData,
-    ) -> None:
-        """Handle updated data from the scale."""
+        Args:
+            name: The name of the scale.
+            address: The Bluetooth address of the scale.
+            coordinator: Tracks the presence of the scale.
+            entity_description: Description of the sensor entity.
 
-        address = self._id
-        device_registry = dr.async_get(self.hass)
-        device_entry = device_registry.async_get_device(
-            connections={(CONNECTION_BLUETOOTH, address)}
-        )
-        device_registry.async_update_device(
-            device_entry.id
+        """
+        self.entity_description = entity_description
+        self._attr_name = entity_description.key.replace("_", " ").capitalize()
+        self._attr_unique_id = f"{name}_{entity_description.key}"
+        self._attr_device_info = DeviceInfo(
+            connections={(CONNECTION_BLUETOOTH, address)},
+            name=name,
+            manufacturer="Generic",
         )
+        self._coordinator = coordinator
+        self._extractor = DIAGNOSTIC_EXTRACTORS[entity_description.key]
 
-        _LOGGER.debug(
-            "Received update for sensor %s: %s",
-            self.entity_id,
-            data,
+    async def async_added_to_hass(self) -> None:
+        """When entity is added to hass."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self._coordinator.add_presence_listener(self.async_write_ha_state)
         )
-        self._attr_available = True
-        self._attr_native_value = data.fat_percentage
-
-        self.async_write_ha_state()
-        _LOGGER.debug("Sensor %s updated successfully", self.entity_id)
 
     @property
-    def extra_state_attributes(self):
-        """Return the state attributes of the sensor."""
-        return {
-            HW_VERSION_KEY: self._attr_device_info.get(HW_VERSION_KEY),
-            SW_VERSION_KEY: self._attr_device_info.get(SW_VERSION_KEY),
-        }
+    def native_value(self) -> Any:
+        """The diagnostic value, read from the scale's presence."""
+        return self._extractor(self._coordinator.presence)
 
-    @property
-    def extra_restore_state_data(self) -> ScaleWeightSensorExtraStoredData:
-        """Return sensor specific state data to be restored."""
-        return ScaleWeightSensorExtraStoredData(
-            self.native_value,
-            self.native_unit_of_measurement,
-            self._attr_device_info.get(HW_VERSION_KEY),
-            self._attr_device_info.get(SW_VERSION_KEY),
-        )
 
-    async def async_get_last_sensor_data(
-        self,
-    ) -> ScaleWeightSensorExtraStoredData | None:
-        """Restore Scale Sensor Extra Stored Data."""
-        if (restored_last_extra_data := await self.async_get_last_extra_data()) is None:
-            return None
+class ScaleTrendSensor(SensorEntity):
+    """A trend of one metric, maintained incrementally by the coordinator."""
 
-        return ScaleWeightSensorExtraStoredData.from_dict(
-            restored_last_extra_data.as_dict()
-        )
-    pass
+    _attr_should_poll = False
+    _attr_has_entity_name = True
+    _attr_state_class = SensorStateClass.MEASUREMENT
 
-class MassSensor(ScaleSensor):
     def __init__(
         self,
         name: str,
         address: str,
         coordinator: ScaleDataUpdateCoordinator,
-        entity_description: SensorEntityDescription,
+        profile: UserProfile | None,
+        metric: str,
+        stat: str,
     ) -> None:
-        self._id = address
-        super().__init__(name, address, coordinator, entity_description)
-
-    async def async_restore_data(self) -> bool:
-        """Restore last state from storage."""
-        if last_state := await self.async_get_last_sensor_data():
-            _LOGGER.debug("Restoring previous state for sensor: %s", self.entity_id)
-            self._attr_native_value = last_state.native_value
-            self._attr_native_unit_of_measurement = (
-                last_state.native_unit_of_measurement
-            )
+        """Initialize the trend sensor.
 
-            address = self._id
-            device_registry = dr.async_get(self.hass)
-            device_entry = device_registry.async_get_device(
-                connections={(CONNECTION_BLUETOOTH, address)}
-            )
-            if device_entry and (
-                device_entry.hw_version != last_state.hw_version
-                or device_entry.sw_version != last_state.sw_version
-            ):
-                hw_version = last_state.hw_version
-                if hw_version is None or hw_version == "":
-                    hw_version = device_entry.hw_version
-
-                sw_version = last_state.sw_version
-                if sw_version is None or sw_version == "":
-                    sw_version = device_entry.sw_version
-
-                device_registry.async_update_device(
-                    device_entry.id, hw_version=hw_version, sw_version=sw_version
-                )
-                self._attr_device_info.update(
-                    {HW_VERSION_KEY: hw_version, SW_VERSION_KEY: sw_version}
-                )
-            return True
-        return False
-
-    def handle_update(
-        self,
-        data: BTScaleData,
-    ) -> None:
-        """Handle updated data from the scale."""
+        Args:
+            name: The name of the scale.
+            address: The Bluetooth address of the scale.
+            coordinator: Maintains the trends of the scale.
+            profile: The user the trend follows, None for the whole scale.
+            metric: The trended metric, a TREND_METRICS key.
+            stat: The trend statistic, one of TREND_STATS.
 
-        address = self._id
-        device_registry = dr.async_get(self.hass)
-        device_entry = device_registry.async_get_device(
-            connections={(CONNECTION_BLUETOOTH, address)}
-        )
-        device_registry.async_update_device(
-            device_entry.id
+        """
+        self._coordinator = coordinator
+        self._user_id = profile.user_id if profile else None
+        self._metric = metric
+        self._stat = stat
+        label = f"{metric} {stat}".replace("_", " ")
+        self._attr_name = f"{profile.name} {label}" if profile else label.capitalize()
+        self._attr_unique_id = f"{name}_{self._user_id or 'scale'}_trend_{metric}_{stat}"
+        self._attr_native_unit_of_measurement = TREND_UNITS[metric]
+        self._attr_icon = "mdi:chart-line"
+        self._attr_entity_registry_enabled_default = stat in DEFAULT_TREND_STATS
+        self._attr_device_info = DeviceInfo(
+            connections={(CONNECTION_BLUETOOTH, address)},
+            name=name,
+            manufacturer="Generic",
         )
 
-        _LOGGER.debug(
-            "Received update for sensor %s: %s",
-            self.entity_id,
-            data,
-        )
-        self._attr_available = True
-        self._attr_native_value = data.bone_mass
+    async def async_added_to_hass(self) -> None:
+        """When entity is added to hass."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._coordinator.add_trend_listener(self._handle_trend))
 
-        self.async_write_ha_state()
-        _LOGGER.debug("Sensor %s updated successfully", self.entity_id)
+    @callback
+    def _handle_trend(self, user_id: str | None) -> None:
+        if user_id == self._user_id:
+            self.async_write_ha_state()
 
     @property
-    def extra_state_attributes(self):
-        """Return the state attributes of the sensor."""
-        return {
-            HW_VERSION_KEY: self._attr_device_info.get(HW_VERSION_KEY),
-            SW_VERSION_KEY: self._attr_device_info.get(SW_VERSION_KEY),
-        }
+    def native_value(self) -> float | None:
+        """The current value of the trend."""
+        if (trend := self._coordinator.trends.get(self._user_id, self._metric)) is None:
+            return None
+        return trend.value(self._stat)
 
-    @property
-    def extra_restore_state_data(self) -> ScaleWeightSensorExtraStoredData:
-        """Return sensor specific state data to be restored."""
-        return ScaleWeightSensorExtraStoredData(
-            self.native_value,
-            self.native_unit_of_measurement,
-            self._attr_device_info.get(HW_VERSION_KEY),
-            self._attr_device_info.get(SW_VERSION_KEY),
-        )
 
-    async def async_get_last_sensor_data(
-        self,
-    ) -> ScaleWeightSensorExtraStoredData | None:
-        """Restore Scale Sensor Extra Stored Data."""
-        if (restored_last_extra_data := await self.async_get_last_extra_data()) is None:
-            return None
+class ScaleFieldSensor(SensorEntity):
+    """A field declared in the options, decoded from every frame."""
 
-        return ScaleWeightSensorExtraStoredData.from_dict(
-            restored_last_extra_data.as_dict()
-        )
-    pass
+    _attr_should_poll = False
+    _attr_has_entity_name = True
+    _attr_state_class = SensorStateClass.MEASUREMENT
 
-class VisceralSensor(ScaleSensor):
     def __init__(
         self,
         name: str,
         address: str,
         coordinator: ScaleDataUpdateCoordinator,
-        entity_description: SensorEntityDescription,
+        spec: FieldSpec,
     ) -> None:
-        self._id = address
-        super().__init__(name, address, coordinator, entity_description)
-
-    async def async_restore_data(self) -> bool:
-        """Restore last state from storage."""
-        if last_state := await self.async_get_last_sensor_data():
-            _LOGGER.debug("Restoring previous state for sensor: %s", self.entity_id)
-            self._attr_native_value = last_state.native_value
-            self._attr_native_unit_of_measurement = (
-                last_state.native_unit_of_measurement
-            )
-
-            address = self._id
-            device_registry = dr.async_get(self.hass)
-            device_entry = device_registry.async_get_device(
-                connections={(CONNECTION_BLUETOOTH, address)}
-            )
-            if device_entry and (
-                device_entry.hw_version != last_state.hw_version
-                or device_entry.sw_version != last_state.sw_version
-            ):
-                hw_version = last_state.hw_version
-                if hw_version is None or hw_version == "":
-                    hw_version = device_entry.hw_version
-
-                sw_version = last_state.sw_version
-                if sw_version is None or sw_version == "":
-                    sw_version = device_entry.sw_version
-
-                device_registry.async_update_device(
-                    device_entry.id, hw_version=hw_version, sw_version=sw_version
-                )
-                self._attr_device_info.update(
-                    {HW_VERSION_KEY: hw_version, SW_VERSION_KEY: sw_version}
-                )
-            return True
-        return False
+        """Initialize the field sensor.
 
-    def handle_update(
-        self,
-        data: BTScaleData,
-    ) -> None:
-        """Handle updated data from the scale."""
-
-        address = self._id
-        device_registry = dr.async_get(self.hass)
-        device_entry = device_registry.async_get_device(
-            connections={(CONNECTION_BLUETOOTH, address)}
-        )
-        device_registry.async_update_device(
-            device_entry.id
-        )
+        Args:
+            name: The name of the scale.
+            address: The Bluetooth address of the scale.
+            coordinator: Decodes the declared fields.
+            spec: The declared field.
 
-        _LOGGER.debug(
-            "Received update for sensor %s: %s",
-            self.entity_id,
-            data,
+        """
+        self._coordinator = coordinator
+        self._field = spec.name
+        self._attr_name = spec.name.replace("_", " ").capitalize()
+        self._attr_unique_id = f"{name}_field_{spec.name}"
+        self._attr_native_unit_of_measurement = spec.unit
+        self._attr_icon = "mdi:code-brackets"
+        self._attr_device_info = DeviceInfo(
+            connections={(CONNECTION_BLUETOOTH, address)},
+            name=name,
+            manufacturer="Generic",
         )
-        self._attr_available = True
-        self._attr_native_value = data.visceral
+        self._written: Any = None
 
-        self.async_write_ha_state()
-        _LOGGER.debug("Sensor %s updated successfully", self.entity_id)
+    async def async_added_to_hass(self) -> None:
+        """When entity is added to hass."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._coordinator.add_field_listener(self._handle_fields))
 
-    @property
-    def extra_state_attributes(self):
-        """Return the state attributes of the sensor."""
-        return {
-            HW_VERSION_KEY: self._attr_device_info.get(HW_VERSION_KEY),
-            SW_VERSION_KEY: self._attr_device_info.get(SW_VERSION_KEY),
-        }
+    @callback
+    def _handle_fields(self) -> None:
+        # Advertisements repeat, only write when the value changes
+        if (value := self.native_value) != self._written:
+            self._written = value
+            self.async_write_ha_state()
 
     @property
-    def extra_restore_state_data(self) -> ScaleWeightSensorExtraStoredData:
-        """Return sensor specific state data to be restored."""
-        return ScaleWeightSensorExtraStoredData(
-            self.native_value,
-            self.native_unit_of_measurement,
-            self._attr_device_info.get(HW_VERSION_KEY),
-            self._attr_device_info.get(SW_VERSION_KEY),
-        )
-
-    async def async_get_last_sensor_data(
-        self,
-    ) -> ScaleWeightSensorExtraStoredData | None:
-        """Restore Scale Sensor Extra Stored Data."""
-        if (restored_last_extra_data := await self.async_get_last_extra_data()) is None:
-            return None
-
-        return ScaleWeightSensorExtraStoredData.from_dict(
-            restored_last_extra_data.as_dict()
-        )
-    pass
\ No newline at end of file
+    def native_value(self) -> Any:
+        """The field of the latest decoded frame."""
+        return self._coordinator.field_values.get(self._field)
@@ -0,0 +1,242 @@
+"""Services of the Generic BT integration."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+import logging
+from typing import Any
+
+from bleak import BleakError
+import voluptuous as vol
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.statistics import statistics_during_period
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DOMAIN,
+    EXPORT_SOURCE_STATISTICS,
+    EXPORT_SOURCE_STORE,
+    EXPORT_STATISTICS_LOOKBACK,
+    EXPORT_STATISTICS_WINDOW,
+)
+from .coordinator import ScaleDataUpdateCoordinator, async_get_coordinator
+from .generic_bt_api.export import FORMAT_CSV, FORMATS, ExportWriter, export_measurements, open_writer
+from .statistics import STATISTIC_ATTRIBUTES
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_EXPORT = "export"
+SERVICE_REDERIVE = "rederive"
+SERVICE_CANCEL_REDERIVE = "cancel_rederive"
+SERVICE_SYNC_HISTORY = "sync_history"
+
+STATISTICS_COLUMNS = ("start", "user_id", "statistic", "mean", "min", "max")
+STATISTICS_TYPES = {"start": "string", "mean": "float64", "min": "float64", "max": "float64"}
+
+EXPORT_SCHEMA = vol.Schema(
+    {
+        vol.Required("address"): cv.string,
+        vol.Required("path"): cv.string,
+        vol.Optional("format", default=FORMAT_CSV): vol.In(FORMATS),
+        vol.Optional("source", default=EXPORT_SOURCE_STORE): vol.In(
+            (EXPORT_SOURCE_STORE, EXPORT_SOURCE_STATISTICS)
+        ),
+        vol.Optional("start"): cv.datetime,
+        vol.Optional("end"): cv.datetime,
+        vol.Optional("user"): cv.string,
+        vol.Optional("recompute", default=False): cv.boolean,
+    }
+)
+
+REDERIVE_SCHEMA = vol.Schema(
+    {
+        vol.Required("address"): cv.string,
+        vol.Optional("users"): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional("workers"): vol.All(vol.Coerce(int), vol.Range(min=0)),
+    }
+)
+
+ADDRESS_SCHEMA = vol.Schema({vol.Required("address"): cv.string})
+
+
+def _get_coordinator(hass: HomeAssistant, call: ServiceCall) -> ScaleDataUpdateCoordinator:
+    if (coordinator := async_get_coordinator(hass, call.data["address"])) is None:
+        raise ServiceValidationError(f"No scale with address {call.data['address']}")
+    return coordinator
+
+
+def async_setup(hass: HomeAssistant) -> None:
+    """Register the services of the integration."""
+
+    async def async_export(call: ServiceCall) -> ServiceResponse:
+        coordinator = _get_coordinator(hass, call)
+        path = call.data["path"]
+        if not hass.config.is_allowed_path(path):
+            raise ServiceValidationError(f"Writing to {path} is not allowed")
+
+        start = _as_utc(call.data.get("start"))
+        end = _as_utc(call.data.get("end"))
+        user = call.data.get("user")
+        fmt = call.data["format"]
+        try:
+            if call.data["source"] == EXPORT_SOURCE_STATISTICS:
+                rows = await _async_export_statistics(
+                    hass, coordinator, path, fmt, start, end, user
+                )
+            else:
+                rows = await _async_export_store(
+                    hass, coordinator, path, fmt, start, end, user, call.data["recompute"]
+                )
+        except (ImportError, OSError) as ex:
+            raise HomeAssistantError(f"Export to {path} failed: {ex}") from ex
+        return {"path": path, "rows": rows}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXPORT,
+        async_export,
+        schema=EXPORT_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def async_rederive(call: ServiceCall) -> ServiceResponse:
+        coordinator = _get_coordinator(hass, call)
+        users = call.data.get("users")
+        if users is not None:
+            # The scale's own, unattributed measurements are selected as "scale"
+            users = [None if user == "scale" else user for user in users]
+        job = coordinator.async_rederive(users, call.data.get("workers"))
+        return job.as_dict()
+
+    async def async_cancel_rederive(call: ServiceCall) -> ServiceResponse:
+        coordinator = _get_coordinator(hass, call)
+        coordinator.cancel_rederive()
+        return coordinator.rederive_status
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_REDERIVE,
+        async_rederive,
+        schema=REDERIVE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_CANCEL_REDERIVE,
+        async_cancel_rederive,
+        schema=ADDRESS_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def async_sync_history(call: ServiceCall) -> ServiceResponse:
+        coordinator = _get_coordinator(hass, call)
+        try:
+            records = await coordinator.async_sync_history()
+        except (BleakError, asyncio.TimeoutError) as ex:
+            raise HomeAssistantError(
+                f"Importing offline measurements from {call.data['address']} failed: {ex}"
+            ) from ex
+        return {"records": len(records)}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SYNC_HISTORY,
+        async_sync_history,
+        schema=ADDRESS_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    return None if value is None else dt_util.as_utc(value)
+
+
+async def _async_export_store(
+    hass: HomeAssistant,
+    coordinator: ScaleDataUpdateCoordinator,
+    path: str,
+    fmt: str,
+    start: datetime | None,
+    end: datetime | None,
+    user: str | None,
+    recompute: bool,
+) -> int:
+    """Export the raw measurements of the history store, all in an executor."""
+    await coordinator.async_flush_history()
+    profile_for = coordinator.calculation_profiles().get if recompute else None
+    return await hass.async_add_executor_job(
+        export_measurements,
+        coordinator.history.records(start, end, user),
+        path,
+        fmt,
+        profile_for,
+    )
+
+
+async def _async_export_statistics(
+    hass: HomeAssistant,
+    coordinator: ScaleDataUpdateCoordinator,
+    path: str,
+    fmt: str,
+    start: datetime | None,
+    end: datetime | None,
+    user: str | None,
+) -> int:
+    """Export the hourly long-term statistics, one time window at a time."""
+    end = end or dt_util.utcnow()
+    start = start or end - timedelta(days=EXPORT_STATISTICS_LOOKBACK)
+    users = [user] if user else [None, *(profile.user_id for profile in coordinator.profiles)]
+    statistic_ids = {
+        coordinator.statistic_id(user_id, key): (user_id, key)
+        for user_id in users
+        for key in STATISTIC_ATTRIBUTES
+    }
+
+    recorder = get_instance(hass)
+    writer: ExportWriter = await hass.async_add_executor_job(
+        open_writer, path, fmt, STATISTICS_COLUMNS, STATISTICS_TYPES
+    )
+    try:
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + timedelta(days=EXPORT_STATISTICS_WINDOW), end)
+            result = await recorder.async_add_executor_job(
+                statistics_during_period,
+                hass,
+                window_start,
+                window_end,
+                set(statistic_ids),
+                "hour",
+                None,
+                {"mean", "min", "max"},
+            )
+            rows = [
+                _statistics_row(row, *statistic_ids[statistic_id])
+                for statistic_id, statistic_rows in result.items()
+                for row in statistic_rows
+            ]
+            if rows:
+                rows.sort(key=lambda row: row["start"])
+                await hass.async_add_executor_job(writer.write, rows)
+            window_start = window_end
+    finally:
+        await hass.async_add_executor_job(writer.close)
+    return writer.rows
+
+
+def _statistics_row(row: Any, user_id: str | None, key: str) -> dict[str, Any]:
+    start = row["start"]
+    if isinstance(start, (int, float)):
+        start = dt_util.utc_from_timestamp(start)
+    return {
+        "start": start.isoformat(),
+        "user_id": user_id,
+        "statistic": key,
+        "mean": row.get("mean"),
+        "min": row.get("min"),
+        "max": row.get("max"),
+    }
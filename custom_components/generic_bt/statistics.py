@@ -0,0 +1,218 @@
+"""Import scale measurements into the recorder's long-term statistics."""
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import logging
+from typing import Any
+
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics
+from homeassistant.const import PERCENTAGE, UnitOfMass
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import slugify
+
+from .const import DOMAIN, STATISTICS_MAX_HOURS
+from .generic_bt_api.parser import BTScaleData
+
+_LOGGER = logging.getLogger(__name__)
+
+# Statistic key to the BTScaleData attribute and unit it is recorded with
+STATISTIC_ATTRIBUTES = {
+    "weight": ("weight_kg", UnitOfMass.KILOGRAMS),
+    "fat_percentage": ("fat_percentage", PERCENTAGE),
+    "water_percentage": ("water_percentage", PERCENTAGE),
+    "muscle_mass": ("muscle_mass", UnitOfMass.KILOGRAMS),
+    "bone_mass": ("bone_mass", UnitOfMass.KILOGRAMS),
+}
+
+
+@dataclass
+class HourAccumulator:
+    """Running mean, min and max of one statistic over one hour."""
+
+    count: int = 0
+    total: float = 0.0
+    minimum: float = float("inf")
+    maximum: float = float("-inf")
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    def merge(self, other: HourAccumulator) -> None:
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+
+class MeasurementStatistics:
+    """Batch finalized measurements into hourly long-term statistics.
+
+    Measurements are folded into per-hour accumulators as they arrive, so a
+    flush only imports the hours that changed since the last one, each with
+    its real timestamp. Backfilled history lands in the hour it was taken.
+
+    An hour first seen by this instance, after a restart or once evicted,
+    may already have been imported with other measurements; importing only
+    the new ones would replace those. Such hours are reported by
+    take_unseeded() and rebuilt from the full history with seed() before
+    they are imported.
+    """
+
+    def __init__(self, hass: HomeAssistant, address: str, name: str) -> None:
+        """Initialize the statistics batcher.
+
+        Args:
+            hass: The Home Assistant instance.
+            address: The Bluetooth address of the scale.
+            name: The name of the scale, used in statistic names.
+        """
+        self._hass = hass
+        self._object_prefix = slugify(address)
+        self._name = name
+        self._hours: OrderedDict[tuple[str, str, datetime], HourAccumulator] = OrderedDict()
+        self._dirty: set[tuple[str, str, datetime]] = set()
+        # Hours whose accumulators hold every measurement of the hour
+        self._seeded: set[datetime] = set()
+        self._unseeded: set[datetime] = set()
+        # Hours being rebuilt, and what was added to them meanwhile
+        self._seeding: set[datetime] = set()
+        self._late: dict[tuple[str, str, datetime], HourAccumulator] = {}
+
+    def statistic_id(self, user_id: str | None, key: str) -> str:
+        """Return the external statistic id of a user's measurement."""
+        return f"{DOMAIN}:{self._object_prefix}_{user_id or 'scale'}_{key}"
+
+    @callback
+    def add(self, data: BTScaleData) -> None:
+        """Queue a finalized measurement for the next flush.
+
+        Args:
+            data: The measurement, timestamped when it was taken.
+        """
+        timestamp = data.timestamp or datetime.now(timezone.utc)
+        hour = timestamp.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        user = data.user_id or ""
+        for key, (attribute, _unit) in STATISTIC_ATTRIBUTES.items():
+            value = getattr(data, attribute, None)
+            if value is None:
+                continue
+            bucket = (user, key, hour)
+            if (accumulator := self._hours.get(bucket)) is None:
+                accumulator = self._hours[bucket] = HourAccumulator()
+                if hour not in self._seeded and hour not in self._seeding:
+                    self._unseeded.add(hour)
+            else:
+                self._hours.move_to_end(bucket)
+            accumulator.add(float(value))
+            self._dirty.add(bucket)
+            if hour in self._seeding:
+                self._late.setdefault(bucket, HourAccumulator()).add(float(value))
+
+        # Older hours are only kept to merge late measurements into them,
+        # and an hour is never dropped before it was imported
+        if (excess := len(self._hours) - STATISTICS_MAX_HOURS) > 0:
+            imported = [bucket for bucket in self._hours if bucket not in self._dirty]
+            for bucket in imported[:excess]:
+                del self._hours[bucket]
+                self._seeded.discard(bucket[2])
+
+    @callback
+    def take_unseeded(self) -> set[datetime]:
+        """Hand over the hours to rebuild from the history before importing.
+
+        Every hour handed over must be passed back to seed().
+        """
+        hours, self._unseeded = self._unseeded, set()
+        self._seeding |= hours
+        return hours
+
+    @callback
+    def seed(
+        self,
+        hours: set[datetime],
+        accumulators: dict[tuple[str, str, datetime], HourAccumulator],
+    ) -> None:
+        """Replace the accumulators of hours with ones rebuilt from history.
+
+        Args:
+            hours: The hours from take_unseeded() that were rebuilt.
+            accumulators: Every statistic of those hours, from the history
+                as written before take_unseeded(); measurements added since
+                are merged in. Buckets missing keep their accumulator.
+        """
+        for bucket, accumulator in accumulators.items():
+            if bucket[2] not in hours:
+                continue
+            if (late := self._late.get(bucket)) is not None:
+                accumulator.merge(late)
+            self._hours[bucket] = accumulator
+            self._dirty.add(bucket)
+        self._late = {
+            bucket: late for bucket, late in self._late.items() if bucket[2] not in hours
+        }
+        self._seeding -= hours
+        self._seeded |= hours
+
+    @callback
+    def async_flush(self, _now: Any = None) -> None:
+        """Import every hour that changed since the last flush.
+
+        Hours still to be seeded are held back until they are.
+        """
+        held = self._unseeded | self._seeding
+        dirty = {bucket for bucket in self._dirty if bucket[2] not in held}
+        if not dirty:
+            return
+
+        self._dirty -= dirty
+        self._async_import({bucket: self._hours[bucket] for bucket in dirty})
+
+    @callback
+    def async_replace(
+        self, hours: dict[tuple[str, str, datetime], HourAccumulator]
+    ) -> None:
+        """Overwrite whole hours, e.g. with values recomputed from history.
+
+        Args:
+            hours: Accumulators keyed by user, statistic key and hour start.
+        """
+        for bucket, accumulator in hours.items():
+            if bucket in self._hours:
+                # Later measurements in the same hour merge into the new values
+                self._hours[bucket] = accumulator
+        self._async_import(hours)
+
+    def _async_import(
+        self, hours: dict[tuple[str, str, datetime], HourAccumulator]
+    ) -> None:
+        batches: dict[tuple[str, str], list[StatisticData]] = {}
+        for bucket in sorted(hours, key=lambda bucket: bucket[2]):
+            user, key, hour = bucket
+            accumulator = hours[bucket]
+            batches.setdefault((user, key), []).append(
+                StatisticData(
+                    start=hour,
+                    mean=accumulator.total / accumulator.count,
+                    min=accumulator.minimum,
+                    max=accumulator.maximum,
+                )
+            )
+
+        for (user, key), statistics in batches.items():
+            statistic_id = self.statistic_id(user, key)
+            metadata = StatisticMetaData(
+                has_mean=True,
+                has_sum=False,
+                name=" ".join(filter(None, (self._name, user, key.replace("_", " ")))),
+                source=DOMAIN,
+                statistic_id=statistic_id,
+                unit_of_measurement=STATISTIC_ATTRIBUTES[key][1],
+            )
+            _LOGGER.debug("Importing %d hours into %s", len(statistics), statistic_id)
+            async_add_external_statistics(self._hass, metadata, statistics)
@@ -0,0 +1,139 @@
+"""Websocket API streaming live measurements of generic bluetooth scales."""
+from __future__ import annotations
+
+from collections.abc import Callable
+import logging
+import time
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import DEFAULT_SUBSCRIBE_RATE, DOMAIN, MAX_SUBSCRIBE_RATE
+from .coordinator import async_get_coordinator
+from .generic_bt_api.parser import BTScaleData
+
+_LOGGER = logging.getLogger(__name__)
+
+# Field name -> value getter of a measurement
+MEASUREMENT_FIELDS: dict[str, Callable[[BTScaleData], Any]] = {
+    "weight": lambda data: data.weight_kg,
+    "raw_weight": lambda data: data.raw_weight,
+    "impedance": lambda data: data.impedance,
+    "impedance_valid": lambda data: data.impedance_valid,
+    "bmi": lambda data: data.bmi,
+    "basal_metabolic_rate": lambda data: data.bmmr,
+    "fat_percentage": lambda data: data.fat_percentage,
+    "water_percentage": lambda data: data.water_percentage,
+    "protein_percentage": lambda data: data.protein_percentage,
+    "muscle_mass": lambda data: data.muscle_mass,
+    "bone_mass": lambda data: data.bone_mass,
+    "skeletal_muscle_percentage": lambda data: data.skeletal_mass,
+    "visceral_fat": lambda data: data.visceral,
+    "unit": lambda data: data.unit_guess,
+    "user_id": lambda data: data.user_id,
+    "user_name": lambda data: data.user_name,
+    "attribution": lambda data: data.attribution,
+    # Raw frame metadata
+    "timestamp": lambda data: data.timestamp.isoformat() if data.timestamp else None,
+    "frame": lambda data: bytes(data.full_bytes).hex(),
+}
+
+# Read from the scale's presence when the frame is sent
+PRESENCE_FIELDS = {"rssi", "source"}
+
+FIELDS = [*MEASUREMENT_FIELDS, *PRESENCE_FIELDS]
+
+
+@callback
+def async_setup(hass: HomeAssistant) -> None:
+    """Register the websocket commands."""
+    websocket_api.async_register_command(hass, ws_subscribe)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): f"{DOMAIN}/subscribe",
+        vol.Required("address"): str,
+        vol.Optional("rate", default=DEFAULT_SUBSCRIBE_RATE): vol.All(
+            vol.Coerce(float), vol.Range(min=0.1, max=MAX_SUBSCRIBE_RATE)
+        ),
+        vol.Optional("fields"): [vol.In(FIELDS)],
+    }
+)
+@websocket_api.require_admin
+@callback
+def ws_subscribe(
+    hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
+) -> None:
+    """Stream the raw frames of a scale, coalesced to at most rate frames per second.
+
+    Every decoded frame is streamed, not only the measurements a weigh-in
+    publishes. Frames arriving faster than the rate are coalesced: a message
+    carries the newest one and how many it replaced. Admin only, as frames
+    are not attributed to users.
+    """
+    coordinator = async_get_coordinator(hass, msg["address"])
+    if coordinator is None:
+        connection.send_error(
+            msg["id"], websocket_api.ERR_NOT_FOUND, f"No scale with address {msg['address']}"
+        )
+        return
+
+    fields = msg.get("fields") or FIELDS
+    extractors = [(name, MEASUREMENT_FIELDS[name]) for name in fields if name in MEASUREMENT_FIELDS]
+    presence_fields = [name for name in fields if name in PRESENCE_FIELDS]
+    interval = 1.0 / msg["rate"]
+
+    pending: BTScaleData | None = None
+    coalesced = 0
+    last_sent: float | None = None
+    cancel_flush: Callable[[], None] | None = None
+
+    @callback
+    def send_frame(_now: Any = None) -> None:
+        nonlocal pending, coalesced, last_sent, cancel_flush
+        cancel_flush = None
+        if pending is None:
+            return
+        measurement = {name: extractor(pending) for name, extractor in extractors}
+        if presence_fields:
+            presence = coordinator.presence
+            for name in presence_fields:
+                measurement[name] = getattr(presence, name)
+        connection.send_message(
+            websocket_api.event_message(
+                msg["id"], {"measurement": measurement, "coalesced": coalesced}
+            )
+        )
+        pending = None
+        coalesced = 0
+        last_sent = time.monotonic()
+
+    @callback
+    def handle_update(data: BTScaleData) -> None:
+        nonlocal pending, coalesced, cancel_flush
+        if pending is not None:
+            coalesced += 1
+        pending = data
+        if cancel_flush is not None:
+            return
+        elapsed = None if last_sent is None else time.monotonic() - last_sent
+        if elapsed is None or elapsed >= interval:
+            send_frame()
+        else:
+            cancel_flush = async_call_later(hass, interval - elapsed, send_frame)
+
+    remove_listener = coordinator.add_frame_listener(handle_update)
+
+    @callback
+    def unsubscribe() -> None:
+        remove_listener()
+        if cancel_flush is not None:
+            cancel_flush()
+
+    connection.subscriptions[msg["id"]] = unsubscribe
+    connection.send_result(msg["id"])